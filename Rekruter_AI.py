@@ -1,162 +1,418 @@
 import streamlit as st
-from google.cloud import storage, bigquery
-from google.api_core.exceptions import GoogleAPIError
-from google.oauth2 import service_account
-from google.cloud import discoveryengine_v1 as discoveryengine
-from google.api_core.client_options import ClientOptions
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
 import uuid
-from datetime import datetime
-import json
-from PyPDF2 import PdfReader
+from datetime import datetime, timedelta
 import os
+import threading
+from functools import lru_cache
+
+import gcp_clients
+import llm_gateway
+import metrics
+import queries
+from candidate_ranking import EmbeddingIndex
+from config import (BIGQUERY_CV_COLUMNS, BIGQUERY_CV_EMBEDDINGS, BIGQUERY_DATASET_ID, BIGQUERY_POSTINGS_TABLE_ID, BIGQUERY_TABLE_ID,
+                    BUCKET_NAME, EMBEDDING_CALLS_PER_MINUTE, GCP_PROJECT_ID, KB_SOURCE, MODEL_NAME, STREAM_RESPONSES,
+                    table_ref)
+from conversation_context import ConversationContext, format_turns
+from cv_analysis import (ANALYSIS_PROMPT, GENERATION_CONFIG as CV_GENERATION_CONFIG, analysis_text, bigquery_fields,
+                         greeting_name, parse_analysis, prepare_cv_text)
+from cv_cache import CvCache, cv_blob_name, cv_digest, digest_from_url
+from event_queue import EventWriter
+from intake import AnalysisError, CvIntakePipeline, IntakeError
+from job_postings import (ARTIFACTS_GENERATION_CONFIG, ARTIFACTS_PROMPT, BigQueryPostingStore, JobPosting,
+                          PostingRegistry, SqlitePostingStore, embedding_text, parse_artifacts)
+from knowledge_base import DiscoveryEngineBackend, FallbackBackend, LocalIndex, as_search_fn
+from pdf_extract import extract_pdf_text
+from rate_limit import TokenBucket
+from retrieval import KnowledgeBaseRetriever
+from streaming import END_MARKER, iter_response_text, response_usage, strip_marker
 
 # --- KONFIGURACJA ---
-BUCKET_NAME = "rekrutacja-pliki-2026"
-GCP_PROJECT_ID = "ai-rekruter"
-GCP_GEMINI_LOCATION = "europe-central2"
-GCP_SEARCH_LOCATION = "global"
-DATA_STORE_ID = "wiedza-rekruter_1768770519228"
-BIGQUERY_DATASET_ID = "rekrutacja_hr"
-BIGQUERY_TABLE_ID = "Kandydaci"
-MODEL_NAME = "gemini-2.5-flash-lite"
-
-# --- ZMIENNE GLOBALNE ---
-bigquery_client = None
-storage_client = None
-search_client = None
-model = None
-
-
-# --- INICJALIZACJA GCP (METODA BEZPOŚREDNIA) ---
-@st.cache_resource
-def setup_gcp_clients():
-    # Sprawdzenie czy secrets istnieją
-    if 'gcp_service_account' not in st.secrets:
-        raise Exception("Brak sekcji [gcp_service_account] w secrets.toml na Streamlit Cloud.")
-
-    try:
-        # 1. Pobranie klucza bezpośrednio z secrets
-        # json.loads parsuje string do słownika
-        key_info = json.loads(st.secrets["gcp_service_account"]["keyfile_json"])
-        credentials = service_account.Credentials.from_service_account_info(key_info)
+# Projekt, zasoby i model GCP są w config.py; klienci powstają leniwie w gcp_clients.py
+RAG_BACKEND = os.environ.get("RAG_BACKEND", "discovery")  # "discovery" (z lokalnym zapasem) albo "local"
+RAG_TOP_K = 3
+RAG_REMOTE_TIMEOUT_SECONDS = 1.5  # Po tym czasie odpowiada lokalny indeks (jeśli KB_SOURCE jest ustawione)
+RAG_MAX_WORKERS = 4
+RAG_CACHE_SIZE = 512
+RAG_CACHE_TTL_SECONDS = 15 * 60
+EVENT_SPOOL_PATH = os.environ.get("EVENT_SPOOL_PATH", ".spool/bq_events.sqlite")
+EVENT_BATCH_SIZE = 200
+EVENT_FLUSH_INTERVAL_SECONDS = 2.0
+CV_CACHE_PATH = os.environ.get("CV_CACHE_PATH", ".cache/cv_cache.sqlite")
+CV_CACHE_MAX_BYTES = 200 * 1024 * 1024
+CV_ANALYSIS_TOKEN_BUDGET = 4000  # Limit tokenów tekstu CV w prompcie analizy
+CHAT_TOKEN_BUDGET = 6000  # Limit tokenów wejściowych promptu rozmowy (RAG + ogłoszenie + historia)
+CHAT_KEEP_LAST_MESSAGES = 6  # Tyle ostatnich wiadomości idzie do promptu dosłownie
+CHAT_SUMMARY_FOLD_EVERY = 4  # Starsze wiadomości dopisujemy do streszczenia paczkami
+POSTINGS_DB_PATH = os.environ.get("POSTINGS_DB_PATH", ".cache/postings.sqlite")
+POSTINGS_REFRESH_SECONDS = 60.0  # Co tyle sprawdzamy ogłoszenia zapisane w innych procesach
+RANKING_REFRESH_OVERLAP = timedelta(minutes=10)  # Zapas na zdarzenia cv_uploaded zapisane z opóźnieniem
+METRICS_EXPORT_PATH = os.environ.get("METRICS_EXPORT_PATH", ".metrics/metrics.jsonl")
+METRICS_EXPORT_INTERVAL_SECONDS = 60.0
+
+# Czasy etapów (PDF, GCS, wyszukiwanie, Gemini, BigQuery) trafiają do metrics.py; okresowy eksport do JSONL
+metrics.start_export(METRICS_EXPORT_PATH, METRICS_EXPORT_INTERVAL_SECONDS)
 
-        # 2. Inicjalizacja klientów z jawnym przekazaniem credentials
-        bq_client = bigquery.Client(credentials=credentials, project=GCP_PROJECT_ID)
-        st_client = storage.Client(credentials=credentials, project=GCP_PROJECT_ID)
 
-        if GCP_SEARCH_LOCATION == "global":
-            api_endpoint = "discoveryengine.googleapis.com"
-        else:
-            api_endpoint = f"{GCP_SEARCH_LOCATION}-discoveryengine.googleapis.com"
-
-        client_options = ClientOptions(api_endpoint=api_endpoint)
-        sr_client = discoveryengine.SearchServiceClient(
-            client_options=client_options,
-            credentials=credentials
-        )
+# --- FUNKCJE LOGICZNE ---
 
-        vertexai.init(
-            project=GCP_PROJECT_ID,
-            location=GCP_GEMINI_LOCATION,
-            credentials=credentials
-        )
-        ai_model = GenerativeModel(MODEL_NAME)
+def store_cv_blob(data, file_name, digest, bucket_name=BUCKET_NAME):
+    """Zapis CV w GCS pod skrótem treści (rzuca wyjątki - używany przez potok przyjęcia CV)."""
+    storage_client = gcp_clients.storage_client()
+    blob_name = cv_blob_name(digest)
+    with metrics.timed("gcs.upload"):
+        blob = storage_client.bucket(bucket_name).blob(blob_name)
+        if not blob.exists():
+            blob.metadata = {"original_name": file_name}
+            blob.upload_from_string(data, content_type="application/pdf")
+    return f"gs://{bucket_name}/{blob_name}"
 
-        return bq_client, st_client, sr_client, ai_model
 
+def upload_to_gcs(uploaded_file, bucket_name, digest=None):
+    """Zapisuje CV w GCS pod skrótem SHA-256 treści; istniejący obiekt nie jest wysyłany ponownie."""
+    try:
+        data = uploaded_file.getvalue()
+        return store_cv_blob(data, uploaded_file.name, digest or cv_digest(data), bucket_name)
     except Exception as e:
-        raise Exception(f"Błąd inicjalizacji GCP w Rekruter_AI: {str(e)}")
+        st.error(f"Błąd GCS: {e}")
+        return None
 
 
-# Wywołanie inicjalizacji (Tylko raz!)
-try:
-    bigquery_client, storage_client, search_client, model = setup_gcp_clients()
-    st.session_state.gcp_clients_initialized = True
-except Exception as e:
-    st.session_state.gcp_clients_initialized = False
-    st.session_state.gcp_init_error = str(e)
+@st.cache_resource
+def get_cv_cache():
+    # Cache tekstu i analizy CV wg skrótu SHA-256 - współdzielony przez wszystkie sesje
+    return CvCache(CV_CACHE_PATH, max_bytes=CV_CACHE_MAX_BYTES)
 
 
-# --- FUNKCJE LOGICZNE ---
+@st.cache_resource
+def get_intake_pipeline():
+    # Upload i ekstrakcja równolegle, analiza zaraz po ekstrakcji; pula wątków współdzielona przez sesje
+    return CvIntakePipeline(metrics.wrap("pdf.parse", extract_pdf_text), store_cv_blob, analyze_cv_with_gemini,
+                            cache=get_cv_cache(), embed_fn=embed_analysis)
+
 
-def upload_to_gcs(uploaded_file, bucket_name):
-    if not storage_client: raise Exception("Klient Storage nie jest zainicjowany.")
+def analyze_cv_with_gemini(cv_text):
+    """Jedno wywołanie modelu ze schematem JSON; tekst CV znormalizowany i przycięty do budżetu tokenów."""
+    if not gcp_clients.try_client("model"): return {"summary": "Model niedostępny", "candidate_name": None, "error": True}
+    prompt = ANALYSIS_PROMPT.format(cv_text=prepare_cv_text(cv_text, CV_ANALYSIS_TOKEN_BUDGET, count_tokens))
     try:
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(uploaded_file.name)
-        blob.upload_from_file(uploaded_file, rewind=True)
-        return f"gs://{bucket_name}/{uploaded_file.name}"
+        with metrics.timed("gemini.analyze_cv") as span:
+            response = llm_gateway.generate(prompt, CV_GENERATION_CONFIG)
+            span.usage(response_usage(response))
+        return parse_analysis(response.text)
     except Exception as e:
-        st.error(f"Błąd GCS: {e}")
-        return None
+        return {"summary": f"Błąd AI: {e}", "candidate_name": None, "error": True}
 
 
-def analyze_cv_with_gemini(cv_text):
-    if not model: return {"summary": "Model niedostępny", "candidate_name": "Nieznany"}
-    prompt = f"""
-    Jesteś analitykiem HR. Przeanalizuj CV:
-    1. Wyciągnij: Imię, Ostatnie Stanowisko, Nazwę Firmy.
-    Format: Imię: [X], Stanowisko: [Y], Firma: [Z].
-    2. Stwórz podsumowanie umiejętności i doświadczenia.
-    CV: {cv_text}
-    """
+@st.cache_resource
+def get_local_index():
+    # Dokumenty bazy wiedzy wczytywane raz na proces; indeks BM25 odpowiada bez zapytań sieciowych
     try:
-        response = model.generate_content(prompt)
-        text = response.text
-        name, job, company = None, None, None
-        for line in text.split('\n'):
-            if "imię:" in line.lower(): name = line.split(":", 1)[1].strip()
-            if "stanowisko:" in line.lower(): job = line.split(":", 1)[1].strip()
-            if "firma:" in line.lower(): company = line.split(":", 1)[1].strip()
-        return {"summary": text, "candidate_name": name, "last_job": job, "last_company": company}
+        return LocalIndex.from_source(KB_SOURCE)
     except Exception as e:
-        return {"summary": f"Błąd AI: {e}", "candidate_name": None}
+        st.warning(f"Nie udało się zbudować lokalnego indeksu bazy wiedzy: {e}")
+        return LocalIndex([])
+
+
+@st.cache_resource
+def get_rag_backend():
+    if RAG_BACKEND == "local":
+        return get_local_index()
+    remote = DiscoveryEngineBackend()
+    if not KB_SOURCE:
+        return remote
+    return FallbackBackend(remote, get_local_index(), timeout=RAG_REMOTE_TIMEOUT_SECONDS)
+
+
+@st.cache_resource
+def get_retriever():
+    # Jeden retriever (pula wątków + cache) na proces, współdzielony przez wszystkie sesje
+    return KnowledgeBaseRetriever(as_search_fn(get_rag_backend(), RAG_TOP_K), max_workers=RAG_MAX_WORKERS,
+                                  cache_size=RAG_CACHE_SIZE, ttl_seconds=RAG_CACHE_TTL_SECONDS)
 
 
 def search_in_knowledge_base(query):
-    if not search_client: return ""
-    serving_config = f"projects/{GCP_PROJECT_ID}/locations/{GCP_SEARCH_LOCATION}/collections/default_collection/dataStores/{DATA_STORE_ID}/servingConfigs/default_config"
-    req = discoveryengine.SearchRequest(
-        serving_config=serving_config, query=query, page_size=3,
-        content_search_spec=discoveryengine.SearchRequest.ContentSearchSpec(
-            snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(return_snippet=True)
-        )
-    )
+    return get_retriever().search(query)
+
+
+def _insert_event_rows(rows, row_ids):
+    table = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+    with metrics.timed("bigquery.insert") as span:
+        errors = gcp_clients.bigquery_client().insert_rows_json(table, rows, row_ids=row_ids)
+        if errors:
+            span.error = "InsertRowsError"
+    return errors
+
+
+@st.cache_resource
+def get_event_writer():
+    # Jeden writer na proces - paczkuje zdarzenia ze wszystkich sesji
+    return EventWriter(_insert_event_rows, spool_path=EVENT_SPOOL_PATH, batch_size=EVENT_BATCH_SIZE,
+                       flush_interval=EVENT_FLUSH_INTERVAL_SECONDS)
+
+
+def record_event(row):
+    """Kolejkuje wiersz zdarzenia do zapisu w BigQuery (UI czeka tylko na lokalny zapis)."""
+    return get_event_writer().enqueue(row)
+
+
+@st.cache_resource
+def get_embedding_limiter():
+    # Wspólny limit tempa wywołań modelu embeddingów - odbudowa indeksu nie zużyje całej quota zgłoszeń
+    return TokenBucket.per_minute(EMBEDDING_CALLS_PER_MINUTE, capacity=10)
+
+
+def embed_texts(texts, task_type="RETRIEVAL_DOCUMENT"):
+    """Embeddingi tekstów z Vertex AI (listy float) albo None, gdy model embeddingów jest niedostępny."""
+    embedding_model = gcp_clients.try_client("embedding")
+    if not embedding_model or not texts:
+        return None
+    from vertexai.language_models import TextEmbeddingInput
+    metrics.record("vertex.embed_wait", get_embedding_limiter().acquire())
+    with metrics.timed("vertex.embed"):
+        result = embedding_model.get_embeddings([TextEmbeddingInput(text, task_type) for text in texts])
+    return [list(e.values) for e in result]
+
+
+def preprocess_posting(title, text):
+    """Artefakty ogłoszenia liczone raz przy zapisie: wymagania, streszczenie, kontekst RAG i embedding."""
+    artifacts = {}
+    if gcp_clients.try_client("model"):
+        try:
+            with metrics.timed("gemini.posting") as span:
+                response = llm_gateway.generate(ARTIFACTS_PROMPT.format(title=title, text=text),
+                                                ARTIFACTS_GENERATION_CONFIG)
+                span.usage(response_usage(response))
+            artifacts.update(parse_artifacts(response.text))
+        except Exception as e:
+            st.warning(f"Nie udało się przetworzyć ogłoszenia przez model: {e}")
+    artifacts["kontekst_rag"] = get_retriever().job_context(text)
+    try:
+        vectors = embed_texts([embedding_text(title, artifacts, text)], task_type="RETRIEVAL_QUERY")
+        artifacts["embedding"] = vectors[0] if vectors else None
+    except Exception as e:
+        st.warning(f"Nie udało się policzyć embeddingu ogłoszenia: {e}")
+    return artifacts
+
+
+@st.cache_resource
+def get_posting_registry():
+    # Ogłoszenia współdzielone przez wszystkie sesje (i procesy - przez BigQuery albo plik SQLite)
+    if BIGQUERY_POSTINGS_TABLE_ID:
+        store = BigQueryPostingStore(gcp_clients.bigquery_client, table_ref(BIGQUERY_POSTINGS_TABLE_ID))
+    else:
+        store = SqlitePostingStore(POSTINGS_DB_PATH)
+    return PostingRegistry(store, preprocess_posting, refresh_seconds=POSTINGS_REFRESH_SECONDS)
+
+
+def embed_analysis(analysis):
+    """Embedding analizy CV dla rankingu (etap potoku przyjęcia CV, zapamiętywany w cache CV)."""
+    vectors = embed_texts([analysis_text(analysis)])
+    return vectors[0] if vectors else None
+
+
+def _cached_embedding_fn(rows):
+    """
+    Uzupełnia brakujące embedding_cv z cache CV (skrót pliku z url_cv_gcs) i zwraca embed_fn dla indeksu,
+    która nowo policzone embeddingi też zapisuje w cache - restart procesu nie liczy ich ponownie.
+    """
+    cache = get_cv_cache()
+    digests = {}
+    for row in rows:
+        digest = digest_from_url(row.get("url_cv_gcs"))
+        if digest and not row.get("embedding_cv"):
+            digests[row["id_kandydata"]] = digest
+    cached = cache.embeddings(set(digests.values()))
+    by_text = {}
+    for row in rows:
+        digest = digests.get(row["id_kandydata"])
+        if digest in cached:
+            row["embedding_cv"] = cached[digest]
+        elif digest and row.get("umiejetnosci_tech"):
+            by_text.setdefault(row["umiejetnosci_tech"], []).append(digest)
+
+    def embed_and_cache(texts):
+        vectors = embed_texts(texts)
+        for text, vector in zip(texts, vectors or []):
+            for digest in by_text.get(text, ()):
+                cache.put(digest, embedding=vector)
+        return vectors
+    return embed_and_cache
+
+
+def refresh_ranking_index(index=None):
+    """Dociąga do indeksu rankingu kandydatów zapisanych od ostatniego odczytu (w tym przez inne procesy)."""
+    if index is None:
+        index = get_ranking_index()
+    with metrics.timed("ranking.load"):
+        rows = queries.cv_embeddings(gcp_clients.bigquery_client(), table_ref(),
+                                     since=index.refresh_since(RANKING_REFRESH_OVERLAP),
+                                     with_embeddings=BIGQUERY_CV_EMBEDDINGS,
+                                     with_postings=bool(BIGQUERY_POSTINGS_TABLE_ID))
+        return index.load(rows, embed_fn=_cached_embedding_fn(rows))
+
+
+def _load_ranking_index(index):
     try:
-        resp = search_client.search(req)
-        snippets = [r.document.derived_struct_data["snippets"][0]["snippet"] for r in resp.results if
-                    "snippets" in r.document.derived_struct_data]
-        return "\n---\n".join(snippets)
+        refresh_ranking_index(index)
     except Exception:
-        return ""
+        pass  # błąd trafia do metryk (ranking.load); indeks działa dalej na embeddingach nowych CV
 
 
-def chat_with_ai(history, job_desc):
-    if not model: return "Błąd modelu.", True
-    user_msg = history[-1]["content"]
+@st.cache_resource
+def get_ranking_index():
+    # Jeden indeks embeddingów CV na proces; odbudowa z BigQuery w tle, żeby nie blokować pierwszej sesji
+    index = EmbeddingIndex()
+    threading.Thread(target=_load_ranking_index, args=(index,), name="ranking-load", daemon=True).start()
+    return index
 
-    rag_context = search_in_knowledge_base(user_msg)
-    if job_desc:
-        rag_context += "\n" + search_in_knowledge_base(job_desc[:50])
 
-    prompt = f"""
+def rank_candidates(posting, k=None):
+    """[(id_kandydata, podobieństwo)] najlepiej dopasowanych do ogłoszenia - bez wywołań modelu."""
+    if posting is None or not posting.embedding:
+        return []
+    return get_ranking_index().rank(posting.embedding, k, posting_id=posting.id_ogloszenia)
+
+
+CHAT_ERROR_REPLY = "Błąd: nie udało się teraz odpowiedzieć. Wyślij proszę swoją wiadomość jeszcze raz."
+
+
+def _user_wants_to_end(user_msg):
+    return any(x in user_msg.lower() for x in ["dziękuję", "koniec"])
+
+
+CHAT_PROMPT_TEMPLATE = """
     Jesteś rekruterem IT (Fabian). 
     Twoje zasady:
     1. Odpowiadaj na pytania kandydata używając: {rag_context}
     2. Jeśli nie ma pytań, prowadź wywiad rekrutacyjny dot. stanowiska: {job_desc}
-    3. Na koniec podziękuj i dodaj [KONIEC ROZMOWY].
+    3. Na koniec podziękuj i dodaj {end_marker}.
+
+    Streszczenie wcześniejszej części rozmowy:
+    {summary}
 
     Historia:
-    {history}
+    {recent}
     """
+
+
+@st.cache_resource
+def _local_tokenizer():
+    # Lokalny tokenizer Vertex AI liczy tokeny bez zapytania sieciowego (o ile zna model)
     try:
-        resp = model.generate_content(prompt)
-        end = "[KONIEC ROZMOWY]" in resp.text or any(x in user_msg.lower() for x in ["dziękuję", "koniec"])
-        return resp.text.replace("[KONIEC ROZMOWY]", ""), end
-    except Exception as e:
-        return f"Błąd: {e}", True
+        from vertexai.preview import tokenization
+        return tokenization.get_tokenizer_for_model(MODEL_NAME)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _count_tokens_cached(text):
+    # Błąd licznika nie trafia do cache - przybliżenie liczy count_tokens tylko dla tego wywołania
+    tokenizer = _local_tokenizer()
+    if tokenizer is not None:
+        return tokenizer.count_tokens(text).total_tokens
+    with metrics.timed("gemini.count_tokens"):
+        return gcp_clients.model().count_tokens(text).total_tokens
+
+
+def count_tokens(text):
+    """Liczba tokenów wg licznika modelu (z cache - ogłoszenie i streszczenie powtarzają się co turę)."""
+    if not text: return 0
+    if not gcp_clients.try_client("model"): return len(text) // 4 + 1
+    try:
+        return _count_tokens_cached(text)
+    except Exception:
+        # Awaryjnie: przybliżenie ~4 znaki na token
+        return len(text) // 4 + 1
+
+
+def summarize_conversation(previous_summary, messages):
+    """Dopisuje kolejne tury do streszczenia rozmowy (krótko, bez utraty faktów o kandydacie)."""
+    prompt = f"""
+    Aktualizujesz streszczenie rozmowy rekrutacyjnej. Zachowaj fakty o kandydacie
+    (doświadczenie, technologie, oczekiwania, zadane pytania i odpowiedzi). Maksymalnie 150 słów.
+
+    Dotychczasowe streszczenie:
+    {previous_summary or "(brak)"}
+
+    Nowe wiadomości:
+    {format_turns(messages)}
+    """
+    try:
+        with metrics.timed("gemini.summarize") as span:
+            response = llm_gateway.generate(prompt, {"max_output_tokens": 400})
+            span.usage(response_usage(response))
+        return response.text
+    except Exception:
+        # Bez modelu nie gubimy treści - dopisujemy surowe tury (i tak zostaną przycięte budżetem)
+        return (previous_summary + "\n" + format_turns(messages)).strip()
+
+
+@st.cache_resource
+def get_conversation_context():
+    return ConversationContext(summarize_conversation, count_tokens, keep_last_messages=CHAT_KEEP_LAST_MESSAGES,
+                               fold_every=CHAT_SUMMARY_FOLD_EVERY, token_budget=CHAT_TOKEN_BUDGET)
+
+
+def _build_chat_prompt(history, job, state=None):
+    """`job` to ogłoszenie z rejestru (JobPosting) albo sama treść ogłoszenia."""
+    if state is None:
+        state = st.session_state
+    user_msg = history[-1]["content"]
+    if isinstance(job, JobPosting) and job.kontekst_rag:
+        # Kontekst stanowiska policzony przy zapisie ogłoszenia - w turze szukamy tylko pytania kandydata
+        job_desc = job.prompt_text()
+        rag_context = "\n".join(filter(None, [get_retriever().context_for_turn(user_msg, None), job.kontekst_rag]))
+    else:
+        job_desc = job.prompt_text() if isinstance(job, JobPosting) else job
+        rag_context = get_retriever().context_for_turn(user_msg, job_desc)
+
+    fixed_tokens = count_tokens(CHAT_PROMPT_TEMPLATE)
+    sections = get_conversation_context().build(state, history, rag_context, job_desc, fixed_tokens=fixed_tokens)
+    return CHAT_PROMPT_TEMPLATE.format(end_marker=END_MARKER, **sections)
+
+
+def chat_with_ai(history, job, state=None):
+    """(odpowiedź, czy koniec rozmowy). Błąd modelu nie kończy rozmowy - zwracamy CHAT_ERROR_REPLY."""
+    if not gcp_clients.try_client("model"): return CHAT_ERROR_REPLY, False
+    user_msg = history[-1]["content"]
+    prompt = _build_chat_prompt(history, job, state)
+    try:
+        with metrics.timed("gemini.chat") as span:
+            resp = llm_gateway.generate(prompt)
+            span.usage(response_usage(resp))
+        end = END_MARKER in resp.text or _user_wants_to_end(user_msg)
+        return resp.text.replace(END_MARKER, ""), end
+    except Exception:
+        # Bramka już ponowiła błędy przejściowe; kandydat może wysłać odpowiedź jeszcze raz
+        return CHAT_ERROR_REPLY, False
+
+
+def chat_with_ai_stream(history, job, state, session_state=None):
+    """
+    Wersja strumieniowa `chat_with_ai` - generator fragmentów odpowiedzi (bez znacznika końca).
+    Po wyczerpaniu generatora `state["ended"]` mówi, czy rozmowa się zakończyła,
+    a `state["error"]` - czy strumień przerwał błąd (rozmowa trwa dalej). Komunikatu błędu nie doklejamy
+    do strumienia - pokazuje go wywołujący, osobno od ewentualnego fragmentu odpowiedzi.
+    """
+    state["ended"] = False
+    state["error"] = False
+    if not gcp_clients.try_client("model"):
+        state["error"] = True
+        return
+    user_msg = history[-1]["content"]
+    prompt = _build_chat_prompt(history, job, session_state)
+    try:
+        with metrics.timed("gemini.chat_stream") as span:
+            usage = {}
+            responses = llm_gateway.generate(prompt, stream=True)
+            chunks = metrics.time_to_first("gemini.chat_first_token", iter_response_text(responses, usage))
+            yield from strip_marker(chunks, state)
+            span.usage(usage)
+        state["ended"] = state["marker_found"] or _user_wants_to_end(user_msg)
+    except Exception:
+        state["error"] = True
 
 
 def run_candidate_interface():
@@ -167,39 +423,58 @@ def run_candidate_interface():
         st.session_state.messages = []
 
     if not st.session_state.cv_uploaded_id:
+        postings = get_posting_registry().list()
+        if len(postings) > 1:
+            posting = st.selectbox("Stanowisko", postings, format_func=lambda p: p.tytul)
+        else:
+            posting = postings[0] if postings else None
+        st.session_state.posting_id = posting.id_ogloszenia if posting else None
         uploaded = st.file_uploader("Prześlij CV (PDF)", type="pdf")
         if uploaded:
             with st.spinner("Analiza..."):
-                text = ""
                 try:
-                    pdf = PdfReader(uploaded)
-                    for p in pdf.pages: text += p.extract_text()
-                except:
-                    st.error("Błąd PDF"); st.stop()
-
-                url = upload_to_gcs(uploaded, BUCKET_NAME)
-                analysis = analyze_cv_with_gemini(text)
+                    intake = get_intake_pipeline().run(uploaded.getvalue(), uploaded.name)
+                except IntakeError as e:
+                    if e.stage == "extract":
+                        st.error(f"Błąd PDF: {e.cause}")
+                    elif e.stage == "upload":
+                        st.error(f"Błąd GCS: {e.cause}")
+                    elif isinstance(e.cause, AnalysisError):
+                        st.error(str(e.cause))  # summary z analyze_cv_with_gemini ma już prefiks "Błąd AI"
+                    else:
+                        st.error(f"Błąd AI: {e.cause}")
+                    st.stop()
+                text, analysis, url = intake.text, intake.analysis, intake.gcs_url
+                if intake.extraction is not None and intake.extraction.truncated:
+                    st.info(f"Przeanalizowano pierwsze {intake.extraction.pages_extracted} "
+                            f"z {intake.extraction.page_count} stron CV.")
                 cid = str(uuid.uuid4())
 
                 row = {
                     "id_kandydata": cid, "nazwa_pliku_cv": uploaded.name, "url_cv_gcs": url,
                     "data_aplikacji": datetime.now().isoformat(), "tresc_cv": text,
-                    "umiejetnosci_tech": analysis["summary"], "status_rekrutacji": "CV przesłane",
+                    "umiejetnosci_tech": analysis_text(analysis), "status_rekrutacji": "CV przesłane",
                     "event_type": "cv_uploaded"
                 }
-
-                if bigquery_client:
-                    errors = bigquery_client.dataset(BIGQUERY_DATASET_ID).table(BIGQUERY_TABLE_ID).insert_rows_json(
-                        [row])
-                    if not errors:
-                        st.session_state.cv_uploaded_id = cid
-                        msg = f"Cześć {analysis.get('candidate_name', 'Kandydacie')}! Opowiedz o swoim doświadczeniu."
-                        st.session_state.messages = [{"role": "assistant", "content": msg}]
-                        st.rerun()
-                    else:
-                        st.error(f"Błąd zapisu do BigQuery: {errors}")
-                else:
-                    st.error("Klient BigQuery nie został zainicjowany.")
+                if BIGQUERY_CV_COLUMNS:
+                    row.update(bigquery_fields(analysis))
+                if BIGQUERY_POSTINGS_TABLE_ID:
+                    row["id_ogloszenia"] = st.session_state.posting_id
+                # Embedding CV z potoku przyjęcia (albo z cache CV) - ranking w panelu HR to już tylko iloczyn macierzy
+                if intake.embedding:
+                    get_ranking_index().add(cid, intake.embedding, st.session_state.posting_id)
+                    if BIGQUERY_CV_EMBEDDINGS:
+                        row["embedding_cv"] = intake.embedding
+
+                # Zdarzenie trafia do lokalnego spoolu; klient BigQuery powstaje dopiero przy wysyłce paczki
+                try:
+                    record_event(row)
+                except Exception as e:
+                    st.error(f"Błąd zapisu zdarzenia: {e}"); st.stop()
+                st.session_state.cv_uploaded_id = cid
+                msg = f"Cześć {greeting_name(analysis)}! Opowiedz o swoim doświadczeniu."
+                st.session_state.messages = [{"role": "assistant", "content": msg}]
+                st.rerun()
 
     if st.session_state.cv_uploaded_id:
         for m in st.session_state.messages:
@@ -211,22 +486,33 @@ def run_candidate_interface():
                 st.markdown(user_in)
 
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    reply, ended = chat_with_ai(st.session_state.messages,
-                                                st.session_state.get("active_job_description"))
-                    st.markdown(reply)
+                job = get_posting_registry().get(st.session_state.get("posting_id"))
+                if STREAM_RESPONSES:
+                    # Tokeny pojawiają się w dymku od razu, bez czekania na całą odpowiedź
+                    stream_state = {}
+                    reply = st.write_stream(chat_with_ai_stream(st.session_state.messages, job, stream_state))
+                    ended, failed = stream_state.get("ended", False), stream_state.get("error", False)
+                    if failed:
+                        st.error(CHAT_ERROR_REPLY)
+                else:
+                    with st.spinner("Thinking..."):
+                        reply, ended = chat_with_ai(st.session_state.messages, job)
+                        st.markdown(reply)
+                    failed = reply == CHAT_ERROR_REPLY
+                if failed:
+                    # Nieudana tura nie trafia do historii - kandydat wysyła wiadomość ponownie
+                    st.session_state.messages.pop()
+                else:
                     st.session_state.messages.append({"role": "assistant", "content": reply})
 
-                    if ended:
-                        st.success("Dziękujemy!")
-                        full_txt = str(st.session_state.messages)
-                        row = {
-                            "id_kandydata": st.session_state.cv_uploaded_id,
-                            "data_aplikacji": datetime.now().isoformat(),
-                            "transkrypcja_rozmowy_ai": full_txt,
-                            "status_rekrutacji": "Koniec rozmowy",
-                            "event_type": "transcript_saved"
-                        }
-                        if bigquery_client:
-                            bigquery_client.dataset(BIGQUERY_DATASET_ID).table(BIGQUERY_TABLE_ID).insert_rows_json(
-                                [row])
\ No newline at end of file
+                if ended:
+                    st.success("Dziękujemy!")
+                    full_txt = str(st.session_state.messages)
+                    row = {
+                        "id_kandydata": st.session_state.cv_uploaded_id,
+                        "data_aplikacji": datetime.now().isoformat(),
+                        "transkrypcja_rozmowy_ai": full_txt,
+                        "status_rekrutacji": "Koniec rozmowy",
+                        "event_type": "transcript_saved"
+                    }
+                    record_event(row)
\ No newline at end of file
@@ -1,22 +1,36 @@
+import time
+
+_RUN_T0 = time.perf_counter()
+
 import streamlit as st
 
 # TO MUSI BYĆ PIERWSZA LINIA
 st.set_page_config(page_title="Fabian AI Recruiter", layout="wide")
 
-# Importy
+# Importy (klienci GCP i biblioteki Google ładują się dopiero przy pierwszym użyciu - gcp_clients.py)
+import gcp_clients
+import llm_gateway
+import metrics
 import Rekruter_AI
 import hr_dashboard
+import hr_panel
+from candidate_list import STATUS_OPTIONS
+
+gcp_clients.record_startup("imports", time.perf_counter() - _RUN_T0)
 
 # --- DIAGNOSTYKA STARTOWA ---
-if not st.session_state.get("gcp_clients_initialized"):
+# Sprawdzamy tylko dane logowania - klienci powstaną przy pierwszym zapytaniu
+config_error = gcp_clients.config_error()
+if config_error:
     st.error("❌ APLIKACJA NIEDOSTĘPNA - Błąd inicjalizacji chmury.")
-    st.code(st.session_state.get('gcp_init_error', 'Nieznany błąd.'), language="text")
+    st.code(config_error, language="text")
     st.stop()
 
 # --- INTERFEJS ---
 st.title("Fabian: Platforma AI Rekrutera")
+gcp_clients.record_startup("first_paint", time.perf_counter() - _RUN_T0)
 
-tab1, tab2 = st.tabs(["🤖 Rozmowa z Kandydatem", "📊 Panel HR"])
+tab1, tab2, tab3 = st.tabs(["🤖 Rozmowa z Kandydatem", "📊 Panel HR", "⏱️ Wydajność"])
 
 with tab1:
     Rekruter_AI.run_candidate_interface()
@@ -26,24 +40,93 @@ with tab2:
 
     col1, col2 = st.columns([2, 1])
     with col1:
+        registry = Rekruter_AI.get_posting_registry()
+        title = st.text_input("Stanowisko", key="hr_title")
         desc = st.text_area("Wklej ogłoszenie o pracę", height=150, key="hr_desc")
-        if st.button("Zapisz ogłoszenie"):
-            st.session_state.active_job_description = desc
-            st.success("Zapisano!")
+        if st.button("Zapisz ogłoszenie") and desc.strip():
+            with st.spinner("Przetwarzanie ogłoszenia (wymagania, streszczenie, kontekst RAG)..."):
+                saved = registry.save(title.strip(), desc)
+            st.session_state.hr_posting_id = saved.id_ogloszenia
+            st.success(f"Zapisano ogłoszenie {saved.label()}.")
+
+        postings = registry.list()
+        ids = [p.id_ogloszenia for p in postings]
+        current = st.session_state.get("hr_posting_id")
+        posting = st.selectbox("Ogłoszenie", postings, format_func=lambda p: p.label(),
+                               index=ids.index(current) if current in ids else 0) if postings else None
+        if posting:
+            st.session_state.hr_posting_id = posting.id_ogloszenia
+            with st.expander("Wymagania i streszczenie ogłoszenia"):
+                st.markdown(posting.prompt_text())
+            if st.button("Zamknij ogłoszenie"):
+                registry.set_active(posting.id_ogloszenia, False)
+                st.rerun()
 
     with col2:
-        if st.button("Odśwież listę"): st.rerun()
+        if st.button("Odśwież listę"):
+            hr_panel.refresh_candidates()
+            st.rerun()
+        status_filter = st.selectbox("Status", ["Wszystkie"] + STATUS_OPTIONS)
+        ranked = st.checkbox("Ranking dopasowania do ogłoszenia (embeddingi)",
+                             value=True, disabled=not (posting and posting.embedding))
+        with st.expander("Cache wyszukiwania RAG"):
+            st.json(Rekruter_AI.get_retriever().stats())
+            backend = Rekruter_AI.get_rag_backend()
+            if hasattr(backend, "stats"):
+                st.json({"backend": Rekruter_AI.RAG_BACKEND, **backend.stats()})
+        with st.expander("Kolejka zapisów BigQuery"):
+            st.json(Rekruter_AI.get_event_writer().stats())
+        with st.expander("Cache CV"):
+            st.json(Rekruter_AI.get_cv_cache().stats())
+        with st.expander("Ogłoszenia"):
+            st.json(Rekruter_AI.get_posting_registry().stats())
+        with st.expander("Ranking kandydatów"):
+            st.json(Rekruter_AI.get_ranking_index().stats())
+        with st.expander("Cache raportów"):
+            st.json(hr_panel.get_report_cache().stats())
+        with st.expander("Start i klienci GCP"):
+            st.json({**gcp_clients.stats(), "last_rerun_s": st.session_state.get("last_rerun_s")})
 
-    candidates = hr_dashboard.get_candidates()
+    if "candidates_limit" not in st.session_state:
+        st.session_state.candidates_limit = hr_panel.CANDIDATES_PAGE_SIZE
+    status = None if status_filter == "Wszystkie" else status_filter
+    candidates = hr_panel.get_candidates(status=status, limit=st.session_state.candidates_limit,
+                                         posting=posting if ranked else None)
 
     if candidates:
         st.dataframe(candidates, use_container_width=True)
+        if len(candidates) >= st.session_state.candidates_limit and st.button("Pokaż kolejnych kandydatów"):
+            st.session_state.candidates_limit += hr_panel.CANDIDATES_PAGE_SIZE
+            st.rerun()
         selected_id = st.selectbox("Wybierz kandydata", [c['id_kandydata'] for c in candidates])
 
+        force_report = st.checkbox("Wymuś ponowne wygenerowanie raportu")
         if st.button("Generuj Raport"):
-            if not st.session_state.get("active_job_description"):
-                st.warning("Najpierw wklej treść ogłoszenia!")
+            if not posting:
+                st.warning("Najpierw zapisz ogłoszenie!")
             else:
-                hr_dashboard.generate_report(selected_id, st.session_state.get("active_job_description"))
+                hr_dashboard.generate_report(selected_id, posting.prompt_text(), force=force_report)
+
+        st.subheader("Ocena masowa")
+        hr_panel.batch_scoring_section(candidates, posting.prompt_text() if posting else "",
+                                       hr_dashboard.build_report_prompt, "app-batch")
+    else:
+        st.info("Brak kandydatów w bazie.")
+
+with tab3:
+    st.header("Wydajność etapów")
+    st.caption("Czasy z tego procesu (ostatnie pomiary każdego etapu). "
+               f"Podsumowania zapisywane są okresowo do {Rekruter_AI.METRICS_EXPORT_PATH}.")
+    perf = metrics.summary()
+    if perf:
+        st.dataframe(perf, use_container_width=True)
     else:
-        st.info("Brak kandydatów w bazie.")
\ No newline at end of file
+        st.info("Brak pomiarów - przeprowadź rozmowę albo wygeneruj raport.")
+    with st.expander("Bramka modelu (kolejka, ponowienia, scalone prompty)"):
+        st.json({**llm_gateway.stats(), "gauges": metrics.gauges()})
+    if st.button("Wyczyść pomiary"):
+        metrics.reset()
+        st.rerun()
+
+# Czas pełnego przebiegu skryptu - widoczny w diagnostyce przy następnym przebiegu
+st.session_state.last_rerun_s = round(time.perf_counter() - _RUN_T0, 3)
@@ -0,0 +1,320 @@
+# batch_ingest.py
+# Wsadowe przyjęcie CV z katalogu albo prefiksu GCS (np. paczki setek plików z portali ogłoszeniowych),
+# bez przechodzenia przez formularz Streamlit:
+# - tekst z PDF wyciągany jest w puli procesów pdf_extract (cały dokument w jednym procesie roboczym);
+#   dokument, który nie zmieści się w limicie czasu, jest oznaczany jako błędny, a jego proces zabijany,
+# - upload do GCS i analiza Gemini (analyze_cv_with_gemini) idą z ograniczoną równoległością;
+#   tempo wywołań modelu i tak pilnuje wspólna bramka llm_gateway,
+# - wszystkie wiersze cv_uploaded trafiają do BigQuery jednym zadaniem ładowania (NDJSON)
+#   zamiast insert_rows_json wiersz po wierszu - bez kosztu i limitów strumieniowania,
+# - postęp zapisywany jest w pliku kontrolnym (JSONL, dopisywany po każdym pliku), więc po awarii
+#   ponowne uruchomienie pomija pliki już przetworzone. Identyfikator zadania ładowania i jego lista plików
+#   trafiają do pliku kontrolnego przed wysłaniem zadania - po awarii najpierw sprawdzamy wynik tego zadania
+#   i ładujemy tylko pliki, których nie objęło, więc te same wiersze nie trafią do tabeli drugi raz.
+#
+#   python batch_ingest.py ./paczka_cv
+#   python batch_ingest.py gs://rekrutacja-pliki-2026/import/2026-10/ --workers 4 --concurrency 8
+#   python batch_ingest.py ./paczka_cv --posting-id <id_ogloszenia> --checkpoint .cache/ingest/paczka.jsonl
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import gcp_clients
+import metrics
+import pdf_extract
+from config import BIGQUERY_CV_COLUMNS, BIGQUERY_CV_EMBEDDINGS, BIGQUERY_POSTINGS_TABLE_ID, table_ref
+from cv_analysis import analysis_text, bigquery_fields
+from intake import CvIntakePipeline, IntakeError
+
+DEFAULT_CHECKPOINT_DIR = ".cache/ingest"
+EXTRACT_WORKERS = pdf_extract.POOL_WORKERS
+EXTRACT_TIMEOUT_SECONDS = 60.0  # Limit czasu ekstrakcji jednego PDF (z oczekiwaniem na wolny proces)
+ANALYSIS_CONCURRENCY = 8
+LOAD_JOB_PREFIX = "batch_ingest_"
+MAX_LOAD_ATTEMPTS = 5  # Kolejne identyfikatory zadania, gdy poprzednie zakończyło się błędem
+
+
+# --- Plik kontrolny ---
+
+class Checkpoint:
+    """
+    Plik JSONL dopisywany po każdym pliku: {"source", "status": "ready" | "failed" | "skipped", ...},
+    przed wysłaniem zadania ładowania: {"status": "loading", "job_id", "sources"}, a po jego rozstrzygnięciu:
+    {"status": "loaded" | "load_failed", "job_id", ...}. Decyduje ostatni wpis źródła; wpis "loaded"
+    zachowuje skrót pliku z wpisu "ready", żeby kolejne przebiegi nadal rozpoznawały duplikaty.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # źródło -> ostatni wpis
+        self.pending_load = None  # wpis "loading" zadania, którego wyniku jeszcze nie zapisaliśmy
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # urwana ostatnia linia po awarii
+                    self._apply(entry)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def _apply(self, entry):
+        status = entry.get("status")
+        if status == "loading":
+            self.pending_load = entry
+        elif status in ("loaded", "load_failed"):
+            self.pending_load = None
+            for source in entry.get("sources", []) if status == "loaded" else []:
+                digest = (self.entries.get(source) or {}).get("digest")
+                self.entries[source] = {"source": source, "status": "loaded", "job_id": entry["job_id"],
+                                        "digest": digest}
+        else:
+            self.entries[entry["source"]] = entry
+
+    def write(self, entry):
+        self._apply(entry)
+        self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def status(self, source):
+        return (self.entries.get(source) or {}).get("status")
+
+    def with_status(self, status):
+        return [e for e in self.entries.values() if e.get("status") == status]
+
+    def close(self):
+        self._fh.close()
+
+
+def default_checkpoint_path(source):
+    name = hashlib.sha256(source.rstrip("/").encode("utf-8")).hexdigest()[:16]
+    return os.path.join(DEFAULT_CHECKPOINT_DIR, f"{name}.jsonl")
+
+
+# --- Źródła plików ---
+
+def list_sources(source):
+    """[(źródło, nazwa pliku, funkcja czytająca bajty)] - pliki PDF z katalogu albo prefiksu gs://."""
+    if source.startswith("gs://"):
+        bucket, _, prefix = source[len("gs://"):].partition("/")
+        blobs = gcp_clients.storage_client().list_blobs(bucket, prefix=prefix)
+        return [(f"gs://{bucket}/{blob.name}", os.path.basename(blob.name), blob.download_as_bytes)
+                for blob in blobs if blob.name.lower().endswith(".pdf")]
+    out = []
+    for root, _, files in os.walk(source):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(root, name)
+                out.append((os.path.abspath(path), name, lambda path=path: _read_file(path)))
+    return out
+
+
+def _read_file(path):
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+# --- Ekstrakcja w puli procesów ---
+
+def _extract_in_pool(pool, timeout):
+    """
+    Ekstrakcja we własnej puli procesów (pdf_extract.WorkerPool): każdy dokument w całości w jednym procesie,
+    z limitem czasu (PdfExtractionError - plik dostaje status "failed" na etapie extract, zawieszony proces
+    jest zabijany). Wspólna pula pdf_extract i jej ustawienia pozostają nietknięte.
+    """
+    def extract(data):
+        return pdf_extract.extract_pdf_text(data, timeout=timeout, inline_pages=pdf_extract.MAX_PDF_PAGES, pool=pool)
+    return metrics.wrap("pdf.parse", extract)
+
+
+# --- Przetwarzanie pliku ---
+
+def _failed(source, stage, error):
+    return {"source": source, "status": "failed", "stage": stage, "error": str(error)}
+
+
+def _process(pipeline, source, file_name, read_fn, posting_id):
+    """Wpis pliku kontrolnego dla jednego CV (status "ready" z wierszem albo "failed" z etapem błędu)."""
+    try:
+        data = read_fn()
+    except Exception as e:
+        return _failed(source, "read", f"{type(e).__name__}: {e}")
+    try:
+        # Ten sam potok co w formularzu: upload i ekstrakcja równolegle, analiza zaraz po ekstrakcji, cache CV
+        intake = pipeline.run(data, file_name)
+    except IntakeError as e:
+        return _failed(source, e.stage, f"{type(e.cause).__name__}: {e.cause}")
+    analysis = intake.analysis or {}
+    if not (intake.text or "").strip():
+        return _failed(source, "extract", "PDF bez warstwy tekstowej")
+
+    row = {
+        "id_kandydata": str(uuid.uuid4()), "nazwa_pliku_cv": file_name, "url_cv_gcs": intake.gcs_url,
+        "data_aplikacji": datetime.now().isoformat(), "tresc_cv": intake.text,
+        "umiejetnosci_tech": analysis_text(analysis), "status_rekrutacji": "CV przesłane",
+        "event_type": "cv_uploaded"
+    }
+    if BIGQUERY_CV_COLUMNS:
+        row.update(bigquery_fields(analysis))
+    if BIGQUERY_POSTINGS_TABLE_ID and posting_id:
+        row["id_ogloszenia"] = posting_id
+    if BIGQUERY_CV_EMBEDDINGS and intake.embedding:
+        row["embedding_cv"] = intake.embedding  # brak embeddingu uzupełni odbudowa indeksu rankingu
+    return {"source": source, "status": "ready", "digest": intake.digest, "cached": intake.cached, "row": row}
+
+
+# --- Ładowanie do BigQuery ---
+
+def load_job_id(sources):
+    """Identyfikator zadania wyliczony z listy plików - ponowienie po awarii trafia na to samo zadanie."""
+    digest = hashlib.sha256("\n".join(sorted(sources)).encode("utf-8")).hexdigest()[:40]
+    return f"{LOAD_JOB_PREFIX}{digest}"
+
+
+def load_rows(client, table, rows, job_id, on_submit=None):
+    """
+    Jedno zadanie ładowania NDJSON (WRITE_APPEND). `on_submit(id_zadania)` wołane jest przed wysłaniem
+    każdej próby (zapis w pliku kontrolnym); zadanie zakończone błędem zastępuje kolejne id próby.
+    Zwraca (liczba załadowanych wierszy, id udanego zadania).
+    """
+    from google.api_core.exceptions import Conflict
+    from google.cloud import bigquery
+    payload = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+    job_config = bigquery.LoadJobConfig(source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+                                        write_disposition=bigquery.WriteDisposition.WRITE_APPEND)
+    with metrics.timed("bigquery.load"):
+        for attempt in range(MAX_LOAD_ATTEMPTS):
+            attempt_id = job_id if attempt == 0 else f"{job_id}_{attempt}"
+            if on_submit:
+                on_submit(attempt_id)
+            try:
+                job = client.load_table_from_file(io.BytesIO(payload), table, job_id=attempt_id,
+                                                  job_config=job_config)
+            except Conflict:
+                job = client.get_job(attempt_id)  # zadanie utworzone przed awarią - czekamy na jego wynik
+            try:
+                job.result()
+            except Exception:
+                if not job.error_result:
+                    raise  # nie wiadomo, czy zadanie się udało - rozstrzygnie resolve_pending_load
+                continue
+            return job.output_rows, attempt_id
+    raise RuntimeError(f"Wszystkie zadania ładowania {job_id} zakończyły się błędem")
+
+
+def resolve_pending_load(client, checkpoint):
+    """
+    Rozstrzyga zadanie zapisane w pliku kontrolnym jako "loading" (przebieg przerwany w trakcie ładowania):
+    czeka na jego wynik i oznacza objęte nim pliki jako załadowane. Zwraca liczbę załadowanych wierszy.
+    """
+    entry = checkpoint.pending_load
+    if entry is None:
+        return 0
+    from google.api_core.exceptions import NotFound
+    try:
+        job = client.get_job(entry["job_id"])
+    except NotFound:
+        job = None  # awaria przed utworzeniem zadania
+    if job is not None:
+        try:
+            job.result()
+        except Exception:
+            pass  # zadanie zakończone błędem - decyduje error_result
+    if job is not None and not job.error_result:
+        checkpoint.write({"status": "loaded", "job_id": entry["job_id"], "sources": entry["sources"]})
+        return job.output_rows
+    checkpoint.write({"status": "load_failed", "job_id": entry["job_id"]})
+    return 0
+
+
+# --- CLI ---
+
+def ingest(source, checkpoint_path=None, workers=EXTRACT_WORKERS, concurrency=ANALYSIS_CONCURRENCY,
+           posting_id=None, load=True, extract_timeout=EXTRACT_TIMEOUT_SECONDS):
+    import Rekruter_AI as app
+
+    checkpoint = Checkpoint(checkpoint_path or default_checkpoint_path(source))
+    files = list_sources(source)
+    todo = [f for f in files if checkpoint.status(f[0]) not in ("ready", "loaded", "skipped")]
+    print(f"Pliki PDF: {len(files)}, do przetworzenia: {len(todo)} (plik kontrolny: {checkpoint.path})")
+
+    t0 = time.perf_counter()
+    seen_digests = {e.get("digest") for e in checkpoint.with_status("ready") + checkpoint.with_status("loaded")}
+    extract_pool = pdf_extract.WorkerPool(max(1, workers))
+    extract_fn = _extract_in_pool(extract_pool, extract_timeout)
+    pipeline = CvIntakePipeline(extract_fn, app.store_cv_blob, app.analyze_cv_with_gemini,
+                                cache=app.get_cv_cache(), max_workers=2 * max(1, concurrency),
+                                embed_fn=app.embed_analysis)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="ingest") as pool:
+            futures = [pool.submit(_process, pipeline, source_id, name, read_fn, posting_id)
+                       for source_id, name, read_fn in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                entry = future.result()
+                if entry["status"] == "ready" and entry["digest"] in seen_digests:
+                    entry = {"source": entry["source"], "status": "skipped", "digest": entry["digest"],
+                             "error": "Ten sam plik CV jest już w paczce"}
+                seen_digests.add(entry.get("digest"))
+                checkpoint.write(entry)
+                if entry["status"] != "ready":
+                    print(f"  [{done}/{len(todo)}] {entry['source']}: {entry.get('stage', entry['status'])} - "
+                          f"{entry['error']}")
+                elif done % 25 == 0 or done == len(todo):
+                    print(f"  [{done}/{len(todo)}] przetworzono")
+    finally:
+        extract_pool.shutdown()
+    elapsed = time.perf_counter() - t0
+
+    loaded_rows = 0
+    if load and checkpoint.pending_load:
+        print(f"Sprawdzanie zadania ładowania z przerwanego przebiegu ({checkpoint.pending_load['job_id']})...")
+        loaded_rows = resolve_pending_load(gcp_clients.bigquery_client(), checkpoint)
+    ready = checkpoint.with_status("ready")
+    if load and ready:
+        sources = [e["source"] for e in ready]
+        job_id = load_job_id(sources)
+        print(f"Ładowanie {len(ready)} wierszy do {table_ref()} (zadanie {job_id})...")
+        # Data zgłoszenia = chwila ładowania: wiersze przetworzone dawno temu (albo w przerwanym przebiegu)
+        # muszą być nowsze niż znaki wodne list kandydatów i tabeli stanu, inaczej ich odświeżanie je pominie
+        loaded_at = datetime.now().isoformat()
+        batch = [{**e["row"], "data_aplikacji": loaded_at} for e in ready]
+        rows, job_id = load_rows(gcp_clients.bigquery_client(), table_ref(), batch, job_id,
+                                 on_submit=lambda attempt_id: checkpoint.write(
+                                     {"status": "loading", "job_id": attempt_id, "sources": sources}))
+        checkpoint.write({"status": "loaded", "job_id": job_id, "sources": sources})
+        loaded_rows += rows
+
+    failed = checkpoint.with_status("failed")
+    checkpoint.close()
+    print(f"Przetworzone w tym przebiegu: {len(todo)} w {elapsed:.1f} s, załadowane wiersze: {loaded_rows}, "
+          f"błędy: {len(failed)} (zostaną ponowione przy kolejnym uruchomieniu)")
+    for row in metrics.summary():
+        if row["etap"] in ("pdf.parse", "gcs.upload", "gemini.analyze_cv", "llm.wait", "bigquery.load"):
+            print(f"  {row['etap']:20s} n={row['wywolania']:<5d} p50={row['p50_ms']} ms p95={row['p95_ms']} ms "
+                  f"błędy={row['bledy']}")
+    return {"files": len(files), "processed": len(todo), "loaded_rows": loaded_rows, "failed": len(failed)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wsadowe przyjęcie CV (PDF) z katalogu albo prefiksu gs://.")
+    parser.add_argument("source", help="katalog z plikami PDF albo gs://bucket/prefiks/")
+    parser.add_argument("--checkpoint", help=f"plik kontrolny JSONL (domyślnie w {DEFAULT_CHECKPOINT_DIR}/)")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="procesy ekstrakcji tekstu")
+    parser.add_argument("--concurrency", type=int, default=ANALYSIS_CONCURRENCY, help="równoległe analizy CV")
+    parser.add_argument("--posting-id", help="ogłoszenie, do którego przypisać kandydatów")
+    parser.add_argument("--extract-timeout", type=float, default=EXTRACT_TIMEOUT_SECONDS,
+                        help="limit czasu ekstrakcji jednego PDF [s]")
+    parser.add_argument("--no-load", action="store_true", help="tylko przetwórz pliki, bez ładowania do BigQuery")
+    args = parser.parse_args()
+    ingest(args.source, args.checkpoint, args.workers, args.concurrency, args.posting_id, load=not args.no_load,
+           extract_timeout=args.extract_timeout)
@@ -0,0 +1,106 @@
+# batch_scoring.py
+# Masowa ocena kandydatów dla ogłoszenia: jedno zapytanie BigQuery po dane wszystkich wybranych
+# kandydatów, raporty Gemini z limitem równoległości i tempa, zapis wyniku (% dopasowania
+# i rekomendacji) z powrotem do BigQuery jako zdarzenie `report_scored`. Kolumny wyniku istnieją
+# dopiero po `migrations.py scores` - bez nich zdarzenie niesie tylko status "Oceniony".
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import queries
+from rate_limit import TokenBucket
+from report_cache import report_key
+from streaming import response_usage
+
+SCORE_EVENT_TYPE = "report_scored"
+SCORING_INSTRUCTION = """
+Na samym końcu raportu dodaj jedną, osobną linię dokładnie w formacie:
+WYNIK: <liczba 0-100>% | REKOMENDACJA: <Rekomenduję / Nie rekomenduję / Rekomenduję z zastrzeżeniami>
+"""
+_SCORE_RE = re.compile(r"WYNIK:\s*(\d{1,3})\s*%\s*\|?\s*REKOMENDACJA:\s*(.+)", re.IGNORECASE)
+
+
+def parse_score(report_text):
+    """Zwraca (procent dopasowania, rekomendacja) z ostatniej linii raportu albo (None, None)."""
+    matches = _SCORE_RE.findall(report_text or "")
+    if not matches:
+        return None, None
+    pct, recommendation = matches[-1]
+    return min(100, int(pct)), recommendation.strip().strip("*").strip()
+
+
+def score_candidates(candidate_ids, job_desc, client, table, generate_fn, build_prompt, write_fn=None,
+                     concurrency=4, calls_per_minute=60, on_progress=None, report_cache=None,
+                     cache_variant="batch", force=False, with_scores=False):
+    """
+    Generuje raporty dla wielu kandydatów. `build_prompt(job_desc, cv_analysis, transcript)` buduje
+    prompt raportu, `generate_fn(prompt) -> response` wywołuje model, `write_fn(rows)` zapisuje wyniki
+    i zwraca id_kandydata, których zapis jest potwierdzony (None - brak potwierdzenia).
+    `on_progress(done, total, result)` wywoływane jest w wątku wołającym (można w nim używać `st.*`).
+    Z `report_cache` niezmienione raporty nie są generowane ponownie (chyba że `force`); ich wynik jest
+    zapisywany ponownie, dopóki `write_fn` nie potwierdzi zapisu (znacznik `written` w cache).
+    Bez `with_scores` (tabela bez kolumn wyniku) zapisywany jest tylko status i nic nie jest oznaczane.
+    Zwraca listę słowników: id_kandydata, dopasowanie_procent, rekomendacja, raport, blad, z_cache, zapisany.
+    """
+    inputs = queries.report_inputs_many(client, table, candidate_ids)
+    limiter = TokenBucket.per_minute(calls_per_minute, capacity=concurrency)
+    keys = {}  # id_kandydata -> klucz raportu w cache
+
+    def score_one(cid):
+        # Błąd jednego kandydata (cache, prompt, model, parsowanie) nie przerywa oceny pozostałych
+        try:
+            return _score_one(cid)
+        except Exception as e:
+            return {"id_kandydata": cid, "blad": str(e)}
+
+    def _score_one(cid):
+        data = inputs.get(cid)
+        if data is None:
+            return {"id_kandydata": cid, "blad": "Brak danych CV kandydata."}
+        cv_analysis = data.get("cv_analysis") or "Brak analizy CV."
+        transcript = data.get("conversation_transcript") or "Brak transkrypcji rozmowy."
+        key = keys[cid] = report_key(cid, job_desc, cv_analysis, transcript, cache_variant)
+        cached = report_cache.get(key) if report_cache is not None and not force else None
+        if cached is not None:
+            pct, recommendation = parse_score(cached["report"])
+            return {"id_kandydata": cid, "dopasowanie_procent": pct, "rekomendacja": recommendation,
+                    "raport": cached["report"], "czas_s": 0.0, "z_cache": True, "zapisany": cached["written"]}
+
+        prompt = build_prompt(job_desc, cv_analysis, transcript)
+        limiter.acquire()
+        t0 = time.perf_counter()
+        response = generate_fn(prompt + SCORING_INSTRUCTION)
+        report = response.text
+        latency = time.perf_counter() - t0
+        if report_cache is not None:
+            report_cache.put(key, report, latency, response_usage(response))
+        pct, recommendation = parse_score(report)
+        return {"id_kandydata": cid, "dopasowanie_procent": pct, "rekomendacja": recommendation,
+                "raport": report, "czas_s": latency, "z_cache": False, "zapisany": False}
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-score") as pool:
+        futures = [pool.submit(score_one, cid) for cid in candidate_ids]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if on_progress:
+                on_progress(len(results), len(futures), results[-1])
+
+    rows = [{
+        "id_kandydata": r["id_kandydata"],
+        "data_aplikacji": datetime.now().isoformat(),
+        "status_rekrutacji": "Oceniony",
+        "event_type": SCORE_EVENT_TYPE,
+        **({"dopasowanie_procent": r["dopasowanie_procent"], "rekomendacja": r["rekomendacja"]} if with_scores else {}),
+    } for r in results if not r.get("blad") and not r.get("zapisany") and r.get("dopasowanie_procent") is not None]
+    if rows and write_fn:
+        written = set(write_fn(rows) or ())
+        for r in results:
+            if r["id_kandydata"] in written:
+                r["zapisany"] = True
+                if with_scores and report_cache is not None:
+                    report_cache.mark_written(keys[r["id_kandydata"]])
+    return results
+
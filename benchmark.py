@@ -0,0 +1,374 @@
+# benchmark.py
+# Benchmark całego potoku rekrutera bez chmury: Storage, BigQuery, Discovery Engine i GenerativeModel
+# zastępujemy lokalnymi atrapami (gcp_clients.override) z konfigurowalnym opóźnieniem i odsetkiem błędów.
+# N równoległych sesji kandydatów przechodzi przez prawdziwe funkcje aplikacji:
+#   upload_to_gcs -> analyze_cv_with_gemini -> record_event -> chat_with_ai (kilka tur) -> generate_report.
+# Treść CV i wypowiedzi kandydata zawierają identyfikator sesji - prompty są różne, jak u prawdziwych
+# kandydatów, więc scalanie identycznych wywołań w llm_gateway nie zaniża wyników. Przed pomiarem
+# przechodzi jedna sesja rozgrzewkowa (importy, klienci, pule procesów, tokenizer), której nie liczymy.
+# Wynik: przyjęcia CV/s, percentyle opóźnień tur rozmowy i raportów, szczytowe zużycie pamięci (tracemalloc)
+# oraz tabela etapów z metrics.py. Progi --max-turn-p95-ms / --min-intakes-per-s dają kod wyjścia 1
+# przy regresji, więc skrypt nadaje się na bramkę dla zmian wydajnościowych.
+#
+#   python benchmark.py --sessions 20 --turns 4 --model-latency 0.4 --error-rate 0.02
+#   python benchmark.py --sessions 8 --pdf-dir ./probki_cv     # przyjęcie CV przez potok z ekstrakcją PDF
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+try:
+    from google.api_core.exceptions import ServiceUnavailable as _ServiceError
+except ImportError:
+    _ServiceError = Exception
+
+
+class FakeServiceError(_ServiceError):
+    """Symulowany błąd usługi (503) - ta sama klasa, którą zgłasza prawdziwe API."""
+
+    code = 503
+
+    def __init__(self, service):
+        super().__init__(f"{service}: symulowana niedostępność usługi")
+
+
+class Behaviour:
+    """Opóźnienie (średnia ± rozrzut, w sekundach) i odsetek błędów jednej atrapy."""
+
+    def __init__(self, name, latency=0.0, jitter=0.5, error_rate=0.0, seed=None):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def __call__(self, scale=1.0):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * scale * (1 + self.jitter * (2 * self._rng.random() - 1))
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        time.sleep(max(0.0, delay))
+        if fail:
+            raise FakeServiceError(self.name)
+
+
+# --- Atrapy usług ---
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket, self.name, self.metadata = bucket, name, None
+
+    def exists(self):
+        self.bucket.behaviour(0.3)
+        return self.name in self.bucket.objects
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.behaviour(1 + len(data) / 1_000_000)
+        self.bucket.objects[self.name] = data
+
+
+class FakeBucket:
+    def __init__(self, behaviour, objects):
+        self.behaviour, self.objects = behaviour, objects
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.objects = {}
+
+    def bucket(self, name):
+        return FakeBucket(self.behaviour, self.objects)
+
+
+class FakeBigQueryClient:
+    """insert_rows_json zapisuje wiersze w pamięci; zapytania o dane raportu zwracają dane syntetyczne."""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.rows = []
+        self._lock = threading.Lock()
+
+    def insert_rows_json(self, table, rows, row_ids=None):
+        self.behaviour()
+        with self._lock:
+            self.rows.extend(rows)
+        return []
+
+    def query(self, query, job_config=None):
+        self.behaviour()
+        params = {p.name: getattr(p, "values", None) or getattr(p, "value", None)
+                  for p in getattr(job_config, "query_parameters", [])}
+        rows = [{"id_kandydata": cid, "cv_analysis": "Python, SQL, 5 lat doświadczenia.",
+                 "conversation_transcript": "Kandydat opisał projekty i oczekiwania."}
+                for cid in params.get("ids") or []]
+        return SimpleNamespace(result=lambda: rows)
+
+
+class FakeSearchClient:
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+
+    def search(self, request):
+        self.behaviour()
+        docs = [SimpleNamespace(id=f"doc-{i}", derived_struct_data={
+            "link": f"gs://wiedza/doc-{i}.pdf",
+            "snippets": [{"snippet": f"Fragment bazy wiedzy {i} dla zapytania: {request.query[:40]}"}]})
+            for i in range(request.page_size or 3)]
+        return SimpleNamespace(results=[SimpleNamespace(document=d) for d in docs])
+
+
+class FakeModel:
+    """GenerativeModel: odpowiedź zależna od rodzaju promptu, opóźnienie proporcjonalne do długości odpowiedzi."""
+
+    CHUNK_CHARS = 40
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+
+    @staticmethod
+    def _reply(prompt, generation_config=None):
+        if "Przeanalizuj CV" in prompt or "analitykiem HR" in prompt:
+            if (generation_config or {}).get("response_mime_type") == "application/json":
+                return json.dumps({"candidate_name": "Jan Kowalski", "last_job": "Programista Python",
+                                   "last_company": "Przykład Sp. z o.o.", "years_experience": 5,
+                                   "skills": ["Python", "SQL", "GCP"], "languages": ["polski", "angielski"],
+                                   "education": None, "summary": "5 lat doświadczenia w Pythonie, SQL i GCP."},
+                                  ensure_ascii=False)
+            return ("Imię: Jan\nStanowisko: Programista Python\nFirma: Przykład Sp. z o.o.\n"
+                    "Podsumowanie: 5 lat doświadczenia w Pythonie, SQL i GCP.")
+        if "Oceń kandydata" in prompt or "raportu dopasowania" in prompt:
+            return "Raport: kandydat dobrze dopasowany.\nWYNIK: 72% | REKOMENDACJA: Rekomenduję"
+        if "streszczenie" in prompt.lower():
+            return "Kandydat ma 5 lat doświadczenia w Pythonie."
+        return "Dziękuję. Proszę opowiedzieć o ostatnim projekcie i użytych technologiach."
+
+    @staticmethod
+    def _usage(prompt, text):
+        return SimpleNamespace(prompt_token_count=len(prompt) // 4 + 1, candidates_token_count=len(text) // 4 + 1)
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        text = self._reply(prompt, generation_config)
+        if not stream:
+            self.behaviour()
+            return SimpleNamespace(text=text, usage_metadata=self._usage(prompt, text))
+        return self._stream(prompt, text)
+
+    def _stream(self, prompt, text):
+        parts = [text[i:i + self.CHUNK_CHARS] for i in range(0, len(text), self.CHUNK_CHARS)]
+        for i, part in enumerate(parts):
+            self.behaviour(1 / len(parts))
+            meta = self._usage(prompt, text) if i == len(parts) - 1 else None
+            yield SimpleNamespace(text=part, usage_metadata=meta)
+
+    def count_tokens(self, text):
+        return SimpleNamespace(total_tokens=len(text) // 4 + 1)
+
+
+# --- Sesje ---
+
+SAMPLE_CV = """Jan Kowalski
+Programista Python
+Doświadczenie: Przykład Sp. z o.o. (01.2020 - obecnie) - backend w Pythonie, BigQuery, GCP.
+Umiejętności: Python, SQL, Docker, Kubernetes.
+"""
+CANDIDATE_TURNS = [
+    "Pracuję od pięciu lat jako programista Python.",
+    "Ostatnio budowałem potoki danych w BigQuery.",
+    "Jakie są benefity w firmie?",
+    "Czy praca jest zdalna?",
+    "Dziękuję, to wszystko.",
+]
+JOB_DESC = "Senior Python Developer - GCP, BigQuery, mikroserwisy. Praca hybrydowa w Warszawie."
+
+
+class _Upload:
+    """Minimalny odpowiednik UploadedFile ze Streamlit."""
+
+    def __init__(self, name, data):
+        self.name, self._data = name, data
+
+    def getvalue(self):
+        return self._data
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda p: round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 1)
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": pick(1.0)}
+
+
+def run_session(app, hr, turns, pdf_files, results):
+    cid = str(uuid.uuid4())
+    cv_text = f"{SAMPLE_CV}Identyfikator zgłoszenia: {cid}\n"
+    t0 = time.perf_counter()
+    try:
+        if pdf_files:
+            path = random.choice(pdf_files)
+            with open(path, "rb") as fh:
+                intake = app.get_intake_pipeline().run(fh.read(), os.path.basename(path))
+            analysis, url = intake.analysis, intake.gcs_url
+        else:
+            data = cv_text.encode("utf-8")
+            url = app.upload_to_gcs(_Upload(f"cv-{cid}.pdf", data), app.BUCKET_NAME)
+            analysis = app.analyze_cv_with_gemini(cv_text)
+        app.record_event({"id_kandydata": cid, "url_cv_gcs": url, "umiejetnosci_tech": analysis.get("summary"),
+                          "status_rekrutacji": "CV przesłane", "event_type": "cv_uploaded"})
+        results["intake"].append(time.perf_counter() - t0)
+        if analysis.get("error"):
+            results["errors"].append("analyze")
+    except app.IntakeError as e:
+        results["errors"].append(e.stage)  # np. "analyze" - błędna analiza przerywa potok przyjęcia
+        return
+    except Exception as e:
+        results["errors"].append(f"intake: {type(e).__name__}")
+        return
+
+    state = {}
+    history = [{"role": "assistant", "content": "Cześć! Opowiedz o swoim doświadczeniu."}]
+    for turn in CANDIDATE_TURNS[:turns]:
+        history.append({"role": "user", "content": f"{turn} (zgłoszenie {cid[:8]})"})
+        t0 = time.perf_counter()
+        reply, ended = app.chat_with_ai(history, JOB_DESC, state)
+        results["turn"].append(time.perf_counter() - t0)
+        if reply.startswith("Błąd"):
+            results["errors"].append("chat")
+        history.append({"role": "assistant", "content": reply})
+        if ended:
+            break
+
+    t0 = time.perf_counter()
+    hr.generate_report(cid, JOB_DESC, stream=False, force=True)
+    results["report"].append(time.perf_counter() - t0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark potoku rekrutera na lokalnych atrapach usług GCP.")
+    parser.add_argument("--sessions", type=int, default=10, help="liczba sesji kandydatów")
+    parser.add_argument("--concurrency", type=int, default=None, help="równoległe sesje (domyślnie wszystkie)")
+    parser.add_argument("--turns", type=int, default=3, help="tury rozmowy na sesję")
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--search-latency", type=float, default=0.08)
+    parser.add_argument("--bq-latency", type=float, default=0.05)
+    parser.add_argument("--gcs-latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="odsetek błędów każdej usługi (0-1)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--pdf-dir", help="katalog PDF - przyjęcie CV przez potok z ekstrakcją tekstu")
+    parser.add_argument("--json", help="zapisz wynik do pliku JSON")
+    parser.add_argument("--max-turn-p95-ms", type=float, help="próg regresji: p95 tury rozmowy")
+    parser.add_argument("--min-intakes-per-s", type=float, help="próg regresji: przepustowość przyjęć CV")
+    args = parser.parse_args(argv)
+
+    # Stan lokalny aplikacji (spool zdarzeń, cache CV, eksport metryk) - w pamięci / katalogu tymczasowym,
+    # usuwanym po zakończeniu pomiaru
+    with tempfile.TemporaryDirectory(prefix="rekruter-bench-") as workdir:
+        return _run(args, workdir)
+
+
+def _run(args, workdir):
+    os.environ.setdefault("EVENT_SPOOL_PATH", ":memory:")
+    os.environ.setdefault("CV_CACHE_PATH", ":memory:")
+    os.environ.setdefault("METRICS_EXPORT_PATH", os.path.join(workdir, "metrics.jsonl"))
+    os.environ.setdefault("RAG_BACKEND", "discovery")
+
+    import gcp_clients
+    import metrics
+
+    behaviours = {
+        "model": Behaviour("gemini", args.model_latency, error_rate=args.error_rate, seed=args.seed),
+        "search": Behaviour("discovery", args.search_latency, error_rate=args.error_rate, seed=args.seed + 1),
+        "bigquery": Behaviour("bigquery", args.bq_latency, error_rate=args.error_rate, seed=args.seed + 2),
+        "storage": Behaviour("storage", args.gcs_latency, error_rate=args.error_rate, seed=args.seed + 3),
+    }
+    gcp_clients.override("credentials", SimpleNamespace())
+    gcp_clients.override("model", FakeModel(behaviours["model"]))
+    gcp_clients.override("search", FakeSearchClient(behaviours["search"]))
+    gcp_clients.override("bigquery", FakeBigQueryClient(behaviours["bigquery"]))
+    gcp_clients.override("storage", FakeStorageClient(behaviours["storage"]))
+
+    import Rekruter_AI as app
+    import hr_dashboard as hr
+
+    pdf_files = []
+    if args.pdf_dir:
+        pdf_files = [os.path.join(args.pdf_dir, f) for f in sorted(os.listdir(args.pdf_dir))
+                     if f.lower().endswith(".pdf")]
+
+    # Rozgrzewka poza pomiarem: pierwsze wywołania płacą za leniwe tworzenie klientów i pul
+    run_session(app, hr, args.turns, pdf_files, {"intake": [], "turn": [], "report": [], "errors": []})
+    app.get_event_writer().flush(timeout=30)
+    for behaviour in behaviours.values():
+        behaviour.calls = behaviour.errors = 0
+
+    results = {"intake": [], "turn": [], "report": [], "errors": []}
+    metrics.reset()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency or args.sessions, thread_name_prefix="session") as pool:
+        for future in [pool.submit(run_session, app, hr, args.turns, pdf_files, results)
+                       for _ in range(args.sessions)]:
+            future.result()
+    wall = time.perf_counter() - t0
+    app.get_event_writer().flush(timeout=30)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    summary = {
+        "sessions": args.sessions,
+        "wall_s": round(wall, 2),
+        "intakes_per_s": round(len(results["intake"]) / wall, 2) if wall else 0.0,
+        "intake": _percentiles(results["intake"]),
+        "turn": _percentiles(results["turn"]),
+        "report": _percentiles(results["report"]),
+        "errors": len(results["errors"]),
+        "injected_errors": {name: b.errors for name, b in behaviours.items()},
+        "peak_memory_mb": round(peak / 1024 / 1024, 1),
+        "stages": metrics.summary(),
+    }
+
+    print(f"Sesje: {args.sessions}, czas: {summary['wall_s']} s, przyjęcia CV/s: {summary['intakes_per_s']}")
+    for name in ("intake", "turn", "report"):
+        print(f"  {name:7s} {summary[name]}")
+    print(f"Błędy: {summary['errors']} (wstrzyknięte: {summary['injected_errors']}), "
+          f"szczyt pamięci: {summary['peak_memory_mb']} MB")
+    for row in summary["stages"]:
+        print(f"  {row['etap']:26s} n={row['wywolania']:<5d} p50={row['p50_ms']} ms p95={row['p95_ms']} ms "
+              f"błędy={row['bledy']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, ensure_ascii=False, indent=2)
+
+    failed = []
+    if args.max_turn_p95_ms is not None and summary["turn"].get("p95_ms", 0) > args.max_turn_p95_ms:
+        failed.append(f"p95 tury {summary['turn']['p95_ms']} ms > {args.max_turn_p95_ms} ms")
+    if args.min_intakes_per_s is not None and summary["intakes_per_s"] < args.min_intakes_per_s:
+        failed.append(f"przyjęcia CV/s {summary['intakes_per_s']} < {args.min_intakes_per_s}")
+    for message in failed:
+        print(f"REGRESJA: {message}")
+    # Ostatni eksport metryk jeszcze do katalogu tymczasowego - eksport przy zamknięciu procesu nie ma już
+    # czego dopisać, więc nie odtworzy usuniętego katalogu
+    metrics.export()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
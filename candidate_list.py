@@ -0,0 +1,195 @@
+# candidate_list.py
+# Warstwa danych listy kandydatów dla paneli HR.
+# - stronicowanie kursorem (keyset) po (data_aplikacji, id_kandydata) zamiast LIMIT 50/100,
+# - filtrowanie po statusie po stronie BigQuery (status = najnowsze zdarzenie kandydata),
+#   z tabeli stanu `Kandydaci_stan`, jeśli została utworzona (migrations.py); tabelę stanu odświeża
+#   zadanie z harmonogramu (`migrations.py refresh-state`), a kandydatów, których w niej jeszcze nie ma,
+#   czytamy z tabeli zdarzeń,
+# - odświeżanie przyrostowe: pobieramy tylko zdarzenia nowsze niż ostatni znak wodny
+#   i scalamy je z lokalnym cache współdzielonym przez sesje.
+# Ponowne otwarcie zakładki HR korzysta z cache i nie skanuje tabeli. Pierwsze wczytanie strony bez tabeli
+# stanu agreguje zdarzenia tylko z partycji z ostatnich `lookback_days` (config.CANDIDATES_LOOKBACK_DAYS);
+# z tabelą stanu dociąga od razu zdarzenia zapisane po ostatnim MERGE z harmonogramu.
+
+import threading
+from datetime import datetime, timedelta
+
+import queries
+
+STATUS_OPTIONS = ["CV przesłane", "Koniec rozmowy", "Oceniony"]
+LIST_FIELDS = ["id_kandydata", "nazwa_pliku_cv", "data_aplikacji", "status_rekrutacji",
+               "dopasowanie_procent", "rekomendacja"]
+
+
+def _minus(value, delta):
+    """Cofa znak wodny o `delta` - niezależnie od tego, czy kolumna jest TIMESTAMP, czy tekstem ISO."""
+    if isinstance(value, datetime):
+        return value - delta
+    try:
+        return (datetime.fromisoformat(value) - delta).isoformat()
+    except (TypeError, ValueError):
+        return value
+
+
+class _Segment:
+    """Wczytany, ciągły fragment listy dla jednego filtra statusu (od najnowszych)."""
+
+    def __init__(self):
+        self.ids = []
+        self.cursor = None  # (data_aplikacji, id_kandydata) ostatniego wczytanego wiersza
+        self.exhausted = False
+
+
+class CandidateList:
+    def __init__(self, client, table, page_size=50, overlap=timedelta(minutes=10), state_table=None,
+                 with_scores=False, lookback_days=None):
+        self.client = client
+        self.table = table
+        self.state_table = state_table  # tabela Kandydaci_stan z migrations.py (opcjonalna)
+        self.with_scores = with_scores  # kolumny wyniku oceny w tabeli zdarzeń (migrations.py scores)
+        self.lookback_days = lookback_days  # bez tabeli stanu: lista tylko z partycji z ostatnich dni
+        self.page_size = page_size
+        self.overlap = overlap  # zapas na zdarzenia zapisane z opóźnieniem (kolejka write-behind)
+        self._lock = threading.RLock()
+        self._candidates = {}  # id_kandydata -> wiersz listy
+        self._state_ts = {}  # id_kandydata -> data najnowszego zastosowanego zdarzenia
+        self._segments = {}  # status (None = wszyscy) -> _Segment
+        self._watermark = None
+        self._synced = False  # czy dociągnięto zdarzenia nowsze niż tabela stanu
+        self._stats = {"page_queries": 0, "refresh_queries": 0, "refreshed_events": 0, "by_id_queries": 0}
+
+    # --- Zapytania ---
+
+    def _fetch_page(self, status, cursor):
+        self._stats["page_queries"] += 1
+        return queries.candidate_page(self.client, self.table, self.page_size, status=status, cursor=cursor,
+                                      state_table=self.state_table, with_scores=self.with_scores,
+                                      lookback_days=self.lookback_days)
+
+    def _fetch_events_since(self, since):
+        self._stats["refresh_queries"] += 1
+        return queries.events_since(self.client, self.table, since, with_scores=self.with_scores)
+
+    # --- Stan lokalny ---
+
+    def _advance_watermark(self, value):
+        if value is not None and (self._watermark is None or value > self._watermark):
+            self._watermark = value
+
+    def _load_more(self, status):
+        segment = self._segments.setdefault(status, _Segment())
+        if segment.exhausted:
+            return 0
+        rows = self._fetch_page(status, segment.cursor)
+        for row in rows:
+            cid = row["id_kandydata"]
+            last_event = row.pop("ostatnie_zdarzenie", None)
+            if cid not in self._candidates or (last_event and last_event >= self._state_ts.get(cid, last_event)):
+                self._candidates[cid] = row
+                self._state_ts[cid] = last_event or row["data_aplikacji"]
+            if cid not in segment.ids:
+                segment.ids.append(cid)
+            self._advance_watermark(last_event or row["data_aplikacji"])
+        if rows:
+            segment.cursor = (rows[-1]["data_aplikacji"], rows[-1]["id_kandydata"])
+        segment.exhausted = len(rows) < self.page_size
+        return len(rows)
+
+    def _move(self, row, old_status, new_status):
+        """Przenosi kandydata między segmentami filtrów statusu po zmianie jego statusu."""
+        cid = row["id_kandydata"]
+        key = (row["data_aplikacji"], cid)
+        for status, segment in self._segments.items():
+            if status is None:
+                continue
+            if status == old_status and status != new_status and cid in segment.ids:
+                segment.ids.remove(cid)
+            # Kandydat starszy niż kursor segmentu pojawi się przy dociąganiu kolejnej strony
+            if (status == new_status and cid not in segment.ids
+                    and (segment.exhausted or (segment.cursor is not None and key >= segment.cursor))):
+                segment.ids.append(cid)
+
+    def _apply_event(self, event):
+        cid = event["id_kandydata"]
+        ts = event["data_aplikacji"]
+        if event.get("event_type") == "cv_uploaded" and cid not in self._candidates:
+            row = self._candidates[cid] = {k: event.get(k) for k in LIST_FIELDS}
+            self._state_ts[cid] = ts
+            # Nowy kandydat jest najnowszy - należy do wczytanej części listy wszystkich i swojego statusu
+            if None in self._segments:
+                self._segments[None].ids.append(cid)
+            self._move(row, None, row.get("status_rekrutacji"))
+            return
+        row = self._candidates.get(cid)
+        if row is None or ts < self._state_ts.get(cid, ts):
+            return  # kandydat spoza wczytanego zakresu albo zdarzenie już uwzględnione
+        old_status = row.get("status_rekrutacji")
+        for field in ("status_rekrutacji", "dopasowanie_procent", "rekomendacja"):
+            if event.get(field) is not None:
+                row[field] = event[field]
+        self._state_ts[cid] = ts
+        if row.get("status_rekrutacji") != old_status:
+            self._move(row, old_status, row.get("status_rekrutacji"))
+
+    # --- API ---
+
+    def get(self, status=None, limit=None):
+        """Wiersze listy (od najnowszych); w razie potrzeby dociąga kolejne strony z BigQuery."""
+        limit = limit or self.page_size
+        with self._lock:
+            segment = self._segments.setdefault(status, _Segment())
+            while len(self._visible(status, segment)) < limit and not segment.exhausted:
+                if not self._load_more(status):
+                    break
+            if self.state_table and not self._synced and self._watermark is not None:
+                # Tabela stanu jest tak aktualna jak ostatni MERGE - nowszych kandydatów bierzemy ze zdarzeń
+                self._synced = True
+                self.refresh()
+            return self._visible(status, segment)[:limit]
+
+    def get_many(self, candidate_ids, status=None):
+        """Wiersze wskazanych kandydatów w podanej kolejności; brakujących w cache dociąga jednym zapytaniem."""
+        with self._lock:
+            # Kandydatów spoza tabeli stanu (dodanych po jej ostatnim odświeżeniu) szukamy w tabeli zdarzeń
+            for state_table in ([self.state_table, None] if self.state_table else [None]):
+                missing = [cid for cid in candidate_ids if cid not in self._candidates]
+                if not missing:
+                    break
+                self._stats["by_id_queries"] += 1
+                rows = queries.candidate_page(self.client, self.table, len(missing), ids=missing,
+                                              state_table=state_table, with_scores=self.with_scores)
+                for row in rows:
+                    last_event = row.pop("ostatnie_zdarzenie", None)
+                    self._candidates.setdefault(row["id_kandydata"], row)
+                    self._state_ts.setdefault(row["id_kandydata"], last_event or row["data_aplikacji"])
+            rows = [self._candidates[cid] for cid in candidate_ids if cid in self._candidates]
+            return [r for r in rows if not status or r.get("status_rekrutacji") == status]
+
+    def _visible(self, status, segment):
+        rows = [self._candidates[cid] for cid in segment.ids if cid in self._candidates]
+        rows = [r for r in rows if not status or r.get("status_rekrutacji") == status]
+        return sorted(rows, key=lambda r: (r["data_aplikacji"], r["id_kandydata"]), reverse=True)
+
+    def has_more(self, status=None):
+        with self._lock:
+            segment = self._segments.get(status)
+            return segment is None or not segment.exhausted
+
+    def refresh(self):
+        """Odświeżenie przyrostowe: tylko zdarzenia nowsze niż znak wodny. Zwraca liczbę zdarzeń."""
+        with self._lock:
+            if self._watermark is None:
+                return 0  # nic jeszcze nie wczytano - pierwsza strona i tak pobierze aktualny stan
+            events = self._fetch_events_since(_minus(self._watermark, self.overlap))
+            for event in events:
+                self._apply_event(event)
+                self._advance_watermark(event["data_aplikacji"])
+            self._stats["refreshed_events"] += len(events)
+            return len(events)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_candidates"] = len(self._candidates)
+            stats["watermark"] = str(self._watermark)
+        return stats
@@ -0,0 +1,172 @@
+# candidate_ranking.py
+# Wstępna selekcja kandydatów na podstawie embeddingów - zanim uruchomimy kosztowne raporty LLM.
+# Embedding analizy CV liczony jest raz, przy zapisie zdarzenia cv_uploaded, i trafia do indeksu:
+# jednej macierzy float32 (wiersz = kandydat, wektory znormalizowane), dopisywanej przyrostowo.
+# Ocena wszystkich kandydatów względem embeddingu ogłoszenia to jeden iloczyn macierzy z wektorem
+# (podobieństwo kosinusowe), a najlepsze k wybiera argpartition - milisekundy nawet dla dziesiątek tysięcy CV.
+#
+# Indeks żyje w pamięci procesu; po restarcie odbudowujemy go z BigQuery (queries.cv_embeddings):
+# z kolumny embedding_cv (migrations.py cv-embeddings), a dla starszych wierszy - licząc embeddingi
+# z umiejetnosci_tech paczkami przez `embed_fn`.
+
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import metrics
+
+INITIAL_CAPACITY = 1024
+EMBED_BATCH_SIZE = 25  # Tyle tekstów na jedno wywołanie modelu embeddingów przy odbudowie
+
+
+def _normalize(vector):
+    v = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+class EmbeddingIndex:
+    """
+    Indeks embeddingów kandydatów. Kandydat może być przypisany do ogłoszenia (id_ogloszenia);
+    ranking dla ogłoszenia obejmuje jego kandydatów oraz kandydatów bez przypisania.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._lock = threading.RLock()
+        self._capacity = capacity
+        self._matrix = None  # float32 [capacity, wymiar]; wypełnione pierwsze len(self._ids) wierszy
+        self._posting_codes = np.zeros(capacity, dtype=np.int32)  # 0 = brak przypisania do ogłoszenia
+        self._codes = {}  # id_ogloszenia -> kod
+        self._ids = []
+        self._rows = {}  # id_kandydata -> nr wiersza
+        self.watermark = None  # najnowsza data_aplikacji wczytana z BigQuery
+        self._stats = {"appended": 0, "replaced": 0, "loads": 0, "embedded_on_load": 0,
+                       "rank_calls": 0, "last_rank_ms": None, "last_load_s": None}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, candidate_id):
+        return candidate_id in self._rows
+
+    @property
+    def dim(self):
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    def _posting_code(self, posting_id):
+        if not posting_id:
+            return 0
+        return self._codes.setdefault(posting_id, len(self._codes) + 1)
+
+    def _grow(self, dim):
+        if self._matrix is None:
+            self._matrix = np.zeros((self._capacity, dim), dtype=np.float32)
+            return
+        if len(self._ids) < self._capacity:
+            return
+        self._capacity *= 2
+        matrix = np.zeros((self._capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        codes = np.zeros(self._capacity, dtype=np.int32)
+        codes[:len(self._ids)] = self._posting_codes[:len(self._ids)]
+        self._matrix, self._posting_codes = matrix, codes
+
+    def add(self, candidate_id, vector, posting_id=None):
+        """Dodaje (albo zastępuje) embedding kandydata."""
+        v = _normalize(vector)
+        with self._lock:
+            if self.dim is not None and v.shape[0] != self.dim:
+                raise ValueError(f"Embedding ma wymiar {v.shape[0]}, indeks {self.dim}")
+            row = self._rows.get(candidate_id)
+            if row is None:
+                self._grow(v.shape[0])
+                row = len(self._ids)
+                self._ids.append(candidate_id)
+                self._rows[candidate_id] = row
+                self._stats["appended"] += 1
+            else:
+                self._stats["replaced"] += 1
+            self._matrix[row] = v
+            self._posting_codes[row] = self._posting_code(posting_id)
+
+    def rank(self, query_vector, k=None, posting_id=None):
+        """[(id_kandydata, podobieństwo)] od najlepiej dopasowanych; `k=None` - wszyscy."""
+        q = _normalize(query_vector)
+        t0 = time.perf_counter()
+        with metrics.timed("ranking.embedding"), self._lock:
+            n = len(self._ids)
+            if not n or q.shape[0] != self.dim:
+                return []
+            scores = self._matrix[:n] @ q
+            if posting_id is not None:
+                codes = self._posting_codes[:n]
+                scores = np.where((codes == 0) | (codes == self._codes.get(posting_id, -1)), scores, -np.inf)
+            k = n if k is None else min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            result = [(self._ids[i], float(scores[i])) for i in top if scores[i] != -np.inf]
+            self._stats["rank_calls"] += 1
+            self._stats["last_rank_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        return result
+
+    def scores(self, query_vector, candidate_ids):
+        """{id_kandydata: podobieństwo} dla podanych kandydatów (pomija kandydatów spoza indeksu)."""
+        q = _normalize(query_vector)
+        with self._lock:
+            if self.dim is None or q.shape[0] != self.dim:
+                return {}
+            present = [cid for cid in candidate_ids if cid in self._rows]
+            rows = np.fromiter((self._rows[cid] for cid in present), dtype=np.int64, count=len(present))
+            return dict(zip(present, (self._matrix[rows] @ q).tolist()))
+
+    def refresh_since(self, overlap):
+        """Znak wodny cofnięty o `overlap` (zapas na zdarzenia zapisane z opóźnieniem); None = pełna odbudowa."""
+        if self.watermark is None:
+            return None
+        if isinstance(self.watermark, datetime):
+            return self.watermark - overlap
+        try:
+            return (datetime.fromisoformat(self.watermark) - overlap).isoformat()
+        except (TypeError, ValueError):
+            return self.watermark
+
+    def load(self, rows, embed_fn=None, batch_size=EMBED_BATCH_SIZE):
+        """
+        Dopisuje wiersze z queries.cv_embeddings: {"id_kandydata", "data_aplikacji", "embedding_cv",
+        "umiejetnosci_tech", "id_ogloszenia"}. Brakujące embeddingi liczy `embed_fn(teksty)` paczkami.
+        Zwraca liczbę dodanych kandydatów.
+        """
+        t0 = time.perf_counter()
+        missing = []
+        added = 0
+        for row in rows:
+            if row.get("embedding_cv"):
+                self.add(row["id_kandydata"], row["embedding_cv"], row.get("id_ogloszenia"))
+                added += 1
+            elif embed_fn is not None and row.get("umiejetnosci_tech") and row["id_kandydata"] not in self:
+                missing.append(row)
+            ts = row.get("data_aplikacji")
+            if ts is not None and (self.watermark is None or ts > self.watermark):
+                self.watermark = ts
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            vectors = embed_fn([row["umiejetnosci_tech"] for row in batch]) or []
+            for row, vector in zip(batch, vectors):
+                self.add(row["id_kandydata"], vector, row.get("id_ogloszenia"))
+                added += 1
+            with self._lock:
+                self._stats["embedded_on_load"] += len(vectors)
+        with self._lock:
+            self._stats["loads"] += 1
+            self._stats["last_load_s"] = round(time.perf_counter() - t0, 3)
+        return added
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"candidates": len(self._ids), "dim": self.dim, "capacity": self._capacity,
+                          "memory_mb": round(self._matrix.nbytes / 2**20, 2) if self._matrix is not None else 0.0,
+                          "watermark": str(self.watermark)})
+        return stats
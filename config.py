@@ -0,0 +1,45 @@
+# config.py
+# Jedno źródło konfiguracji usług GCP dla wszystkich punktów wejścia
+# (app.py, Rekruter_AI.py, pages/hr_dashboard.py i skrypty CLI).
+# Wartości można nadpisać zmiennymi środowiskowymi o tej samej nazwie.
+
+import os
+
+GCP_PROJECT_ID = os.environ.get("GCP_PROJECT_ID", "ai-rekruter")
+GCP_GEMINI_LOCATION = os.environ.get("GCP_GEMINI_LOCATION", "europe-central2")
+GCP_SEARCH_LOCATION = os.environ.get("GCP_SEARCH_LOCATION", "global")
+BUCKET_NAME = os.environ.get("BUCKET_NAME", "rekrutacja-pliki-2026")
+DATA_STORE_ID = os.environ.get("DATA_STORE_ID", "wiedza-rekruter_1768770519228")
+# Dokumenty bazy wiedzy dla lokalnego indeksu RAG: katalog albo gs://bucket/prefiks/ (puste = brak indeksu)
+KB_SOURCE = os.environ.get("KB_SOURCE", "")
+BIGQUERY_DATASET_ID = os.environ.get("BIGQUERY_DATASET_ID", "rekrutacja_hr")
+BIGQUERY_TABLE_ID = os.environ.get("BIGQUERY_TABLE_ID", "Kandydaci")
+# Tabela najnowszego stanu kandydatów (migrations.py state); puste = stan liczony z tabeli zdarzeń,
+# a pierwsze wczytanie listy w panelu HR skanuje całą tabelę `Kandydaci` (GROUP BY id_kandydata)
+BIGQUERY_STATE_TABLE_ID = os.environ.get("BIGQUERY_STATE_TABLE_ID")
+# Bez tabeli stanu: lista kandydatów tylko z partycji z ostatnich N dni (wymaga migrations.py partition);
+# 0 = cała tabela - tylko dla tabeli sprzed migracji (data_aplikacji jako tekst), bo skanuje wszystkie zdarzenia
+CANDIDATES_LOOKBACK_DAYS = int(os.environ.get("CANDIDATES_LOOKBACK_DAYS", "90"))
+# Typowane kolumny analizy CV (imie_kandydata, umiejetnosci, ...) - włączyć po `migrations.py cv-columns`
+BIGQUERY_CV_COLUMNS = os.environ.get("BIGQUERY_CV_COLUMNS", "") == "1"
+# Kolumny wyniku oceny masowej (dopasowanie_procent, rekomendacja) - włączyć po `migrations.py scores`;
+# wcześniej ocena masowa zapisuje tylko status "Oceniony", a listy kandydatów nie czytają wyniku
+BIGQUERY_SCORE_COLUMNS = os.environ.get("BIGQUERY_SCORE_COLUMNS", "") == "1"
+# Kolumna embedding_cv z embeddingiem analizy CV - włączyć po `migrations.py cv-embeddings`
+BIGQUERY_CV_EMBEDDINGS = os.environ.get("BIGQUERY_CV_EMBEDDINGS", "") == "1"
+# Tabela ogłoszeń (migrations.py postings) - po jej utworzeniu kandydaci dostają kolumnę id_ogloszenia;
+# puste = ogłoszenia w lokalnym SQLite
+BIGQUERY_POSTINGS_TABLE_ID = os.environ.get("BIGQUERY_POSTINGS_TABLE_ID")
+MODEL_NAME = os.environ.get("MODEL_NAME", "gemini-2.5-flash-lite")
+# Bramka modelu (llm_gateway.py): limit wywołań na minutę wg quota projektu i liczba równoległych wywołań
+LLM_CALLS_PER_MINUTE = float(os.environ.get("LLM_CALLS_PER_MINUTE", "300"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "text-multilingual-embedding-002")
+# Limit wywołań modelu embeddingów na minutę (zgłoszenia, ogłoszenia i odbudowa indeksu rankingu)
+EMBEDDING_CALLS_PER_MINUTE = float(os.environ.get("EMBEDDING_CALLS_PER_MINUTE", "300"))
+STREAM_RESPONSES = True  # Strumieniowanie odpowiedzi modelu do czatu i raportów
+
+
+def table_ref(table_id=None):
+    """Pełna nazwa tabeli `projekt.zbiór.tabela` (domyślnie tabela zdarzeń kandydatów)."""
+    return f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{table_id or BIGQUERY_TABLE_ID}"
@@ -0,0 +1,96 @@
+# conversation_context.py
+# Ograniczony kontekst rozmowy: ostatnie N tur dosłownie + przyrostowe streszczenie starszych.
+# Budżet tokenów dzielony jest między ogłoszenie, kontekst RAG, streszczenie i bieżące tury,
+# więc rozmiar promptu nie rośnie wraz z długością rozmowy.
+
+SUMMARY_KEY = "conversation_summary"
+SUMMARIZED_UPTO_KEY = "conversation_summarized_upto"
+
+ROLE_LABELS = {"user": "Kandydat", "assistant": "Rekruter"}
+
+
+def format_turns(messages):
+    return "\n".join(f"{ROLE_LABELS.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+
+def truncate_to_tokens(text, max_tokens, count_tokens, max_counts=2):
+    """
+    Przycina tekst do limitu tokenów (proporcjonalnie po znakach, z korektą). Licznik wywołujemy najwyżej
+    `max_counts` razy - bez lokalnego tokenizera każde wywołanie to zapytanie do modelu; ostatnie cięcie
+    korzysta z gęstości tokenów zmierzonej na poprzedniej wersji tekstu.
+    """
+    if not text or max_tokens <= 0:
+        return ""
+    tokens = count_tokens(text)
+    for counted in range(1, max_counts + 1):
+        if tokens <= max_tokens:
+            break
+        text = text[:max(1, int(len(text) * max_tokens / tokens * 0.95))]
+        if counted == max_counts:
+            break
+        tokens = count_tokens(text)
+    return text
+
+
+class ConversationContext:
+    """
+    `summarize_fn(previous_summary, messages) -> str` dopisuje starsze tury do streszczenia,
+    `count_tokens_fn(text) -> int` liczy tokeny licznikiem modelu.
+    Stan (streszczenie i indeks ostatniej streszczonej wiadomości) trzymany jest w `state`
+    - w aplikacji jest to `st.session_state`.
+    """
+
+    def __init__(self, summarize_fn, count_tokens_fn, keep_last_messages=6, fold_every=4,
+                 token_budget=6000, job_desc_share=0.25, rag_share=0.30, summary_share=0.15):
+        self.summarize_fn = summarize_fn
+        self.count_tokens = count_tokens_fn
+        self.keep_last_messages = keep_last_messages
+        self.fold_every = fold_every
+        self.token_budget = token_budget
+        self.job_desc_share = job_desc_share
+        self.rag_share = rag_share
+        self.summary_share = summary_share
+
+    def update_summary(self, state, history):
+        """Wciąga do streszczenia wiadomości starsze niż ostatnie N - paczkami, nie co turę."""
+        upto = state.get(SUMMARIZED_UPTO_KEY, 0)
+        fold_end = len(history) - self.keep_last_messages
+        if fold_end - upto < self.fold_every:
+            return
+        summary = self.summarize_fn(state.get(SUMMARY_KEY, ""), history[upto:fold_end])
+        state[SUMMARY_KEY] = summary
+        state[SUMMARIZED_UPTO_KEY] = fold_end
+
+    def truncate(self, text, max_tokens):
+        return truncate_to_tokens(text, max_tokens, self.count_tokens)
+
+    def build(self, state, history, rag_context, job_desc, fixed_tokens=0):
+        """
+        Zwraca słownik sekcji promptu (job_desc, rag_context, summary, recent) mieszczący się
+        w budżecie. `fixed_tokens` to rozmiar stałej części promptu (instrukcji).
+        """
+        self.update_summary(state, history)
+        budget = max(0, self.token_budget - fixed_tokens)
+
+        job_desc = self.truncate(job_desc or "", int(budget * self.job_desc_share))
+        rag_context = self.truncate(rag_context or "", int(budget * self.rag_share))
+        summary = self.truncate(state.get(SUMMARY_KEY, ""), int(budget * self.summary_share))
+        remaining = budget - sum(self.count_tokens(t) for t in (job_desc, rag_context, summary) if t)
+
+        # Bieżące tury od najnowszej - ostatnia wiadomość kandydata zawsze trafia do promptu
+        upto = state.get(SUMMARIZED_UPTO_KEY, 0)
+        recent = []
+        for message in reversed(history[upto:]):
+            line = format_turns([message])
+            cost = self.count_tokens(line)
+            if recent and cost > remaining:
+                break
+            if not recent and cost > remaining:
+                line = self.truncate(line, max(remaining, 1))
+                cost = self.count_tokens(line)
+            recent.append(line)
+            remaining -= cost
+        recent.reverse()
+
+        return {"job_desc": job_desc, "rag_context": rag_context, "summary": summary,
+                "recent": "\n".join(recent)}
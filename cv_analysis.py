@@ -0,0 +1,173 @@
+# cv_analysis.py
+# Strukturalna analiza CV jednym wywołaniem modelu:
+# - tekst z PDF jest normalizowany (białe znaki, powtarzające się nagłówki/stopki, klauzule RODO)
+#   i przycinany do budżetu tokenów,
+# - model zwraca JSON zgodny ze schematem (response_schema), więc imię, stanowisko i firma
+#   nie są już wyłuskiwane z wolnego tekstu,
+# - pola trafiają do BigQuery jako osobne, typowane kolumny (migrations.py cv-columns).
+# Moduł nie importuje SDK Google - wywołanie modelu zostaje w Rekruter_AI.py.
+
+import json
+import re
+from collections import Counter
+
+from conversation_context import truncate_to_tokens
+
+ANALYSIS_PROMPT = """
+Jesteś analitykiem HR. Przeanalizuj CV i zwróć wyłącznie JSON zgodny ze schematem:
+imię i nazwisko kandydata, ostatnie stanowisko i firmę, łączną liczbę lat doświadczenia,
+listę umiejętności technicznych, języki, wykształcenie oraz krótkie podsumowanie
+umiejętności i doświadczenia (3-5 zdań, po polsku). Brakujące pola pozostaw puste.
+CV: {cv_text}
+"""
+
+CV_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "candidate_name": {"type": "string", "nullable": True},
+        "last_job": {"type": "string", "nullable": True},
+        "last_company": {"type": "string", "nullable": True},
+        "years_experience": {"type": "number", "nullable": True},
+        "skills": {"type": "array", "items": {"type": "string"}},
+        "languages": {"type": "array", "items": {"type": "string"}},
+        "education": {"type": "string", "nullable": True},
+        "summary": {"type": "string"},
+    },
+    "required": ["summary"],
+}
+
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": CV_RESPONSE_SCHEMA,
+    "temperature": 0.2,
+    "max_output_tokens": 1024,
+}
+
+# Kolumny tabeli Kandydaci dla zdarzenia cv_uploaded: pole analizy -> (kolumna, typ BigQuery)
+BIGQUERY_COLUMNS = {
+    "candidate_name": ("imie_kandydata", "STRING"),
+    "last_job": ("ostatnie_stanowisko", "STRING"),
+    "last_company": ("ostatnia_firma", "STRING"),
+    "years_experience": ("lata_doswiadczenia", "FLOAT64"),
+    "skills": ("umiejetnosci", "ARRAY<STRING>"),
+    "languages": ("jezyki", "ARRAY<STRING>"),
+    "education": ("wyksztalcenie", "STRING"),
+}
+
+_BOILERPLATE_RE = re.compile(
+    r"(wyrażam zgodę na przetwarzanie|zgodnie z art\. 6|rozporządzeni[ae] parlamentu europejskiego"
+    r"|ustaw[ay] z dnia 10 maja 2018|i hereby (give )?consent|processing of my personal data)",
+    re.IGNORECASE,
+)
+_HEADER_MAX_CHARS = 80  # Powtarzające się krótkie linie na brzegach stron to zwykle nagłówki i stopki
+_HEADER_MIN_REPEATS = 3
+_EDGE_LINES = 2  # Tyle pierwszych i ostatnich niepustych linii strony może być nagłówkiem, stopką lub numerem
+_PAGE_NUMBER_RE = re.compile(r"(?:(?:strona|str\.|page)\s*)?(\d{1,3})(?:\s*(?:/|z|ze|of)\s*(\d{1,3}))?",
+                             re.IGNORECASE)
+
+
+def _is_page_number(line, page_no, page_count):
+    """Numer tej właśnie strony ("Strona 2 z 5", "2/5", "2") - nigdy rok ani data typu 03/2019."""
+    m = _PAGE_NUMBER_RE.fullmatch(line)
+    return bool(m) and int(m.group(1)) == page_no and (m.group(2) is None or int(m.group(2)) == page_count)
+
+
+def _edge_lines(lines):
+    filled = [i for i, line in enumerate(lines) if line]
+    return set(filled[:_EDGE_LINES] + filled[-_EDGE_LINES:])
+
+
+def normalize_cv_text(text):
+    """
+    Zwija białe znaki, usuwa powtarzane nagłówki/stopki, numery stron i akapity z klauzulą RODO.
+    Strony rozdziela znak \\f (pdf_extract); nagłówków i numerów szukamy tylko na brzegach stron.
+    """
+    pages = [[re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in page.splitlines()]
+             for page in (text or "").split("\f")]
+    edges = [_edge_lines(lines) for lines in pages]
+    repeats = Counter(line for lines, edge in zip(pages, edges) for line in {lines[i] for i in edge}
+                      if len(line) <= _HEADER_MAX_CHARS)
+    min_repeats = min(_HEADER_MIN_REPEATS, len(pages))
+    out, seen_headers = [], set()
+    for page_no, (lines, edge) in enumerate(zip(pages, edges), 1):
+        for i, line in enumerate(lines):
+            if i in edge:
+                if _is_page_number(line, page_no, len(pages)):
+                    continue
+                if len(pages) > 1 and repeats[line] >= min_repeats:
+                    if line in seen_headers:
+                        continue
+                    seen_headers.add(line)
+            out.append(line)
+    paragraphs = re.split(r"\n{2,}", "\n".join(out))
+    paragraphs = [p.strip() for p in paragraphs if p.strip() and not _BOILERPLATE_RE.search(p)]
+    return "\n\n".join(paragraphs)
+
+
+def prepare_cv_text(text, max_tokens, count_tokens):
+    """Tekst CV do promptu: znormalizowany i przycięty do budżetu (od początku - najważniejsze jest na górze)."""
+    return truncate_to_tokens(normalize_cv_text(text), max_tokens, count_tokens)
+
+
+def _parse_legacy(text):
+    """Dawny format "Imię: X, Stanowisko: Y, Firma: Z" - gdy model nie zwrócił JSON."""
+    name, job, company = None, None, None
+    for line in text.split("\n"):
+        if "imię:" in line.lower(): name = line.split(":", 1)[1].strip()
+        if "stanowisko:" in line.lower(): job = line.split(":", 1)[1].strip()
+        if "firma:" in line.lower(): company = line.split(":", 1)[1].strip()
+    return {"summary": text, "candidate_name": name, "last_job": job, "last_company": company}
+
+
+def parse_analysis(text):
+    """Słownik analizy z odpowiedzi modelu (JSON ze schematu, awaryjnie dawny format tekstowy)."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return _parse_legacy(text or "")
+    if not isinstance(data, dict):
+        return _parse_legacy(text)
+    analysis = {key: data.get(key) or None for key in CV_RESPONSE_SCHEMA["properties"]}
+    analysis["skills"] = [s for s in (data.get("skills") or []) if s]
+    analysis["languages"] = [s for s in (data.get("languages") or []) if s]
+    analysis["summary"] = data.get("summary") or ""
+    try:
+        years = data.get("years_experience")
+        analysis["years_experience"] = float(years) if years is not None else None
+    except (TypeError, ValueError):
+        analysis["years_experience"] = None
+    return analysis
+
+
+def analysis_text(analysis):
+    """Czytelna wersja analizy do kolumny umiejetnosci_tech i promptów raportu."""
+    if "skills" not in analysis:
+        return analysis.get("summary", "")  # dawny format - pola są już w treści podsumowania
+    lines = []
+    for label, key in (("Imię", "candidate_name"), ("Stanowisko", "last_job"), ("Firma", "last_company"),
+                       ("Lata doświadczenia", "years_experience"), ("Wykształcenie", "education")):
+        if analysis.get(key) not in (None, ""):
+            lines.append(f"{label}: {analysis[key]}")
+    for label, key in (("Umiejętności", "skills"), ("Języki", "languages")):
+        if analysis.get(key):
+            lines.append(f"{label}: {', '.join(analysis[key])}")
+    lines.append("")
+    lines.append(analysis.get("summary", ""))
+    return "\n".join(lines).strip()
+
+
+def bigquery_fields(analysis):
+    """Typowane kolumny zdarzenia cv_uploaded (po migracji `python migrations.py cv-columns`)."""
+    row = {}
+    for key, (column, _) in BIGQUERY_COLUMNS.items():
+        value = analysis.get(key)
+        row[column] = value if value is not None else ([] if key in ("skills", "languages") else None)
+    return row
+
+
+def greeting_name(analysis):
+    """Imię do powitania - bez "None", gdy modelu nie udało się go odczytać."""
+    name = (analysis or {}).get("candidate_name")
+    if not name or str(name).strip().lower() in ("none", "null", "nieznany", "brak"):
+        return "Kandydacie"
+    return str(name).split()[0]
@@ -0,0 +1,127 @@
+# cv_cache.py
+# Trwały cache CV adresowany treścią (SHA-256 bajtów pliku).
+# Dla każdego skrótu trzymamy wyciągnięty tekst, wynik analizy Gemini, embedding analizy i URL w GCS,
+# więc ponowne przesłanie identycznego pliku nie kosztuje ani wywołania modelu, ani zapisu do Storage.
+# Rozmiar cache jest ograniczony - przy przekroczeniu usuwane są najdawniej używane wpisy.
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = ".cache/cv_cache.sqlite"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def cv_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cv_blob_name(digest):
+    """Nazwa obiektu w GCS - niezależna od nazwy pliku, więc dwa różne 'CV.pdf' się nie nadpisują."""
+    return f"cv/{digest}.pdf"
+
+
+def digest_from_url(url):
+    """Skrót CV z adresu gs://.../cv/<skrót>.pdf (None dla innych adresów, np. sprzed adresowania treścią)."""
+    m = re.search(r"/cv/([0-9a-f]{64})\.pdf$", url or "")
+    return m.group(1) if m else None
+
+
+class CvCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cv_cache ("
+            " digest TEXT PRIMARY KEY,"
+            " text TEXT,"
+            " analysis TEXT,"
+            " gcs_url TEXT,"
+            " embedding TEXT,"
+            " size_bytes INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(cv_cache)")}
+        if "embedding" not in columns:  # plik cache sprzed dodania embeddingów
+            self._conn.execute("ALTER TABLE cv_cache ADD COLUMN embedding TEXT")
+        self._conn.commit()
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+    def get(self, digest):
+        """Zwraca {"text", "analysis", "gcs_url", "embedding"} albo None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, analysis, gcs_url, embedding FROM cv_cache WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._conn.execute("UPDATE cv_cache SET last_access = ? WHERE digest = ?", (time.time(), digest))
+            self._conn.commit()
+        text, analysis, gcs_url, embedding = row
+        return {"text": text, "analysis": json.loads(analysis) if analysis else None, "gcs_url": gcs_url,
+                "embedding": json.loads(embedding) if embedding else None}
+
+    def put(self, digest, text=None, analysis=None, gcs_url=None, embedding=None):
+        """Zapisuje (lub uzupełnia) wpis; pola None nie nadpisują istniejących wartości."""
+        analysis_json = json.dumps(analysis, ensure_ascii=False) if analysis is not None else None
+        embedding_json = json.dumps(embedding) if embedding is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO cv_cache (digest, text, analysis, gcs_url, embedding, size_bytes, last_access) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?) "
+                "ON CONFLICT(digest) DO UPDATE SET"
+                " text = COALESCE(excluded.text, text),"
+                " analysis = COALESCE(excluded.analysis, analysis),"
+                " gcs_url = COALESCE(excluded.gcs_url, gcs_url),"
+                " embedding = COALESCE(excluded.embedding, embedding),"
+                " last_access = excluded.last_access",
+                (digest, text, analysis_json, gcs_url, embedding_json, time.time()),
+            )
+            self._conn.execute(
+                "UPDATE cv_cache SET size_bytes = COALESCE(LENGTH(CAST(text AS BLOB)), 0)"
+                " + COALESCE(LENGTH(CAST(analysis AS BLOB)), 0) + COALESCE(LENGTH(CAST(gcs_url AS BLOB)), 0)"
+                " + COALESCE(LENGTH(CAST(embedding AS BLOB)), 0)"
+                " WHERE digest = ?", (digest,))
+            self._evict()
+            self._conn.commit()
+
+    def embeddings(self, digests):
+        """{skrót: embedding} dla wpisów, które go mają - odbudowa indeksu rankingu bez wywołań modelu."""
+        digests = list(digests)
+        out = {}
+        with self._lock:
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT digest, embedding FROM cv_cache WHERE embedding IS NOT NULL"
+                    f" AND digest IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+                out.update((digest, json.loads(embedding)) for digest, embedding in rows)
+        return out
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM cv_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for digest, size in self._conn.execute(
+                "SELECT digest, size_bytes FROM cv_cache ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM cv_cache WHERE digest = ?", (digest,))
+            total -= size
+            self._stats["evicted"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"], stats["bytes"] = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cv_cache").fetchone()
+        return stats
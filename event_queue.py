@@ -0,0 +1,202 @@
+# event_queue.py
+# Zapis "write-behind" zdarzeń do BigQuery.
+# Wątek UI tylko dopisuje wiersz do lokalnego spoola SQLite; wątek w tle wysyła je paczkami
+# (wg rozmiaru lub czasu), ponawia z wykładniczym backoffem i usuwa ze spoola dopiero po sukcesie.
+# Dzięki temu niewysłane wiersze przeżywają restart procesu.
+
+import atexit
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_SPOOL_PATH = ".spool/bq_events.sqlite"
+
+
+class EventWriter:
+    """
+    Kolejka zdarzeń z trwałym spoolem. `insert_fn(rows, row_ids)` ma semantykę
+    `bigquery.Client.insert_rows_json` - zwraca listę błędów (pusta = sukces).
+    `spool_path=":memory:"` daje spool w pamięci (np. do testów z atrapą klienta).
+    """
+
+    def __init__(self, insert_fn, spool_path=DEFAULT_SPOOL_PATH, batch_size=200, flush_interval=2.0,
+                 max_attempts=8, backoff_base=0.5, backoff_max=60.0):
+        self.insert_fn = insert_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._db_lock = threading.Lock()
+        self._conn = _open_spool(spool_path)
+        self._wakeup = threading.Event()
+        self._idle = threading.Condition()
+        self._closed = False
+        self._forced = set()  # wiersze przyspieszone przez flush - ich próba nie liczy się do max_attempts
+        self._stats = {"enqueued": 0, "sent": 0, "failed_batches": 0, "dead": 0}
+        self._thread = threading.Thread(target=self._run, name="bq-event-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close, 5.0)
+
+    # --- API dla wątku UI ---
+
+    def enqueue(self, row):
+        """Zapisuje wiersz w spoolu i wraca natychmiast. Zwraca identyfikator wiersza (insertId)."""
+        row_id = str(uuid.uuid4())
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT INTO events (row_id, payload, next_attempt_at) VALUES (?, ?, 0)",
+                (row_id, json.dumps(row, default=str)),
+            )
+            self._conn.commit()
+            self._stats["enqueued"] += 1
+        if self.pending() >= self.batch_size:
+            self._wakeup.set()
+        return row_id
+
+    def pending(self):
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events WHERE status = 'pending'").fetchone()[0]
+
+    def unsent(self, row_ids):
+        """Identyfikatory z `row_ids`, które wciąż są w spoolu (czekają na wysyłkę albo odrzucone)."""
+        row_ids = list(row_ids)
+        out = set()
+        with self._db_lock:
+            for start in range(0, len(row_ids), 500):
+                chunk = row_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT row_id FROM events WHERE row_id IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                out.update(row_id for row_id, in rows)
+        return out
+
+    def flush(self, timeout=None):
+        """
+        Wysyła od razu wszystkie oczekujące wiersze i czeka, aż spool się opróżni. Wiersze czekające na
+        ponowienie są przyspieszane tylko raz - dalsze próby idą zgodnie z backoffem, więc flush w czasie
+        awarii BigQuery nie wyczerpuje limitu prób. Zwraca True, jeśli zdążył i żaden wiersz nie trafił
+        do odrzuconych (`dead`).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._db_lock:
+            dead_before = self._stats["dead"]
+        self._force_due()
+        with self._idle:
+            while self.pending():
+                self._wakeup.set()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(min(remaining, 0.5) if remaining is not None else 0.5)
+        with self._db_lock:
+            return self._stats["dead"] == dead_before
+
+    def stats(self):
+        with self._db_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self.pending()
+        return stats
+
+    def close(self, timeout=5.0):
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    # --- Wątek w tle ---
+
+    def _force_due(self):
+        with self._db_lock:
+            waiting = self._conn.execute(
+                "SELECT id FROM events WHERE status = 'pending' AND next_attempt_at > ?", (time.time(),)
+            ).fetchall()
+            self._forced.update(pk for pk, in waiting)
+            self._conn.execute("UPDATE events SET next_attempt_at = 0 WHERE status = 'pending'")
+            self._conn.commit()
+
+    def _next_batch(self):
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT id, row_id, payload, attempts FROM events "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (time.time(), self.batch_size),
+            ).fetchall()
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempts))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _send(self, batch):
+        rows = [json.loads(payload) for _, _, payload, _ in batch]
+        row_ids = [row_id for _, row_id, _, _ in batch]
+        try:
+            errors = self.insert_fn(rows, row_ids) or []
+            failed_idx = {e.get("index") for e in errors if isinstance(e, dict)}
+            if errors and not failed_idx:
+                failed_idx = set(range(len(batch)))
+        except Exception:
+            failed_idx = set(range(len(batch)))
+
+        now = time.time()
+        with self._db_lock:
+            for i, (pk, _, _, attempts) in enumerate(batch):
+                forced = pk in self._forced
+                self._forced.discard(pk)
+                if i not in failed_idx:
+                    self._conn.execute("DELETE FROM events WHERE id = ?", (pk,))
+                    self._stats["sent"] += 1
+                elif forced:
+                    # Próba wymuszona przez flush - wracamy do harmonogramu backoffu bez zużywania prób
+                    self._conn.execute("UPDATE events SET next_attempt_at = ? WHERE id = ?",
+                                       (now + self._backoff(attempts), pk))
+                elif attempts + 1 >= self.max_attempts:
+                    # Wiersz zostaje w spoolu do ręcznej analizy, ale nie blokuje kolejki
+                    self._conn.execute("UPDATE events SET status = 'dead', attempts = ? WHERE id = ?",
+                                       (attempts + 1, pk))
+                    self._stats["dead"] += 1
+                else:
+                    self._conn.execute("UPDATE events SET attempts = ?, next_attempt_at = ? WHERE id = ?",
+                                       (attempts + 1, now + self._backoff(attempts), pk))
+            if failed_idx:
+                self._stats["failed_batches"] += 1
+            self._conn.commit()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    break
+                self._send(batch)
+                if len(batch) < self.batch_size:
+                    break
+            with self._idle:
+                self._idle.notify_all()
+
+
+def _open_spool(path):
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    if path != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS events ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " row_id TEXT NOT NULL,"
+        " payload TEXT NOT NULL,"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " next_attempt_at REAL NOT NULL DEFAULT 0,"
+        " status TEXT NOT NULL DEFAULT 'pending')"
+    )
+    conn.commit()
+    return conn
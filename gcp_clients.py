@@ -0,0 +1,182 @@
+# gcp_clients.py
+# Rejestr klientów GCP współdzielony przez wszystkie punkty wejścia aplikacji.
+# - każdy klient (BigQuery, Storage, Discovery Engine, modele Vertex AI) powstaje przy pierwszym użyciu
+#   i jest trzymany do końca procesu - kolejne przebiegi skryptu Streamlit nic już nie inicjalizują,
+# - ciężkie importy google.cloud / vertexai wykonujemy dopiero w chwili tworzenia klienta,
+#   więc pierwsze renderowanie strony na nie nie czeka,
+# - dane logowania: klucz z st.secrets ([gcp_service_account] keyfile_json), a bez niego
+#   Application Default Credentials,
+# - override() podmienia klienta (np. atrapą w benchmarku), stats() zwraca czasy inicjalizacji.
+#
+#   python gcp_clients.py   # mierzy czas importu i inicjalizacji każdego klienta
+
+import json
+import threading
+import time
+
+import config
+
+CLIENT_NAMES = ("bigquery", "storage", "search", "model", "embedding")
+
+
+class ClientInitError(Exception):
+    pass
+
+
+_lock = threading.RLock()
+_clients = {}
+_init_times = {}
+_errors = {}
+_startup = {}
+
+
+def _load_credentials():
+    try:
+        import streamlit as st
+        section = st.secrets["gcp_service_account"]
+    except Exception:
+        return None  # brak secrets - klienci użyją Application Default Credentials
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_info(json.loads(section["keyfile_json"]))
+
+
+def _build_bigquery():
+    from google.cloud import bigquery
+    return bigquery.Client(credentials=_get("credentials"), project=config.GCP_PROJECT_ID)
+
+
+def _build_storage():
+    from google.cloud import storage
+    return storage.Client(credentials=_get("credentials"), project=config.GCP_PROJECT_ID)
+
+
+def _build_search():
+    from google.api_core.client_options import ClientOptions
+    from google.cloud import discoveryengine_v1 as discoveryengine
+    if config.GCP_SEARCH_LOCATION == "global":
+        api_endpoint = "discoveryengine.googleapis.com"
+    else:
+        api_endpoint = f"{config.GCP_SEARCH_LOCATION}-discoveryengine.googleapis.com"
+    return discoveryengine.SearchServiceClient(client_options=ClientOptions(api_endpoint=api_endpoint),
+                                               credentials=_get("credentials"))
+
+
+def _init_vertexai():
+    import vertexai
+    vertexai.init(project=config.GCP_PROJECT_ID, location=config.GCP_GEMINI_LOCATION,
+                  credentials=_get("credentials"))
+    return True
+
+
+def _build_model():
+    _get("vertexai")
+    from vertexai.preview.generative_models import GenerativeModel
+    return GenerativeModel(config.MODEL_NAME)
+
+
+def _build_embedding_model():
+    _get("vertexai")
+    from vertexai.language_models import TextEmbeddingModel
+    return TextEmbeddingModel.from_pretrained(config.EMBEDDING_MODEL_NAME)
+
+
+_BUILDERS = {
+    "credentials": _load_credentials,
+    "bigquery": _build_bigquery,
+    "storage": _build_storage,
+    "search": _build_search,
+    "vertexai": _init_vertexai,
+    "model": _build_model,
+    "embedding": _build_embedding_model,
+}
+
+
+def _get(name):
+    if name in _clients:
+        return _clients[name]
+    with _lock:
+        if name in _clients:
+            return _clients[name]
+        t0 = time.perf_counter()
+        try:
+            client = _BUILDERS[name]()
+        except Exception as e:
+            # Błędu nie zapamiętujemy na stałe - kolejne użycie spróbuje ponownie
+            _errors[name] = str(e)
+            raise ClientInitError(f"Błąd inicjalizacji GCP ({name}): {e}") from e
+        _init_times[name] = time.perf_counter() - t0
+        _errors.pop(name, None)
+        _clients[name] = client
+        return client
+
+
+def bigquery_client():
+    return _get("bigquery")
+
+
+def storage_client():
+    return _get("storage")
+
+
+def search_client():
+    return _get("search")
+
+
+def model():
+    return _get("model")
+
+
+def embedding_model():
+    return _get("embedding")
+
+
+def try_client(name):
+    """Klient albo None, gdy nie da się go utworzyć (przyczyna trafia do stats()["errors"])."""
+    try:
+        return _get(name)
+    except ClientInitError:
+        return None
+
+
+def config_error():
+    """Opis błędu konfiguracji danych logowania albo None - bez tworzenia klientów."""
+    try:
+        _get("credentials")
+        return None
+    except ClientInitError as e:
+        return str(e)
+
+
+def override(name, client):
+    """Podmienia klienta (np. atrapą usług w benchmarku); None przywraca leniwe tworzenie."""
+    with _lock:
+        if client is None:
+            _clients.pop(name, None)
+        else:
+            _clients[name] = client
+        _init_times.pop(name, None)
+        _errors.pop(name, None)
+
+
+def record_startup(name, seconds):
+    """Zapamiętuje pomiar startu procesu (tylko pierwszy - to on obejmuje zimny start)."""
+    _startup.setdefault(name, seconds)
+
+
+def stats():
+    with _lock:
+        return {
+            "initialized": sorted(n for n in _clients if n not in ("credentials", "vertexai")),
+            "init_times_s": {n: round(t, 3) for n, t in _init_times.items()},
+            "errors": dict(_errors),
+            "startup_s": {n: round(t, 3) for n, t in _startup.items()},
+        }
+
+
+if __name__ == "__main__":
+    for client_name in ("credentials", "vertexai") + CLIENT_NAMES:
+        try:
+            _get(client_name)
+            print(f"{client_name:12s} {_init_times[client_name]:.3f} s")
+        except ClientInitError as e:
+            print(f"{client_name:12s} BŁĄD: {e}")
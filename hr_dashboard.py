@@ -1,71 +1,72 @@
 import streamlit as st
+import time
 
-# --- IMPORT KLIENTÓW ---
-# Pobieramy gotowe obiekty z Rekruter_AI.py
+import gcp_clients
+import llm_gateway
+import metrics
+from config import STREAM_RESPONSES, table_ref
+import queries
+from report_cache import describe, report_key
+from streaming import iter_response_text, response_usage
+
+# --- KLIENCI ---
+# Klienci GCP pochodzą ze wspólnego rejestru gcp_clients (tworzeni leniwie, raz na proces).
 # NIE ROBIMY TU ŻADNEGO vertexai.init() ANI bigquery.Client()
-try:
-    from Rekruter_AI import (
-        bigquery_client, 
-        model, 
-        GCP_PROJECT_ID, 
-        BIGQUERY_DATASET_ID, 
-        BIGQUERY_TABLE_ID
-    )
-except ImportError:
-    bigquery_client = None
-    model = None
+# Lista kandydatów, ranking, cache raportów i ocena masowa są wspólne z pages/hr_dashboard.py - hr_panel.py.
+from hr_panel import get_report_cache
+
+
+def build_report_prompt(job_desc, cv_analysis, transcript):
+    return f"""
+        Jesteś Senior Rekruterem. Oceń kandydata pod kątem ogłoszenia: {job_desc}
+        ANALIZA CV: {cv_analysis}
+        PRZEBIEG ROZMOWY: {transcript}
+        Stwórz raport: 1. Dopasowanie (%), 2. Mocne strony, 3. Decyzja.
+        """
 
-def get_candidates():
-    if not bigquery_client: 
-        # Cicha obsługa błędu, by nie wywalać błędu Metadata
-        return []
-        
-    q = f"""
-    SELECT id_kandydata, nazwa_pliku_cv, data_aplikacji, status_rekrutacji 
-    FROM `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}` 
-    WHERE event_type='cv_uploaded' 
-    ORDER BY data_aplikacji DESC LIMIT 50
-    """
-    try:
-        return [dict(row) for row in bigquery_client.query(q).result()]
-    except Exception:
-        return []
 
-def generate_report(cid, job_desc):
-    if not bigquery_client or not model:
+def generate_report(cid, job_desc, stream=None, force=False):
+    bigquery_client = gcp_clients.try_client("bigquery")
+    if not bigquery_client or not gcp_clients.try_client("model"):
         st.error("Usługi AI niedostępne - sprawdź konfigurację w Rekruter_AI.")
         return
 
     st.info(f"Generowanie raportu dla {cid}...")
     
-    q = f"""
-    SELECT t1.umiejetnosci_tech, t2.transkrypcja_rozmowy_ai 
-    FROM `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}` t1
-    LEFT JOIN `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}` t2 
-    ON t1.id_kandydata = t2.id_kandydata AND t2.event_type='transcript_saved'
-    WHERE t1.id_kandydata='{cid}' AND t1.event_type='cv_uploaded'
-    """
-    
     try:
-        query_job = bigquery_client.query(q)
-        results = list(query_job.result())
+        data = queries.report_inputs(bigquery_client, table_ref(), cid)
         
-        if not results:
+        if not data:
             st.warning("Brak danych transkrypcji.")
             return
             
-        data = results[0]
-        
-        prompt = f"""
-        Jesteś Senior Rekruterem. Oceń kandydata pod kątem ogłoszenia: {job_desc}
-        ANALIZA CV: {data.umiejetnosci_tech}
-        PRZEBIEG ROZMOWY: {data.transkrypcja_rozmowy_ai}
-        Stwórz raport: 1. Dopasowanie (%), 2. Mocne strony, 3. Decyzja.
-        """
+        cv_analysis, transcript = data["cv_analysis"], data["conversation_transcript"]
+        key = report_key(cid, job_desc, cv_analysis, transcript, "app")
+        cached = None if force else get_report_cache().get(key)
+        if cached:
+            st.success("Raport gotowy:")
+            st.markdown(cached["report"])
+            st.caption(describe(cached))
+            return
+
+        prompt = build_report_prompt(job_desc, cv_analysis, transcript)
         
-        resp = model.generate_content(prompt)
-        st.success("Raport gotowy:")
-        st.markdown(resp.text)
+        if stream is None:
+            stream = STREAM_RESPONSES
+        t0 = time.perf_counter()
+        with metrics.timed("gemini.report") as span:
+            if stream:
+                st.success("Raport:")
+                usage = {}
+                report = st.write_stream(iter_response_text(llm_gateway.generate(prompt, stream=True), usage))
+            else:
+                resp = llm_gateway.generate(prompt)
+                report, usage = resp.text, response_usage(resp)
+                st.success("Raport gotowy:")
+                st.markdown(report)
+            span.usage(usage)
+        get_report_cache().put(key, report, time.perf_counter() - t0, usage)
         
     except Exception as e:
         st.error(f"Błąd generowania raportu: {e}")
+
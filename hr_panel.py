@@ -0,0 +1,137 @@
+# hr_panel.py
+# Logika wspólna obu paneli HR (zakładka w app.py i strona pages/hr_dashboard.py):
+# lista kandydatów z lokalnym cache, ranking embeddingów, cache raportów i ocena masowa.
+# Panele różnią się tylko promptem raportu i wyglądem - dane, cache i zapisy są tu, w jednym miejscu.
+
+import streamlit as st
+
+import gcp_clients
+import llm_gateway
+import metrics
+from batch_scoring import score_candidates
+from candidate_list import CandidateList
+from config import BIGQUERY_SCORE_COLUMNS, BIGQUERY_STATE_TABLE_ID, CANDIDATES_LOOKBACK_DAYS, table_ref
+from report_cache import ReportCache
+from streaming import response_usage
+from Rekruter_AI import get_event_writer, rank_candidates, record_event, refresh_ranking_index
+
+BATCH_SCORING_CONCURRENCY = 4  # Równoległe raporty w trybie "oceń wszystkich"
+BATCH_SCORING_CALLS_PER_MINUTE = 60  # Limit wywołań Gemini w trybie masowym
+BATCH_SCORING_WRITE_TIMEOUT_SECONDS = 30.0  # Tyle czekamy, aż kolejka zdarzeń wyśle wyniki oceny
+REPORT_CACHE_PATH = ".cache/reports.sqlite"
+CANDIDATES_PAGE_SIZE = 50
+RANKING_REPORT_TOP_K = 10  # Raporty LLM w ocenie masowej tylko dla tylu najlepszych z rankingu embeddingów
+RANKING_STATUS_OVERFETCH = 5  # Przy filtrze statusu bierzemy z rankingu tyle razy więcej kandydatów
+
+
+@st.cache_resource
+def get_report_cache():
+    return ReportCache(REPORT_CACHE_PATH)
+
+
+@st.cache_resource
+def get_candidate_list():
+    # Jedna lista na proces - oba panele i wszystkie sesje korzystają z tego samego cache
+    state_table = table_ref(BIGQUERY_STATE_TABLE_ID) if BIGQUERY_STATE_TABLE_ID else None
+    return CandidateList(gcp_clients.bigquery_client(), table_ref(), page_size=CANDIDATES_PAGE_SIZE,
+                         state_table=state_table, with_scores=BIGQUERY_SCORE_COLUMNS,
+                         lookback_days=CANDIDATES_LOOKBACK_DAYS)
+
+
+def get_candidates(status=None, limit=CANDIDATES_PAGE_SIZE, posting=None):
+    """
+    Lista kandydatów od najnowszych albo - gdy podano ogłoszenie z embeddingiem - krótka lista
+    od najlepiej dopasowanych (kolumna `podobienstwo`), bez wywołań modelu.
+    """
+    if not gcp_clients.try_client("bigquery"):
+        st.error(f"BigQuery niedostępne: {gcp_clients.config_error()}")
+        return []
+    try:
+        ranked = rank_candidates(posting, limit * RANKING_STATUS_OVERFETCH if status else limit)
+        if ranked:
+            scores = dict(ranked)
+            rows = get_candidate_list().get_many([cid for cid, _ in ranked], status=status)[:limit]
+            return [{**row, "podobienstwo": round(scores[row["id_kandydata"]], 3)} for row in rows]
+        return get_candidate_list().get(status=status, limit=limit)
+    except Exception as e:
+        st.error(f"Błąd podczas pobierania listy kandydatów: {e}")
+        return []
+
+
+def refresh_candidates():
+    """Dociąga tylko zdarzenia nowsze niż ostatnio widziane (bez skanowania całej tabeli)."""
+    if not gcp_clients.try_client("bigquery"):
+        return 0
+    try:
+        refresh_ranking_index()
+        return get_candidate_list().refresh()
+    except Exception as e:
+        st.error(f"Błąd odświeżania listy: {e}")
+        return 0
+
+
+def score_all_candidates(candidate_ids, job_desc, build_prompt, cache_variant, generation_config=None,
+                         concurrency=BATCH_SCORING_CONCURRENCY, calls_per_minute=BATCH_SCORING_CALLS_PER_MINUTE):
+    """Ocena wielu kandydatów naraz - z paskiem postępu i zapisem % dopasowania i rekomendacji do BigQuery."""
+    bigquery_client = gcp_clients.try_client("bigquery")
+    if not bigquery_client or not gcp_clients.try_client("model"):
+        st.error("Usługi AI niedostępne - sprawdź konfigurację w Rekruter_AI.")
+        return []
+
+    progress = st.progress(0.0, text=f"Ocenianie 0/{len(candidate_ids)}...")
+
+    def on_progress(done, total, result):
+        progress.progress(done / total, text=f"Ocenianie {done}/{total}...")
+
+    def generate(prompt):
+        return llm_gateway.generate(prompt, generation_config)
+
+    def write_scores(rows):
+        # Czekamy na kolejkę zdarzeń: odświeżona lista ma widzieć wyniki, a w cache raportów oznaczamy
+        # tylko wiersze przyjęte przez BigQuery (pozostałe zapisze kolejna ocena)
+        row_ids = [record_event(row) for row in rows]
+        writer = get_event_writer()
+        writer.flush(BATCH_SCORING_WRITE_TIMEOUT_SECONDS)
+        unsent = writer.unsent(row_ids)
+        return [row["id_kandydata"] for row, row_id in zip(rows, row_ids) if row_id not in unsent]
+
+    try:
+        results = score_candidates(
+            candidate_ids, job_desc, bigquery_client, table_ref(),
+            generate_fn=metrics.wrap("gemini.report_batch", generate, usage_fn=response_usage),
+            build_prompt=build_prompt, write_fn=write_scores, report_cache=get_report_cache(),
+            cache_variant=cache_variant, concurrency=concurrency, calls_per_minute=calls_per_minute,
+            on_progress=on_progress, with_scores=BIGQUERY_SCORE_COLUMNS,
+        )
+    except Exception as e:
+        st.error(f"Błąd oceny kandydatów: {e}")
+        return []
+
+    failed = [r for r in results if r.get("blad")]
+    st.success(f"Ocenieni kandydaci: {len(results) - len(failed)}/{len(results)}.")
+    if failed:
+        st.warning("Nie udało się ocenić: " + ", ".join(f"{r['id_kandydata']} ({r['blad']})" for r in failed))
+    refresh_candidates()
+    return results
+
+
+def batch_scoring_section(candidates, job_desc, build_prompt, cache_variant, generation_config=None):
+    """Interfejs oceny masowej pod listą kandydatów (lista musi być niepusta)."""
+    # Przy rankingu raporty LLM tylko dla najlepszych k - reszta odpada już na etapie embeddingów
+    is_ranked = candidates[0].get("podobienstwo") is not None
+    top_k = st.number_input("Raporty tylko dla najlepszych (top-k):", min_value=1, max_value=len(candidates),
+                            value=min(RANKING_REPORT_TOP_K, len(candidates)), disabled=not is_ranked)
+    pool = candidates[:int(top_k)] if is_ranked else candidates
+    batch_ids = st.multiselect(
+        "Kandydaci do oceny:",
+        [c["id_kandydata"] for c in candidates],
+        default=[c["id_kandydata"] for c in pool
+                 if c.get("dopasowanie_procent") is None and c.get("status_rekrutacji") != "Oceniony"]
+    )
+    concurrency = st.number_input("Równoległe raporty:", min_value=1, max_value=16, value=BATCH_SCORING_CONCURRENCY)
+    if st.button("Oceń wszystkich wybranych"):
+        if batch_ids and job_desc:
+            score_all_candidates(batch_ids, job_desc, build_prompt, cache_variant, generation_config,
+                                 concurrency=int(concurrency))
+        else:
+            st.warning("Proszę wybrać kandydatów i upewnić się, że ogłoszenie o pracę jest ustawione powyżej.")
@@ -0,0 +1,128 @@
+# intake.py
+# Potok przyjęcia CV: upload do GCS i ekstrakcja tekstu startują równolegle,
+# analiza Gemini rusza, gdy tylko tekst jest gotowy, a embedding analizy (ranking kandydatów) - gdy gotowa
+# jest analiza. Czas przyjęcia to w przybliżeniu czas najwolniejszego etapu, a nie suma wszystkich.
+# Błąd dowolnego etapu poza embeddingiem anuluje pozostałe (także analiza zwrócona z flagą "error");
+# brak embeddingu nie blokuje zgłoszenia.
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from cv_cache import cv_digest
+
+
+class IntakeError(Exception):
+    """Etap potoku zakończył się błędem; `stage` to "upload", "extract" albo "analyze"."""
+
+    def __init__(self, stage, cause):
+        super().__init__(f"{stage}: {cause}")
+        self.stage = stage
+        self.cause = cause
+
+
+class AnalysisError(Exception):
+    """`analyze_fn` zwróciło analizę z flagą "error"; komunikatem jest jej `summary`."""
+
+
+@dataclass
+class IntakeResult:
+    digest: str
+    text: str
+    analysis: dict
+    gcs_url: str
+    embedding: list = None  # embedding analizy CV (None - brak modelu embeddingów albo błąd)
+    extraction: object = None  # pdf_extract.PdfExtraction, jeśli tekst nie pochodził z cache
+    timings: dict = field(default_factory=dict)  # sekundy na etap + "total"
+    cached: list = field(default_factory=list)  # etapy pominięte dzięki cache CV
+
+
+class CvIntakePipeline:
+    """
+    `extract_fn(data) -> PdfExtraction`, `upload_fn(data, file_name, digest) -> url`,
+    `analyze_fn(text) -> dict`, opcjonalnie `embed_fn(analysis) -> list | None`.
+    Opcjonalny `cache` (cv_cache.CvCache) pozwala pominąć etapy.
+    """
+
+    def __init__(self, extract_fn, upload_fn, analyze_fn, cache=None, max_workers=8, embed_fn=None):
+        self.extract_fn = extract_fn
+        self.upload_fn = upload_fn
+        self.analyze_fn = analyze_fn
+        self.embed_fn = embed_fn
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cv-intake")
+
+    def _timed(self, timings, stage, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings[stage] = time.perf_counter() - t0
+
+    def _embed(self, analysis):
+        try:
+            return self.embed_fn(analysis)
+        except Exception:
+            return None  # kandydata dopisze do rankingu odbudowa indeksu
+
+    def run(self, data, file_name):
+        started = time.perf_counter()
+        digest = cv_digest(data)
+        cached = (self.cache.get(digest) if self.cache else None) or {}
+        text, analysis, url = cached.get("text"), cached.get("analysis"), cached.get("gcs_url")
+        result = IntakeResult(digest=digest, text=text, analysis=analysis, gcs_url=url,
+                              embedding=cached.get("embedding"))
+        result.cached = [stage for stage, value in (("extract", text), ("analyze", analysis), ("upload", url),
+                                                    ("embed", result.embedding)) if value is not None]
+        pending = {}
+
+        def submit(stage, fn, *args):
+            pending[self._pool.submit(self._timed, result.timings, stage, fn, *args)] = stage
+
+        def submit_embed():
+            if self.embed_fn is not None and result.embedding is None and result.analysis:
+                submit("embed", self._embed, result.analysis)
+
+        if url is None:
+            submit("upload", self.upload_fn, data, file_name, digest)
+        if text is None:
+            submit("extract", self.extract_fn, data)
+        elif analysis is None:
+            submit("analyze", self.analyze_fn, text)
+        else:
+            submit_embed()
+
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = pending.pop(future)
+                error = future.exception()
+                if error is None and stage == "analyze" and (future.result() or {}).get("error"):
+                    error = AnalysisError(future.result().get("summary"))
+                if error is not None:
+                    # Anulujemy to, co jeszcze nie wystartowało; trwających wywołań nie czekamy
+                    for other in pending:
+                        other.cancel()
+                    raise IntakeError(stage, error)
+                value = future.result()
+                if stage == "upload":
+                    result.gcs_url = value
+                elif stage == "extract":
+                    result.extraction = value
+                    result.text = value.text
+                    if result.analysis is None:
+                        submit("analyze", self.analyze_fn, result.text)
+                    else:
+                        submit_embed()
+                elif stage == "analyze":
+                    result.analysis = value
+                    submit_embed()
+                else:
+                    result.embedding = value
+
+        if self.cache is not None:
+            # Błędna analiza kończy się wyjątkiem powyżej, więc do cache trafiają tylko udane
+            self.cache.put(digest, text=result.text, analysis=result.analysis, gcs_url=result.gcs_url,
+                           embedding=result.embedding)
+        result.timings["total"] = time.perf_counter() - started
+        return result
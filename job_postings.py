@@ -0,0 +1,236 @@
+# job_postings.py
+# Trwały rejestr ogłoszeń o pracę (zamiast st.session_state.active_job_description).
+# Każde ogłoszenie ma identyfikator i przy zapisie jest jednorazowo przetwarzane na artefakty:
+# listę wymagań, zwięzłe streszczenie do promptów, kontekst RAG i embedding.
+# Tury rozmowy i raporty korzystają z tych artefaktów zamiast za każdym razem wysyłać pełną treść.
+#
+# Magazyn: tabela BigQuery `Ogloszenia` (migrations.py postings; zapis tylko przez dopisywanie wierszy,
+# obowiązuje najnowszy wiersz ogłoszenia) albo - bez niej - lokalny SQLite współdzielony przez sesje procesu.
+# Rejestr trzyma ogłoszenia w pamięci i co `refresh_seconds` dociąga zmiany z magazynu; gdy magazyn jest
+# niedostępny, serwuje ogłoszenia z pamięci i próbuje ponownie przy kolejnym odświeżeniu.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+import queries
+
+DEFAULT_DB_PATH = ".cache/postings.sqlite"
+ARTIFACTS_PROMPT = """
+Jesteś rekruterem IT. Na podstawie ogłoszenia o pracę zwróć wyłącznie JSON:
+requirements - lista konkretnych wymagań (krótkie punkty, najważniejsze najpierw),
+summary - zwięzłe streszczenie stanowiska do dalszych promptów (maksymalnie 80 słów, po polsku).
+TYTUŁ: {title}
+OGŁOSZENIE: {text}
+"""
+ARTIFACTS_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {"requirements": {"type": "array", "items": {"type": "string"}}, "summary": {"type": "string"}},
+        "required": ["requirements", "summary"],
+    },
+    "temperature": 0.2,
+    "max_output_tokens": 1024,
+}
+POSTING_FIELDS = ["id_ogloszenia", "tytul", "tresc", "wymagania", "streszczenie", "kontekst_rag", "embedding",
+                  "aktywne", "utworzono", "zaktualizowano"]
+
+
+@dataclass
+class JobPosting:
+    id_ogloszenia: str
+    tytul: str
+    tresc: str
+    wymagania: list = field(default_factory=list)
+    streszczenie: str = ""
+    kontekst_rag: str = ""
+    embedding: list = None
+    aktywne: bool = True
+    utworzono: str = ""
+    zaktualizowano: str = ""
+
+    def prompt_text(self):
+        """Zwięzła wersja ogłoszenia do promptów (streszczenie + wymagania); bez artefaktów - pełna treść."""
+        if not self.streszczenie and not self.wymagania:
+            return self.tresc
+        lines = [f"Stanowisko: {self.tytul}", self.streszczenie]
+        if self.wymagania:
+            lines.append("Wymagania:")
+            lines += [f"- {req}" for req in self.wymagania]
+        return "\n".join(line for line in lines if line)
+
+    def label(self):
+        return f"{self.tytul} ({self.id_ogloszenia[:8]})"
+
+
+def parse_artifacts(text):
+    """{"wymagania", "streszczenie"} z odpowiedzi modelu (puste, gdy odpowiedź nie jest poprawnym JSON)."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {"wymagania": [r.strip() for r in data.get("requirements") or [] if r and r.strip()],
+            "streszczenie": (data.get("summary") or "").strip()}
+
+
+def embedding_text(title, artifacts, text):
+    """Tekst, z którego liczymy embedding ogłoszenia - te same artefakty, które trafiają do promptów."""
+    parts = [title, artifacts.get("streszczenie", "")] + list(artifacts.get("wymagania") or [])
+    compact = "\n".join(p for p in parts if p)
+    return compact if artifacts.get("streszczenie") else f"{title}\n{text}"
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _from_row(row):
+    data = {k: row.get(k) for k in POSTING_FIELDS}
+    data["wymagania"] = list(data["wymagania"] or [])
+    data["embedding"] = list(data["embedding"]) if data["embedding"] else None
+    data["aktywne"] = bool(data["aktywne"]) if data["aktywne"] is not None else True
+    data["utworzono"] = str(data["utworzono"] or "")
+    data["zaktualizowano"] = str(data["zaktualizowano"] or "")
+    return JobPosting(**data)
+
+
+# --- Magazyny ---
+
+class SqlitePostingStore:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS postings (id_ogloszenia TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._conn.commit()
+
+    def load_all(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM postings").fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def save(self, row):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO postings VALUES (?, ?)",
+                               (row["id_ogloszenia"], json.dumps(row, ensure_ascii=False)))
+            self._conn.commit()
+
+
+class BigQueryPostingStore:
+    """Tabela `Ogloszenia` w BigQuery; `client_fn()` zwraca klienta (rejestr gcp_clients)."""
+
+    def __init__(self, client_fn, table):
+        self.client_fn = client_fn
+        self.table = table
+
+    def load_all(self):
+        return queries.latest_postings(self.client_fn(), self.table)
+
+    def save(self, row):
+        errors = self.client_fn().insert_rows_json(self.table, [row])
+        if errors:
+            raise RuntimeError(f"Błąd zapisu ogłoszenia do BigQuery: {errors}")
+
+
+# --- Rejestr ---
+
+class PostingRegistry:
+    """
+    `preprocess_fn(tytul, tresc) -> {"wymagania", "streszczenie", "kontekst_rag", "embedding"}` liczy
+    artefakty ogłoszenia (raz, przy zapisie). Brakujące artefakty nie blokują zapisu ogłoszenia.
+    Nieznane id wymusza odczyt magazynu najwyżej raz na `miss_reload_seconds`.
+    """
+
+    def __init__(self, store, preprocess_fn, refresh_seconds=60.0, miss_reload_seconds=5.0):
+        self.store = store
+        self.preprocess_fn = preprocess_fn
+        self.refresh_seconds = refresh_seconds
+        self.miss_reload_seconds = miss_reload_seconds
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._loaded_at = None
+        self._missed_at = None  # ostatni odczyt wymuszony przez nieznane id
+        self._load_error = None
+
+    def _ensure_loaded(self, force=False):
+        with self._lock:
+            if not force and self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            self._loaded_at = time.monotonic()
+            try:
+                rows = self.store.load_all()
+            except Exception as e:
+                # Błąd magazynu nie wyłącza formularzy - zostają ogłoszenia z pamięci do następnego odświeżenia
+                self._load_error = f"{type(e).__name__}: {e}"
+                return
+            self._load_error = None
+            # Scalamy, nie podmieniamy - świeżo zapisane ogłoszenie może jeszcze nie być widoczne w magazynie
+            self._postings.update({row["id_ogloszenia"]: _from_row(row) for row in rows})
+
+    def refresh(self):
+        self._ensure_loaded(force=True)
+
+    def get(self, posting_id):
+        if not posting_id:
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            posting = self._postings.get(posting_id)
+            now = time.monotonic()
+            if posting is None and (self._missed_at is None or now - self._missed_at >= self.miss_reload_seconds):
+                self._missed_at = now
+                self._ensure_loaded(force=True)  # mogło zostać zapisane w innym procesie
+                posting = self._postings.get(posting_id)
+        return posting
+
+    def list(self, active_only=True):
+        """Ogłoszenia od najnowszych."""
+        self._ensure_loaded()
+        with self._lock:
+            postings = [p for p in self._postings.values() if p.aktywne or not active_only]
+        return sorted(postings, key=lambda p: p.utworzono, reverse=True)
+
+    def latest(self):
+        postings = self.list()
+        return postings[0] if postings else None
+
+    def _persist(self, posting):
+        self.store.save(asdict(posting))
+        with self._lock:
+            self._postings[posting.id_ogloszenia] = posting
+
+    def save(self, title, text):
+        """Zapisuje nowe ogłoszenie wraz z artefaktami i zwraca je."""
+        artifacts = self.preprocess_fn(title, text) or {}
+        now = _now()
+        posting = JobPosting(id_ogloszenia=str(uuid.uuid4()), tytul=title or "Ogłoszenie", tresc=text,
+                             wymagania=list(artifacts.get("wymagania") or []),
+                             streszczenie=artifacts.get("streszczenie") or "",
+                             kontekst_rag=artifacts.get("kontekst_rag") or "",
+                             embedding=artifacts.get("embedding"), utworzono=now, zaktualizowano=now)
+        self._persist(posting)
+        return posting
+
+    def set_active(self, posting_id, active):
+        posting = self.get(posting_id)
+        if posting is None:
+            return None
+        posting = JobPosting(**{**asdict(posting), "aktywne": active, "zaktualizowano": _now()})
+        self._persist(posting)
+        return posting
+
+    def stats(self):
+        with self._lock:
+            return {"postings": len(self._postings),
+                    "active": sum(1 for p in self._postings.values() if p.aktywne),
+                    "with_embedding": sum(1 for p in self._postings.values() if p.embedding),
+                    "load_error": self._load_error}
@@ -0,0 +1,263 @@
+# knowledge_base.py
+# Backendy wyszukiwania w bazie wiedzy (RAG) - wymienne, o wspólnym interfejsie
+# `hits(query, k) -> [{"doc_id", "text", "score"}]`:
+# - DiscoveryEngineBackend: zapytanie sieciowe do Vertex AI Search (Discovery Engine),
+# - LocalIndex: dokumenty wczytane raz do pamięci procesu, indeks BM25, odpowiedź w milisekundach,
+# - FallbackBackend: backend zdalny z limitem czasu; po przekroczeniu czasu lub błędzie odpowiada lokalny.
+# Warstwa retrieval.KnowledgeBaseRetriever (cache + pula wątków) korzysta z `search_fn`, czyli z `as_search_fn`.
+#
+# Dokumenty lokalnego indeksu: katalog (.txt, .md, .pdf) albo prefiks gs://bucket/katalog/.
+#
+# Pomiar opóźnień i trafności (recall@k) bez uruchamiania aplikacji:
+#   python knowledge_base.py ./wiedza pytania.jsonl -k 3
+#   python knowledge_base.py gs://rekrutacja-pliki-2026/wiedza/ pytania.jsonl --remote
+# Plik pytań: linie {"query": "...", "relevant": ["fragment ścieżki/nazwy dokumentu", ...]}.
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import config
+import metrics
+
+DOC_EXTENSIONS = (".txt", ".md", ".pdf")
+CHUNK_WORDS = 120  # Fragment dokumentu zwracany jako jeden snippet
+STEM_PREFIX = 6  # Odmiana w języku polskim: porównujemy początki słów
+BM25_K1 = 1.5
+BM25_B = 0.75
+SNIPPET_SEPARATOR = "\n---\n"
+
+
+def tokenize(text):
+    return [t[:STEM_PREFIX] for t in re.findall(r"\w+", (text or "").lower()) if len(t) > 1]
+
+
+def format_snippets(hits):
+    """Wynik w formacie dotychczasowego kontekstu RAG (snippety rozdzielone ---)."""
+    return SNIPPET_SEPARATOR.join(hit["text"] for hit in hits)
+
+
+def chunk_text(text, words=CHUNK_WORDS):
+    """Dzieli tekst na fragmenty po ~`words` słów, nie rozcinając akapitów, jeśli się da."""
+    chunks, current = [], []
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        para_words = paragraph.split()
+        if current and len(current) + len(para_words) > words:
+            chunks.append(" ".join(current))
+            current = []
+        current.extend(para_words)
+        while len(current) > words:
+            chunks.append(" ".join(current[:words]))
+            current = current[words:]
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+# --- Wczytywanie dokumentów ---
+
+def _decode(name, data):
+    if name.lower().endswith(".pdf"):
+        from pdf_extract import extract_pdf_text
+        return extract_pdf_text(data).text
+    return data.decode("utf-8", errors="replace")
+
+
+def load_documents(source):
+    """[(doc_id, tekst)] z katalogu lokalnego albo z prefiksu gs://bucket/katalog/."""
+    if not source:
+        return []
+    docs = []
+    if source.startswith("gs://"):
+        import gcp_clients
+        bucket, _, prefix = source[len("gs://"):].partition("/")
+        for blob in gcp_clients.storage_client().list_blobs(bucket, prefix=prefix):
+            if blob.name.lower().endswith(DOC_EXTENSIONS):
+                docs.append((f"gs://{bucket}/{blob.name}", _decode(blob.name, blob.download_as_bytes())))
+        return docs
+    for root, _, files in os.walk(source):
+        for name in sorted(files):
+            if name.lower().endswith(DOC_EXTENSIONS):
+                path = os.path.join(root, name)
+                with open(path, "rb") as fh:
+                    docs.append((os.path.relpath(path, source), _decode(name, fh.read())))
+    return docs
+
+
+# --- Backendy ---
+
+class LocalIndex:
+    """Indeks BM25 fragmentów dokumentów, w całości w pamięci procesu (bez zapytań sieciowych)."""
+
+    def __init__(self, documents):
+        t0 = time.perf_counter()
+        self._chunks = []  # (doc_id, tekst)
+        self._postings = defaultdict(list)  # token -> [(nr fragmentu, liczba wystąpień)]
+        self._lengths = []
+        for doc_id, text in documents:
+            for chunk in chunk_text(text):
+                i = len(self._chunks)
+                self._chunks.append((doc_id, chunk))
+                counts = Counter(tokenize(chunk))
+                self._lengths.append(sum(counts.values()))
+                for token, tf in counts.items():
+                    self._postings[token].append((i, tf))
+        n = len(self._chunks)
+        self._avg_length = sum(self._lengths) / n if n else 0.0
+        self._idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self._postings.items()}
+        self.documents = len({doc_id for doc_id, _ in self._chunks})
+        self.build_seconds = time.perf_counter() - t0
+
+    @classmethod
+    def from_source(cls, source):
+        return cls(load_documents(source))
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def hits(self, query, k=3):
+        with metrics.timed("search.local"):
+            return self._hits(query, k)
+
+    def _hits(self, query, k):
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for i, tf in self._postings[token]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[i] / self._avg_length)
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [{"doc_id": self._chunks[i][0], "text": self._chunks[i][1], "score": s} for i, s in best]
+
+    def stats(self):
+        return {"documents": self.documents, "chunks": len(self._chunks), "terms": len(self._postings),
+                "build_seconds": round(self.build_seconds, 3)}
+
+
+class DiscoveryEngineBackend:
+    """Wyszukiwanie w data store Discovery Engine (klient z rejestru gcp_clients)."""
+
+    def __init__(self, project=config.GCP_PROJECT_ID, location=config.GCP_SEARCH_LOCATION,
+                 data_store_id=config.DATA_STORE_ID):
+        self.serving_config = (f"projects/{project}/locations/{location}/collections/default_collection"
+                               f"/dataStores/{data_store_id}/servingConfigs/default_config")
+
+    def hits(self, query, k=3):
+        import gcp_clients
+        from google.cloud import discoveryengine_v1 as discoveryengine
+        req = discoveryengine.SearchRequest(
+            serving_config=self.serving_config, query=query, page_size=k,
+            content_search_spec=discoveryengine.SearchRequest.ContentSearchSpec(
+                snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(return_snippet=True)
+            )
+        )
+        with metrics.timed("search.discovery"):
+            resp = gcp_clients.search_client().search(req)
+        out = []
+        for r in resp.results:
+            data = r.document.derived_struct_data
+            if "snippets" in data:
+                out.append({"doc_id": data.get("link") or r.document.id,
+                            "text": data["snippets"][0]["snippet"], "score": None})
+        return out
+
+
+class FallbackBackend:
+    """
+    Backend zdalny z limitem czasu. Po przekroczeniu czasu, błędzie albo (opcjonalnie) pustym wyniku
+    odpowiada backend lokalny - rozmowa nie traci kontekstu przez wolne lub niedostępne API.
+    """
+
+    def __init__(self, primary, fallback, timeout=1.5, max_workers=4, fallback_on_empty=True):
+        self.primary = primary
+        self.fallback = fallback
+        self.timeout = timeout
+        self.fallback_on_empty = fallback_on_empty
+        # Osobna pula: wywołania zdalne, które przekroczyły czas, kończą się w tle
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-remote")
+        self._lock = threading.Lock()
+        self._stats = {"primary": 0, "timeouts": 0, "errors": 0, "empty": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def hits(self, query, k=3):
+        future = self._pool.submit(self.primary.hits, query, k)
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._count("timeouts")
+            return self.fallback.hits(query, k)
+        except Exception:
+            self._count("errors")
+            return self.fallback.hits(query, k)
+        if not result and self.fallback_on_empty:
+            self._count("empty")
+            return self.fallback.hits(query, k)
+        self._count("primary")
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        if hasattr(self.fallback, "stats"):
+            stats["fallback_index"] = self.fallback.stats()
+        return stats
+
+
+def as_search_fn(backend, k=3):
+    """Funkcja `search_fn(query) -> str` dla retrieval.KnowledgeBaseRetriever."""
+    def search(query):
+        return format_snippets(backend.hits(query, k))
+    return search
+
+
+# --- Benchmark offline ---
+
+def _benchmark(backend, questions, k):
+    latencies, found, relevant_total = [], 0, 0
+    for item in questions:
+        t0 = time.perf_counter()
+        try:
+            hits = backend.hits(item["query"], k)
+        except Exception as e:
+            print(f"  błąd dla {item['query']!r}: {e}")
+            hits = []
+        latencies.append(time.perf_counter() - t0)
+        relevant = item.get("relevant", [])
+        relevant_total += len(relevant)
+        found += sum(1 for rel in relevant if any(rel in hit["doc_id"] for hit in hits))
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    recall = found / relevant_total if relevant_total else 0.0
+    return f"recall@{k}={recall:.2f}, p50={pct(0.5):.1f} ms, p95={pct(0.95):.1f} ms, max={pct(1.0):.1f} ms"
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Pomiar opóźnień i trafności backendów bazy wiedzy.")
+    parser.add_argument("source", help="katalog dokumentów albo gs://bucket/prefiks/")
+    parser.add_argument("questions", help="plik JSONL z polami query i relevant")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--remote", action="store_true", help="porównaj z Discovery Engine")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as fh:
+        questions = [json.loads(line) for line in fh if line.strip()]
+    local = LocalIndex.from_source(args.source)
+    print(f"Indeks lokalny: {local.stats()}")
+    print(f"Lokalny BM25:     {_benchmark(local, questions, args.k)}")
+    if args.remote:
+        print(f"Discovery Engine: {_benchmark(DiscoveryEngineBackend(), questions, args.k)}")
@@ -0,0 +1,213 @@
+# llm_gateway.py
+# Wspólna dla całego procesu bramka wywołań modelu (generate_content):
+# - limiter "token bucket" (rate_limit.py) ustawiony na quota projektu - burst kandydatów nie kończy się 429,
+# - ograniczona liczba równoległych wywołań; czekający stoją w kolejce (z limitem czasu),
+# - ponowienia z losowym opóźnieniem (exponential backoff + jitter) dla błędów przejściowych (429, 5xx, timeout),
+# - identyczne, równoległe prompty (ten sam prompt i konfiguracja) są scalane w jedno wywołanie.
+# Czas oczekiwania w kolejce trafia do metryk jako etap llm.wait, ponowienia jako llm.retry,
+# a głębokość kolejki i liczba trwających wywołań jako wskaźniki (metrics.set_gauge).
+#
+#   response = llm_gateway.generate(prompt, {"max_output_tokens": 400})
+#   for chunk in llm_gateway.generate(prompt, stream=True): ...
+#
+# Moduł nie importuje SDK Google - model pochodzi z rejestru gcp_clients, błędy rozpoznajemy po kodzie HTTP i nazwie.
+
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import metrics
+from rate_limit import TokenBucket
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                    "BadGateway", "GatewayTimeout", "DeadlineExceeded", "Aborted", "ConnectionError", "TimeoutError"}
+
+
+class LlmOverloadedError(RuntimeError):
+    """Wywołanie nie doczekało się wolnego miejsca w kolejce ani limitu quota w wyznaczonym czasie."""
+
+
+def is_retryable(exc):
+    """Błąd przejściowy (przekroczona quota, chwilowa niedostępność, timeout) - warto ponowić wywołanie."""
+    if getattr(exc, "code", None) in RETRYABLE_CODES:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(exc).__mro__)
+
+
+def _prompt_key(prompt, generation_config):
+    payload = json.dumps([prompt, generation_config], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LlmGateway:
+    """
+    `model_fn()` zwraca model (np. gcp_clients.model) - wołane przy każdym wywołaniu, więc podmiana
+    klienta w rejestrze (benchmark) działa bez odtwarzania bramki.
+    """
+
+    def __init__(self, model_fn, calls_per_minute=300, burst=None, max_concurrency=16, max_attempts=4,
+                 base_delay=1.0, max_delay=16.0, queue_timeout=120.0, metrics_registry=metrics):
+        self.model_fn = model_fn
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_timeout = queue_timeout
+        self.metrics = metrics_registry
+        self._bucket = TokenBucket.per_minute(calls_per_minute, capacity=burst or max_concurrency)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._inflight = {}  # klucz promptu -> Future wywołania, na które czekają kolejne identyczne prompty
+        self._waiting = 0
+        self._running = 0
+        self._stats = {"calls": 0, "coalesced": 0, "retries": 0, "failures": 0, "overloaded": 0,
+                       "peak_queue_depth": 0}
+
+    # --- Kolejka, limit tempa i równoległości ---
+
+    def _gauges(self):
+        self.metrics.set_gauge("llm.queue_depth", self._waiting)
+        self.metrics.set_gauge("llm.in_flight", self._running)
+
+    @contextmanager
+    def _slot(self):
+        t0 = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+            self._stats["peak_queue_depth"] = max(self._stats["peak_queue_depth"], self._waiting)
+            self._gauges()
+        acquired = False
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+            if acquired:
+                remaining = max(0.0, self.queue_timeout - (time.monotonic() - t0))
+                if self._bucket.acquire(timeout=remaining) is None:
+                    self._slots.release()
+                    acquired = False
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                if acquired:
+                    self._running += 1
+                else:
+                    self._stats["overloaded"] += 1
+                self._gauges()
+        self.metrics.record("llm.wait", time.monotonic() - t0, error=None if acquired else "LlmOverloadedError")
+        if not acquired:
+            raise LlmOverloadedError(f"Brak wolnego miejsca w kolejce modelu po {self.queue_timeout:g} s")
+        try:
+            yield
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._running -= 1
+                self._stats["calls"] += 1
+                self._gauges()
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        with self._lock:
+            self._stats["retries"] += 1
+        self.metrics.record("llm.retry", delay, error=type(error).__name__)
+        time.sleep(delay)
+
+    def _give_up(self, error, attempt):
+        if not is_retryable(error) or attempt >= self.max_attempts:
+            with self._lock:
+                self._stats["failures"] += 1
+            return True
+        return False
+
+    # --- Wywołania ---
+
+    def _call(self, prompt, generation_config):
+        for attempt in range(1, self.max_attempts + 1):
+            model = self.model_fn()
+            with self._slot():
+                try:
+                    return model.generate_content(prompt, generation_config=generation_config)
+                except Exception as e:
+                    if self._give_up(e, attempt):
+                        raise
+                    error = e
+            self._backoff(attempt, error)
+
+    def _stream(self, prompt, generation_config):
+        # Ponawiamy tylko do pierwszego fragmentu - po nim tekst jest już u użytkownika
+        for attempt in range(1, self.max_attempts + 1):
+            model = self.model_fn()
+            with self._slot():
+                try:
+                    responses = iter(model.generate_content(prompt, generation_config=generation_config, stream=True))
+                    first = next(responses, None)
+                except Exception as e:
+                    if self._give_up(e, attempt):
+                        raise
+                    error = e
+                else:
+                    if first is not None:
+                        yield first
+                    yield from responses
+                    return
+            self._backoff(attempt, error)
+
+    def generate(self, prompt, generation_config=None, stream=False):
+        """Odpowiednik `model.generate_content`; przy `stream=True` zwraca generator fragmentów."""
+        if stream:
+            return self._stream(prompt, generation_config)
+        key = _prompt_key(prompt, generation_config)
+        with self._lock:
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = Future()
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            return pending.result()
+        try:
+            response = self._call(prompt, generation_config)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(response)
+            return response
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"queue_depth": self._waiting, "in_flight": self._running,
+                          "coalescing_now": len(self._inflight)})
+        return stats
+
+
+# Bramka domyślna - jedna na proces, wspólna dla czatu, analizy CV i raportów HR
+_default = None
+_default_lock = threading.Lock()
+
+
+def gateway():
+    global _default
+    with _default_lock:
+        if _default is None:
+            import config
+            import gcp_clients
+            _default = LlmGateway(gcp_clients.model, calls_per_minute=config.LLM_CALLS_PER_MINUTE,
+                                  max_concurrency=config.LLM_MAX_CONCURRENCY)
+        return _default
+
+
+def generate(prompt, generation_config=None, stream=False):
+    return gateway().generate(prompt, generation_config, stream=stream)
+
+
+def stats():
+    return gateway().stats()
@@ -0,0 +1,197 @@
+# metrics.py
+# Lekka instrumentacja etapów aplikacji: czas wykonania, tokeny promptu/odpowiedzi i klasy błędów.
+# Pomiary trafiają do histogramów w pamięci procesu (ostatnie STAGE_SAMPLES próbek na etap),
+# a wątek w tle co jakiś czas dopisuje podsumowanie do pliku JSONL.
+#
+#   with metrics.timed("gemini.chat") as span:
+#       response = model.generate_content(prompt)
+#       span.usage(response_usage(response))
+#
+# Nazwy etapów: "<usługa>.<operacja>", np. pdf.parse, gcs.upload, search.discovery, gemini.report,
+# bigquery.query. Wskaźniki chwilowe (np. głębokość kolejki llm_gateway) zapisuje set_gauge.
+# Moduł nie importuje Streamlit ani SDK Google.
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+STAGE_SAMPLES = 2000
+DEFAULT_EXPORT_PATH = ".metrics/metrics.jsonl"
+
+
+class Span:
+    """Pomiar jednego wywołania - pozwala dopisać tokeny albo oznaczyć błąd obsłużony w środku."""
+
+    def __init__(self):
+        self.prompt_tokens = None
+        self.output_tokens = None
+        self.error = None
+
+    def usage(self, usage):
+        """Tokeny w formacie streaming.response_usage: {"prompt_tokens", "output_tokens"}."""
+        usage = usage or {}
+        self.prompt_tokens = usage.get("prompt_tokens", self.prompt_tokens)
+        self.output_tokens = usage.get("output_tokens", self.output_tokens)
+
+
+class _Stage:
+    def __init__(self, max_samples):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.errors = Counter()
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+class Metrics:
+    def __init__(self, max_samples=STAGE_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._gauges = {}
+        self._recorded = 0
+        self._exported = 0
+        self._export_thread = None
+        self._export_path = None
+
+    def record(self, stage, seconds, error=None, prompt_tokens=None, output_tokens=None):
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = _Stage(self.max_samples)
+            s.samples.append(seconds)
+            s.count += 1
+            if error:
+                s.errors[error] += 1
+            s.prompt_tokens += prompt_tokens or 0
+            s.output_tokens += output_tokens or 0
+            self._recorded += 1
+
+    @contextmanager
+    def timed(self, stage):
+        """Mierzy blok kodu; wyjątek jest zapisywany jako klasa błędu i rzucany dalej."""
+        span = Span()
+        t0 = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - t0, span.error, span.prompt_tokens, span.output_tokens)
+
+    def wrap(self, stage, fn, usage_fn=None):
+        """Funkcja `fn` mierzona jako `stage`; `usage_fn(wynik)` może zwrócić zużycie tokenów."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.timed(stage) as span:
+                result = fn(*args, **kwargs)
+                if usage_fn is not None:
+                    span.usage(usage_fn(result))
+                return result
+        return wrapper
+
+    def set_gauge(self, name, value):
+        """Ostatnia wartość wskaźnika chwilowego (np. liczba wywołań czekających w kolejce)."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def gauges(self):
+        with self._lock:
+            return dict(sorted(self._gauges.items()))
+
+    def time_to_first(self, stage, iterable):
+        """Przepuszcza strumień, zapisując czas do pierwszego elementu (np. pierwszego tokena odpowiedzi)."""
+        t0 = time.perf_counter()
+        first = True
+        for item in iterable:
+            if first:
+                self.record(stage, time.perf_counter() - t0)
+                first = False
+            yield item
+
+    def summary(self):
+        """Wiersz na etap: liczba wywołań, błędy, p50/p95/p99 (ms) i suma tokenów."""
+        with self._lock:
+            stages = {name: (sorted(s.samples), s.count, dict(s.errors), s.prompt_tokens, s.output_tokens)
+                      for name, s in self._stages.items()}
+        rows = []
+        for name in sorted(stages):
+            samples, count, errors, prompt_tokens, output_tokens = stages[name]
+
+            def ms(p):
+                value = _percentile(samples, p)
+                return None if value is None else round(value * 1000, 1)
+
+            rows.append({
+                "etap": name, "wywolania": count, "bledy": sum(errors.values()), "klasy_bledow": ", ".join(f"{k}: {v}" for k, v in sorted(errors.items())),
+                "p50_ms": ms(0.5), "p95_ms": ms(0.95), "p99_ms": ms(0.99), "max_ms": ms(1.0),
+                "tokeny_prompt": prompt_tokens, "tokeny_odpowiedz": output_tokens,
+            })
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    # --- Eksport ---
+
+    def export(self, path=None):
+        """Dopisuje podsumowanie do pliku JSONL (tylko gdy od ostatniego eksportu były nowe pomiary)."""
+        path = path or self._export_path or DEFAULT_EXPORT_PATH
+        with self._lock:
+            if self._recorded == self._exported:
+                return False
+            self._exported = self._recorded
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"ts": time.time(), "pid": os.getpid(), "stages": self.summary(),
+                                 "gauges": self.gauges()}, ensure_ascii=False) + "\n")
+        return True
+
+    def start_export(self, path=DEFAULT_EXPORT_PATH, interval=60.0):
+        """Uruchamia (raz na proces) wątek okresowego eksportu; ostatni eksport przy zamknięciu procesu."""
+        with self._lock:
+            if self._export_thread is not None:
+                return
+            self._export_path = path
+            self._export_thread = threading.Thread(target=self._export_loop, args=(interval,),
+                                                   name="metrics-export", daemon=True)
+        self._export_thread.start()
+        atexit.register(self._safe_export)
+
+    def _safe_export(self):
+        try:
+            self.export()
+        except OSError:
+            pass  # eksport nie może przerwać pracy aplikacji
+
+    def _export_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self._safe_export()
+
+
+# Rejestr domyślny - wspólny dla wszystkich modułów procesu
+_default = Metrics()
+record = _default.record
+timed = _default.timed
+wrap = _default.wrap
+set_gauge = _default.set_gauge
+gauges = _default.gauges
+time_to_first = _default.time_to_first
+summary = _default.summary
+reset = _default.reset
+export = _default.export
+start_export = _default.start_export
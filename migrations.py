@@ -0,0 +1,166 @@
+# migrations.py
+# Migracja tabeli zdarzeń `Kandydaci` do układu partycjonowanego i klastrowanego
+# oraz utrzymanie tabeli `Kandydaci_stan` (najnowszy stan każdego kandydata).
+#
+#   python migrations.py partition      # Kandydaci -> PARTITION BY DATE(data_aplikacji)
+#                                       #              CLUSTER BY id_kandydata, event_type
+#   python migrations.py state          # tworzy Kandydaci_stan i wypełnia ją w całości
+#   python migrations.py refresh-state  # przyrostowy MERGE nowych zdarzeń - uruchamiany co kilka minut
+#                                       # z harmonogramu (cron, Cloud Scheduler), nie przez panele HR
+#   python migrations.py cv-columns     # typowane kolumny analizy CV (potem BIGQUERY_CV_COLUMNS=1)
+#   python migrations.py postings       # tabela Ogloszenia + Kandydaci.id_ogloszenia
+#                                       # (potem BIGQUERY_POSTINGS_TABLE_ID=Ogloszenia)
+#   python migrations.py cv-embeddings  # Kandydaci.embedding_cv dla rankingu (potem BIGQUERY_CV_EMBEDDINGS=1)
+#   python migrations.py scores         # wynik oceny masowej: dopasowanie_procent, rekomendacja
+#                                       # (potem BIGQUERY_SCORE_COLUMNS=1)
+#
+# Migracja tworzy kopię `Kandydaci_v2`, a następnie podmienia nazwy; oryginał zostaje jako kopia zapasowa.
+# Przed kopiowaniem sprawdzamy, czy każda data_aplikacji daje się zamienić na TIMESTAMP - wiersze, którym
+# SAFE_CAST dałby NULL, są wypisywane, a migracja przerywana (nie znikają po cichu z partycji).
+# Zmiana nazwy nie jest możliwa, dopóki tabela ma aktywny bufor strumieniowy - przed migracją
+# należy wstrzymać zapisy (kolejka event_queue zatrzyma wiersze w lokalnym spoolu) i odczekać do ~90 min.
+# `state` i `refresh-state` wymagają wcześniejszego `partition`: MERGE porównuje data_aplikacji z parametrem
+# TIMESTAMP (@since) i liczy na przycinanie partycji PARTITION BY DATE(data_aplikacji) - na tabeli sprzed
+# migracji (data_aplikacji jako tekst) zapytanie się nie wykona.
+# Po utworzeniu tabeli stanu ustaw BIGQUERY_STATE_TABLE_ID=Kandydaci_stan, aby listy kandydatów z niej czytały.
+
+import argparse
+from datetime import datetime
+
+from google.cloud import bigquery
+
+import config
+import queries
+from cv_analysis import BIGQUERY_COLUMNS
+
+DEFAULT_PROJECT = config.GCP_PROJECT_ID
+DEFAULT_DATASET = config.BIGQUERY_DATASET_ID
+DEFAULT_TABLE = config.BIGQUERY_TABLE_ID
+STATE_SUFFIX = queries.STATE_SUFFIX
+
+
+def partition_statements(project, dataset, table):
+    suffix = datetime.now().strftime("%Y%m%d")
+    return [
+        f"""
+        CREATE TABLE `{project}.{dataset}.{table}_v2`
+        PARTITION BY DATE(data_aplikacji)
+        CLUSTER BY id_kandydata, event_type
+        AS
+        SELECT * REPLACE (SAFE_CAST(data_aplikacji AS TIMESTAMP) AS data_aplikacji)
+        FROM `{project}.{dataset}.{table}`
+        """,
+        f"ALTER TABLE `{project}.{dataset}.{table}` RENAME TO `{table}_backup_{suffix}`",
+        f"ALTER TABLE `{project}.{dataset}.{table}_v2` RENAME TO `{table}`",
+    ]
+
+
+def invalid_dates_query(project, dataset, table):
+    """Wartości data_aplikacji, których nie da się zamienić na TIMESTAMP (z liczbą wierszy)."""
+    return f"""
+    SELECT CAST(data_aplikacji AS STRING) AS data_aplikacji, COUNT(*) AS wiersze
+    FROM `{project}.{dataset}.{table}`
+    WHERE data_aplikacji IS NOT NULL AND SAFE_CAST(data_aplikacji AS TIMESTAMP) IS NULL
+    GROUP BY 1
+    ORDER BY wiersze DESC
+    """
+
+
+def invalid_dates(client, project=DEFAULT_PROJECT, dataset=DEFAULT_DATASET, table=DEFAULT_TABLE):
+    return [(row.data_aplikacji, row.wiersze)
+            for row in client.query(invalid_dates_query(project, dataset, table)).result()]
+
+
+def cv_column_statements(project, dataset, table):
+    """Kolumny strukturalnej analizy CV (cv_analysis.py) - dodawane, jeśli ich jeszcze nie ma."""
+    columns = ",\n".join(f"ADD COLUMN IF NOT EXISTS {name} {type_}" for name, type_ in BIGQUERY_COLUMNS.values())
+    return [f"ALTER TABLE `{project}.{dataset}.{table}`\n{columns}"]
+
+
+def postings_statements(project, dataset, table, postings_table="Ogloszenia"):
+    """Tabela ogłoszeń (job_postings.py) i powiązanie zdarzeń kandydatów z ogłoszeniem."""
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS `{project}.{dataset}.{postings_table}` (
+            id_ogloszenia STRING NOT NULL,
+            tytul STRING,
+            tresc STRING,
+            wymagania ARRAY<STRING>,
+            streszczenie STRING,
+            kontekst_rag STRING,
+            embedding ARRAY<FLOAT64>,
+            aktywne BOOL,
+            utworzono TIMESTAMP,
+            zaktualizowano TIMESTAMP
+        )
+        CLUSTER BY id_ogloszenia
+        """,
+        f"ALTER TABLE `{project}.{dataset}.{table}` ADD COLUMN IF NOT EXISTS id_ogloszenia STRING",
+    ]
+
+
+def cv_embedding_statements(project, dataset, table):
+    """Embedding analizy CV zapisywany przy cv_uploaded - indeks rankingu odbudowuje się bez liczenia go ponownie."""
+    return [f"ALTER TABLE `{project}.{dataset}.{table}` ADD COLUMN IF NOT EXISTS embedding_cv ARRAY<FLOAT64>"]
+
+
+def score_column_statements(project, dataset, table):
+    """Wynik oceny masowej (batch_scoring.py) zapisywany w zdarzeniach `report_scored`."""
+    return [f"""
+        ALTER TABLE `{project}.{dataset}.{table}`
+        ADD COLUMN IF NOT EXISTS dopasowanie_procent INT64,
+        ADD COLUMN IF NOT EXISTS rekomendacja STRING
+        """]
+
+
+def state_statements(project, dataset, table, with_scores=False):
+    events = f"{project}.{dataset}.{table}"
+    return [
+        f"""
+        CREATE OR REPLACE TABLE `{events}{STATE_SUFFIX}`
+        PARTITION BY DATE(data_aplikacji)
+        CLUSTER BY id_kandydata, status_rekrutacji
+        AS
+        SELECT * FROM ({queries.state_source(events, with_scores=with_scores)})
+        WHERE data_aplikacji IS NOT NULL
+        """
+    ]
+
+
+def _run_all(client, statements):
+    for sql in statements:
+        print(sql.strip().splitlines()[0], "...")
+        client.query(sql).result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migracje tabeli zdarzeń kandydatów w BigQuery.")
+    parser.add_argument("command", choices=["partition", "state", "refresh-state", "cv-columns", "postings",
+                                            "cv-embeddings", "scores"])
+    parser.add_argument("--project", default=DEFAULT_PROJECT)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--table", default=DEFAULT_TABLE)
+    args = parser.parse_args()
+
+    bq = bigquery.Client(project=args.project)
+    if args.command == "partition":
+        invalid = invalid_dates(bq, args.project, args.dataset, args.table)
+        if invalid:
+            print(f"Wiersze z data_aplikacji, której nie da się zamienić na TIMESTAMP: {sum(n for _, n in invalid)}")
+            for value, n in invalid[:20]:
+                print(f"  {value!r}: {n}")
+            raise SystemExit("Migracja przerwana - popraw te wiersze (albo usuń je) i uruchom ją ponownie.")
+        _run_all(bq, partition_statements(args.project, args.dataset, args.table))
+    elif args.command == "state":
+        _run_all(bq, state_statements(args.project, args.dataset, args.table, config.BIGQUERY_SCORE_COLUMNS))
+    elif args.command == "cv-columns":
+        _run_all(bq, cv_column_statements(args.project, args.dataset, args.table))
+    elif args.command == "postings":
+        _run_all(bq, postings_statements(args.project, args.dataset, args.table))
+    elif args.command == "cv-embeddings":
+        _run_all(bq, cv_embedding_statements(args.project, args.dataset, args.table))
+    elif args.command == "scores":
+        _run_all(bq, score_column_statements(args.project, args.dataset, args.table))
+    else:
+        events = f"{args.project}.{args.dataset}.{args.table}"
+        print(f"Zaktualizowano wierszy stanu: {queries.refresh_state(bq, events, with_scores=config.BIGQUERY_SCORE_COLUMNS)}")
@@ -1,61 +1,36 @@
 # pages/hr_dashboard.py
 import streamlit as st
-from google.cloud import bigquery
-from google.api_core.exceptions import GoogleAPIError
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
 import os
-
-# --- KONFIGURACJA Z POPRAWKĄ ---
-GCP_PROJECT_ID = "ai-recruiter-prod"
-BIGQUERY_DATASET_ID = "rekrutacja_hr"
-BIGQUERY_TABLE_ID = "Kandydaci"
-# OSTATECZNA POPRAWKA: Ujednolicamy region z tym, który działa w głównym pliku
-GCP_GEMINI_LOCATION = "europe-central2"
-MODEL_NAME = "gemini-2.5-flash-lite"  # Używamy tego samego modelu, co w głównym pliku
-
-# --- Inicjalizacja usług ---
-try:
-    vertexai.init(project=GCP_PROJECT_ID, location=GCP_GEMINI_LOCATION)
-    bigquery_client = bigquery.Client(project=GCP_PROJECT_ID)
-    model = GenerativeModel(MODEL_NAME)
-except Exception as e:
-    st.error(f"Błąd inicjalizacji usług GCP: {e}")
+import time
+
+import gcp_clients
+import hr_panel
+import llm_gateway
+import metrics
+from candidate_list import STATUS_OPTIONS
+from config import STREAM_RESPONSES, table_ref
+import queries
+from report_cache import describe, report_key
+from Rekruter_AI import get_posting_registry
+from streaming import iter_response_text, response_usage
+
+# --- KONFIGURACJA ---
+# Projekt, region i model pochodzą z config.py - te same co w Rekruter_AI.py
+# Lista kandydatów, ranking, cache raportów i ocena masowa są wspólne z app.py - hr_panel.py
+TABLE_REF = table_ref()
+CANDIDATES_PAGE_SIZE = 100
+REPORT_GENERATION_CONFIG = {"max_output_tokens": 3000, "temperature": 0.3}
+
+# --- Usługi ---
+# Klienci ze wspólnego rejestru: tworzeni przy pierwszym użyciu i współdzieleni przez przebiegi skryptu
+config_error = gcp_clients.config_error()
+if config_error:
+    st.error(f"Błąd inicjalizacji usług GCP: {config_error}")
     st.stop()
 
-# --- ZMIENNE STANU SESJI ---
-if "active_job_description" not in st.session_state:
-    st.session_state.active_job_description = ""
-
-
 # --- FUNKCJE POMOCNICZE PANELU HR ---
-def evaluate_candidate_with_gemini(candidate_id: str, job_description: str):
-    st.info(f"Rozpoczynam zaawansowaną ocenę kandydata {candidate_id}...")
-    try:
-        query = f"""
-        SELECT 
-            t1.umiejetnosci_tech AS cv_analysis,
-            t2.transkrypcja_rozmowy_ai AS conversation_transcript
-        FROM `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}` AS t1
-        LEFT JOIN (
-            SELECT id_kandydata, transkrypcja_rozmowy_ai
-            FROM `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}`
-            WHERE id_kandydata = '{candidate_id}' AND event_type = 'transcript_saved'
-            ORDER BY data_aplikacji DESC LIMIT 1
-        ) AS t2 ON t1.id_kandydata = t2.id_kandydata
-        WHERE t1.id_kandydata = '{candidate_id}' AND t1.event_type = 'cv_uploaded'
-        """
-        query_job = bigquery_client.query(query)
-        candidate_data = next(query_job.result(), None)
-
-        if not candidate_data:
-            st.error("Nie znaleziono danych kandydata do oceny. Upewnij się, że kandydat zakończył rozmowę.")
-            return
-
-        cv_analysis = candidate_data.cv_analysis or "Brak analizy CV."
-        conversation_transcript = candidate_data.conversation_transcript or "Brak transkrypcji rozmowy."
-
-        evaluation_prompt = f"""
+def build_evaluation_prompt(job_description, cv_analysis, conversation_transcript):
+    return f"""
         Jesteś wysoce analitycznym rekruterem IT. Twoim zadaniem jest stworzenie szczegółowego raportu dopasowania kandydata do oferty pracy na podstawie trzech źródeł: analizy CV, transkrypcji rozmowy oraz treści ogłoszenia.
         Raport musi składać się z trzech odrębnych sekcji:
 
@@ -84,37 +59,55 @@ def evaluate_candidate_with_gemini(candidate_id: str, job_description: str):
         ---
         """
 
-        with st.spinner("AI generuje zaawansowany raport dopasowania..."):
-            # Używamy modelu zainicjalizowanego na początku pliku
-            response = model.generate_content(
-                evaluation_prompt,
-                generation_config={"max_output_tokens": 3000, "temperature": 0.3}
-            )
-            st.success("Raport dopasowania został wygenerowany!")
+
+def evaluate_candidate_with_gemini(candidate_id: str, job_description: str, stream: bool = STREAM_RESPONSES,
+                                   force: bool = False):
+    st.info(f"Rozpoczynam zaawansowaną ocenę kandydata {candidate_id}...")
+    try:
+        candidate_data = queries.report_inputs(gcp_clients.bigquery_client(), TABLE_REF, candidate_id)
+
+        if not candidate_data:
+            st.error("Nie znaleziono danych kandydata do oceny. Upewnij się, że kandydat zakończył rozmowę.")
+            return
+
+        cv_analysis = candidate_data["cv_analysis"] or "Brak analizy CV."
+        conversation_transcript = candidate_data["conversation_transcript"] or "Brak transkrypcji rozmowy."
+
+        # Raport dla niezmienionych danych (ogłoszenie, analiza CV, transkrypcja) serwujemy z cache
+        key = report_key(candidate_id, job_description, cv_analysis, conversation_transcript, "panel")
+        cached = None if force else hr_panel.get_report_cache().get(key)
+        if cached:
             st.markdown("### Wynik Dopasowania Kandydata do Ogłoszenia")
-            st.markdown(response.text)
+            st.markdown(cached["report"])
+            st.caption(describe(cached))
+            return
+
+        evaluation_prompt = build_evaluation_prompt(job_description, cv_analysis, conversation_transcript)
+
+        generation_config = REPORT_GENERATION_CONFIG
+        t0 = time.perf_counter()
+        with metrics.timed("gemini.report") as span:
+            if stream:
+                # Pierwsze tokeny raportu widać po chwili, zamiast czekać na całe 3000 tokenów
+                st.markdown("### Wynik Dopasowania Kandydata do Ogłoszenia")
+                responses = llm_gateway.generate(evaluation_prompt, generation_config, stream=True)
+                usage = {}
+                report = st.write_stream(iter_response_text(responses, usage))
+                st.success("Raport dopasowania został wygenerowany!")
+            else:
+                with st.spinner("AI generuje zaawansowany raport dopasowania..."):
+                    # Wspólna bramka modelu (limit quota, ponowienia) - ta sama co w Rekruter_AI.py
+                    response = llm_gateway.generate(evaluation_prompt, generation_config)
+                    report, usage = response.text, response_usage(response)
+                    st.success("Raport dopasowania został wygenerowany!")
+                    st.markdown("### Wynik Dopasowania Kandydata do Ogłoszenia")
+                    st.markdown(report)
+            span.usage(usage)
+        hr_panel.get_report_cache().put(key, report, time.perf_counter() - t0, usage)
     except Exception as e:
         st.error(f"Wystąpił błąd podczas generowania raportu: {e}")
 
 
-@st.cache_data(ttl=60)
-def get_candidates_from_bigquery():
-    """Pobiera listę kandydatów z BigQuery."""
-    query = f"""
-    SELECT id_kandydata, nazwa_pliku_cv, data_aplikacji, status_rekrutacji
-    FROM `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}` 
-    WHERE event_type = 'cv_uploaded' 
-    ORDER BY data_aplikacji DESC 
-    LIMIT 100
-    """
-    try:
-        query_job = bigquery_client.query(query)
-        return [dict(row) for row in query_job.result()]
-    except GoogleAPIError as e:
-        st.error(f"Błąd podczas pobierania danych z BigQuery: {e}")
-        return []
-
-
 # --- INTERFEJS PANELU REKRUTERA ---
 st.set_page_config(page_title="Panel Rekrutera", layout="wide")
 if os.path.exists("logo.png"):
@@ -124,29 +117,57 @@ st.title("📋 Panel Rekrutera")
 
 st.header("Aktywne Ogłoszenie o Pracę")
 st.markdown(
-    "Wklej tutaj ogłoszenie, na które prowadzona będzie rekrutacja. Wszyscy nowi kandydaci będą rozmawiali w kontekście tego ogłoszenia.")
+    "Wklej tutaj ogłoszenie, na które prowadzona będzie rekrutacja. Ogłoszenie jest zapisywane trwale - "
+    "kandydaci wybierają je przed przesłaniem CV, a rozmowy i raporty korzystają z jego streszczenia i wymagań.")
 
-active_job_desc_input = st.text_area(
-    "Treść ogłoszenia:",
-    value=st.session_state.get("active_job_description", ""),
-    height=250
-)
+registry = get_posting_registry()
+job_title_input = st.text_input("Stanowisko:")
+active_job_desc_input = st.text_area("Treść ogłoszenia:", height=250)
 
-if st.button("Ustaw jako Aktywne Ogłoszenie dla Kandydatów"):
-    st.session_state.active_job_description = active_job_desc_input
+if st.button("Zapisz jako Aktywne Ogłoszenie dla Kandydatów") and active_job_desc_input.strip():
+    with st.spinner("Przetwarzanie ogłoszenia (wymagania, streszczenie, kontekst RAG)..."):
+        saved_posting = registry.save(job_title_input.strip(), active_job_desc_input)
+    st.session_state.hr_posting_id = saved_posting.id_ogloszenia
     st.success("Ogłoszenie zostało zapisane i będzie używane podczas rozmów z nowymi kandydatami.")
 
+postings = registry.list()
+posting_ids = [p.id_ogloszenia for p in postings]
+current_posting_id = st.session_state.get("hr_posting_id")
+posting = st.selectbox(
+    "Ogłoszenie do oceny kandydatów:", postings, format_func=lambda p: p.label(),
+    index=posting_ids.index(current_posting_id) if current_posting_id in posting_ids else 0
+) if postings else None
+if posting:
+    st.session_state.hr_posting_id = posting.id_ogloszenia
+    with st.expander("Wymagania i streszczenie ogłoszenia"):
+        st.markdown(posting.prompt_text())
+active_job_description = posting.prompt_text() if posting else ""
+
 st.divider()
 
 st.header("Lista Kandydatów")
+if "candidates_limit" not in st.session_state:
+    st.session_state.candidates_limit = CANDIDATES_PAGE_SIZE
+
+status_filter = st.selectbox("Filtruj po statusie:", ["Wszystkie"] + STATUS_OPTIONS)
+ranked = st.checkbox("Sortuj wg dopasowania do ogłoszenia (embeddingi)", value=True,
+                     disabled=not (posting and posting.embedding))
 if st.button("Odśwież listę"):
-    st.cache_data.clear()
+    # Tylko nowe zdarzenia od ostatniego odświeżenia - bez czyszczenia cache wszystkich sesji
+    hr_panel.refresh_candidates()
     st.rerun()
 
-candidates_data = get_candidates_from_bigquery()
+candidates_data = hr_panel.get_candidates(
+    status=None if status_filter == "Wszystkie" else status_filter,
+    limit=st.session_state.candidates_limit,
+    posting=posting if ranked else None
+)
 
 if candidates_data:
     st.dataframe(candidates_data, use_container_width=True)
+    if len(candidates_data) >= st.session_state.candidates_limit and st.button("Pokaż kolejnych kandydatów"):
+        st.session_state.candidates_limit += CANDIDATES_PAGE_SIZE
+        st.rerun()
 
     st.header("Wygeneruj Raport Dopasowania (po rozmowie)")
 
@@ -155,11 +176,16 @@ if candidates_data:
         [""] + [c["id_kandydata"] for c in candidates_data]
     )
 
+    force_report = st.checkbox("Wymuś ponowne wygenerowanie raportu (pomiń cache)")
+
     if st.button("Generuj Raport"):
-        active_job_description = st.session_state.get("active_job_description", "")
         if selected_candidate_id_report and active_job_description:
-            evaluate_candidate_with_gemini(selected_candidate_id_report, active_job_description)
+            evaluate_candidate_with_gemini(selected_candidate_id_report, active_job_description, force=force_report)
         else:
             st.warning("Proszę wybrać kandydata i upewnić się, że aktywne ogłoszenie o pracę jest ustawione powyżej.")
+
+    st.header("Ocena Masowa Kandydatów")
+    hr_panel.batch_scoring_section(candidates_data, active_job_description, build_evaluation_prompt, "panel-batch",
+                                   REPORT_GENERATION_CONFIG)
 else:
-    st.info("Brak kandydatów w bazie danych. Poczekaj, aż kandydaci załadują swoje CV na stronie głównej.")
+    st.info("Brak kandydatów w bazie danych. Poczekaj, aż kandydaci załadują swoje CV na stronie głównej.")
\ No newline at end of file
@@ -0,0 +1,283 @@
+# pdf_extract.py
+# Równoległa, ograniczona ekstrakcja tekstu z PDF (CV).
+# Strony dzielone są na zakresy i przetwarzane w puli procesów; dokument ma limit rozmiaru,
+# liczby stron i czasu. Procesy są wypożyczane dokumentowi na wyłączność, więc przekroczenie czasu
+# kończy tylko procesy tego dokumentu. Wynik zawiera też czasy ekstrakcji poszczególnych stron.
+# Domyślnie korzystamy ze wspólnej puli procesu (POOL_WORKERS); wsadowe przyjęcie CV i pomiar
+# tworzą własną pulę `WorkerPool(n)` i przekazują ją do extract_pdf_text.
+#
+# Pomiar przepustowości na katalogu przykładowych PDF:
+#   python pdf_extract.py ./probki_cv --workers 4
+
+import io
+import multiprocessing
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from PyPDF2 import PdfReader
+
+MAX_PDF_BYTES = 10 * 1024 * 1024
+MAX_PDF_PAGES = 30
+EXTRACTION_TIMEOUT_SECONDS = 20.0
+INLINE_PAGE_LIMIT = 3  # Tyle stron czyta jeden proces razem z liczbą stron - krótkie CV nie są dzielone
+POOL_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+
+class PdfExtractionError(Exception):
+    """Nie udało się odczytać PDF (uszkodzony plik, za duży, przekroczony czas)."""
+
+
+@dataclass
+class PdfExtraction:
+    text: str
+    page_count: int
+    pages_extracted: int
+    truncated: bool
+    empty_pages: list = field(default_factory=list)
+    page_timings: list = field(default_factory=list)  # sekundy na stronę, w kolejności stron
+    elapsed: float = 0.0
+
+
+def _extract_range(data, start, end):
+    """Funkcja robocza (w procesie potomnym): tekst i czas dla stron [start, end)."""
+    reader = PdfReader(io.BytesIO(data))
+    out = []
+    for i in range(start, end):
+        t0 = time.perf_counter()
+        try:
+            text = reader.pages[i].extract_text()
+        except Exception:
+            text = None
+        out.append((text, time.perf_counter() - t0))
+    return out
+
+
+def _extract_head(data, pages):
+    """Funkcja robocza: liczba stron dokumentu i tekst jego pierwszych `pages` stron."""
+    page_count = len(PdfReader(io.BytesIO(data)).pages)
+    return page_count, _extract_range(data, 0, min(page_count, pages))
+
+
+def _worker_main(conn):
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        fn, args = task
+        try:
+            conn.send(("ok", fn(*args)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    """Proces roboczy na wyłączność jednego dokumentu - po przekroczeniu czasu zabijamy tylko jego."""
+
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), name="pdf-extract", daemon=True)
+        self.process.start()
+        child.close()
+        self.busy = False
+
+    def send(self, fn, *args):
+        self.busy = True
+        self.conn.send((fn, args))
+
+    def receive(self, deadline):
+        if not self.conn.poll(max(0.0, deadline - time.monotonic())):
+            raise TimeoutError
+        try:
+            status, value = self.conn.recv()
+        except EOFError:
+            raise RuntimeError("proces roboczy zakończył się nieoczekiwanie")
+        self.busy = False
+        if status == "error":
+            raise RuntimeError(value)
+        return value
+
+    def usable(self):
+        return not self.busy and self.process.is_alive()
+
+    def terminate(self):
+        self.process.terminate()
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1.0)
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Pula procesów wypożyczanych dokumentom na czas ekstrakcji. Proces, który nie oddał wyniku
+    (przekroczony czas, awaria), jest zabijany przy zwrocie - zadania innych dokumentów nie są przerywane.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._ctx = multiprocessing.get_context("spawn")  # fork wielowątkowego procesu Streamlit bywa niebezpieczny
+        self._idle = []
+        self._started = 0
+        self._cond = threading.Condition()
+
+    def checkout(self, count, deadline=None):
+        """
+        Od 1 do `count` procesów; czeka na zwolnienie najwyżej do `deadline`.
+        Bez `deadline` nie czeka - zwraca tyle procesów, ile jest od ręki (także żadnego).
+        """
+        with self._cond:
+            while deadline is not None and not self._idle and self._started >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                self._cond.wait(remaining)
+            workers = [self._idle.pop() for _ in range(min(count, len(self._idle)))]
+            new = min(count - len(workers), self.size - self._started)
+            self._started += new
+        try:
+            workers += [_Worker(self._ctx) for _ in range(new)]
+        except Exception:
+            self.checkin(workers)
+            with self._cond:
+                self._started -= new
+                self._cond.notify_all()
+            raise
+        return workers
+
+    def checkin(self, workers):
+        broken = [w for w in workers if not w.usable()]
+        with self._cond:
+            self._idle.extend(w for w in workers if w not in broken)
+            self._started -= len(broken)
+            self._cond.notify_all()
+        for w in broken:
+            w.terminate()
+
+    def warm_up(self):
+        self.checkin(self.checkout(self.size))
+
+    def shutdown(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+        for w in idle:
+            w.terminate()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(POOL_WORKERS)
+        return _pool
+
+
+def shutdown_pool():
+    """Kończy bezczynne procesy robocze wspólnej puli."""
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+
+
+def extract_pdf_text(data, max_pages=MAX_PDF_PAGES, max_bytes=MAX_PDF_BYTES, timeout=EXTRACTION_TIMEOUT_SECONDS,
+                     inline_pages=INLINE_PAGE_LIMIT, pool=None):
+    """
+    Wyciąga tekst z PDF podanego jako bytes. Rzuca PdfExtractionError.
+    Limit czasu obejmuje cały dokument: oczekiwanie na proces, odczyt liczby stron i wszystkie strony.
+    Pierwsze `inline_pages` stron czyta jeden proces; resztę dzielimy między wolne procesy puli `pool`
+    (domyślnie wspólnej). `inline_pages=max_pages` - cały dokument w jednym procesie.
+    """
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    if len(data) > max_bytes:
+        raise PdfExtractionError(f"Plik jest za duży ({len(data) // 1024} KB, limit {max_bytes // 1024} KB).")
+
+    pool = pool or _get_pool()
+    workers = []
+    stage = "Nie można odczytać PDF"
+    try:
+        # Liczba stron i pierwsze strony w jednym kroku - krótkie CV kończą się na nim
+        workers = pool.checkout(1, deadline)
+        workers[0].send(_extract_head, data, min(max_pages, inline_pages))
+        page_count, pages = workers[0].receive(deadline)
+        stage = "Błąd ekstrakcji PDF"
+        n = min(page_count, max_pages)
+        if n > len(pages):
+            first = len(pages)
+            workers += pool.checkout(min(pool.size, n - first) - 1)  # dodatkowe procesy tylko wolne
+            k = len(workers)
+            bounds = [(first + (n - first) * i // k, first + (n - first) * (i + 1) // k) for i in range(k)]
+            for worker, (a, b) in zip(workers, bounds):
+                worker.send(_extract_range, data, a, b)
+            pages += [page for worker in workers for page in worker.receive(deadline)]
+    except TimeoutError:
+        raise PdfExtractionError(f"Przekroczono limit czasu ekstrakcji PDF ({timeout:g} s).")
+    except Exception as e:
+        raise PdfExtractionError(f"{stage}: {e}")
+    finally:
+        pool.checkin(workers)
+
+    texts = [text or "" for text, _ in pages]
+    return PdfExtraction(
+        text="\f".join(texts),  # \f rozdziela strony (cv_analysis.normalize_cv_text szuka nagłówków na ich brzegach)
+        page_count=page_count,
+        pages_extracted=n,
+        truncated=page_count > n,
+        empty_pages=[i for i, t in enumerate(texts) if not t.strip()],
+        page_timings=[seconds for _, seconds in pages],
+        elapsed=time.perf_counter() - started,
+    )
+
+
+def _benchmark(directory, workers):
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(".pdf"))
+    if not files:
+        print(f"Brak plików PDF w {directory}")
+        return
+    pool = WorkerPool(workers)
+    pool.warm_up()  # start procesów poza pomiarem
+    docs = pages = failed = 0
+    page_times = []
+    t0 = time.perf_counter()
+    for path in files:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        try:
+            result = extract_pdf_text(data, pool=pool)
+        except PdfExtractionError as e:
+            failed += 1
+            print(f"  {os.path.basename(path)}: {e}")
+            continue
+        docs += 1
+        pages += result.pages_extracted
+        page_times.extend(result.page_timings)
+    total = time.perf_counter() - t0
+    pool.shutdown()
+    page_times.sort()
+
+    def pct(p):
+        return page_times[min(len(page_times) - 1, int(p * len(page_times)))] * 1000 if page_times else 0.0
+
+    print(f"Dokumenty: {docs} (błędy: {failed}), strony: {pages}, czas: {total:.2f} s")
+    print(f"Przepustowość: {docs / total:.2f} dok/s, {pages / total:.2f} stron/s")
+    print(f"Czas strony: p50={pct(0.5):.1f} ms, p95={pct(0.95):.1f} ms, max={pct(1.0):.1f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pomiar przepustowości ekstrakcji tekstu z PDF.")
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, default=POOL_WORKERS)
+    args = parser.parse_args()
+    _benchmark(args.directory, args.workers)
@@ -0,0 +1,271 @@
+# queries.py
+# Wszystkie odczyty z tabeli zdarzeń `Kandydaci` (i tabeli stanu `Kandydaci_stan`) w jednym miejscu.
+# Wartości przekazujemy jako parametry zapytań (ScalarQueryParameter/ArrayQueryParameter),
+# nigdy przez interpolację w f-stringach. Interpolowane są wyłącznie nazwy tabel z konfiguracji.
+# Filtry po `data_aplikacji` i `id_kandydata` pozwalają BigQuery przycinać partycje i klastry
+# tabeli utworzonej przez migrations.py.
+# Biblioteka BigQuery jest importowana dopiero przy pierwszym zapytaniu (szybszy start aplikacji).
+
+from datetime import datetime, timedelta, timezone
+
+import metrics
+
+STATE_SUFFIX = "_stan"
+STATE_REFRESH_OVERLAP = timedelta(minutes=30)  # zapas na zdarzenia zapisane z opóźnieniem
+STATE_LATE_WINDOW = timedelta(days=7)  # tyle wstecz szukamy kandydatów zapisanych później niż znak wodny
+
+
+def param(name, value):
+    """Parametr o typie zgodnym z wartością zwróconą przez BigQuery (TIMESTAMP/DATETIME/INT64/STRING)."""
+    from google.cloud import bigquery
+    if isinstance(value, datetime):
+        return bigquery.ScalarQueryParameter(name, "TIMESTAMP" if value.tzinfo else "DATETIME", value)
+    if isinstance(value, int):
+        return bigquery.ScalarQueryParameter(name, "INT64", value)
+    return bigquery.ScalarQueryParameter(name, "STRING", value)
+
+
+def run(client, query, params=()):
+    from google.cloud import bigquery
+    job_config = bigquery.QueryJobConfig(query_parameters=list(params))
+    with metrics.timed("bigquery.query"):
+        return [dict(row) for row in client.query(query, job_config=job_config).result()]
+
+
+# --- Raporty ---
+
+def report_inputs(client, table, candidate_id):
+    """Analiza CV i najnowsza transkrypcja jednego kandydata albo None."""
+    rows = report_inputs_many(client, table, [candidate_id])
+    return rows.get(candidate_id)
+
+
+def report_inputs_many(client, table, candidate_ids):
+    """{id_kandydata: {"cv_analysis", "conversation_transcript"}} - jednym zapytaniem dla wielu kandydatów."""
+    query = f"""
+    SELECT id_kandydata,
+           ARRAY_AGG(IF(event_type = 'cv_uploaded', umiejetnosci_tech, NULL) IGNORE NULLS
+                     ORDER BY data_aplikacji DESC LIMIT 1)[SAFE_OFFSET(0)] AS cv_analysis,
+           ARRAY_AGG(IF(event_type = 'transcript_saved', transkrypcja_rozmowy_ai, NULL) IGNORE NULLS
+                     ORDER BY data_aplikacji DESC LIMIT 1)[SAFE_OFFSET(0)] AS conversation_transcript
+    FROM `{table}`
+    WHERE id_kandydata IN UNNEST(@ids) AND event_type IN ('cv_uploaded', 'transcript_saved')
+    GROUP BY id_kandydata
+    HAVING COUNTIF(event_type = 'cv_uploaded') > 0
+    """
+    from google.cloud import bigquery
+    rows = run(client, query, [bigquery.ArrayQueryParameter("ids", "STRING", list(candidate_ids))])
+    return {row["id_kandydata"]: row for row in rows}
+
+
+# --- Lista kandydatów ---
+# Kolumny wyniku oceny masowej istnieją dopiero po `migrations.py scores` (config.BIGQUERY_SCORE_COLUMNS);
+# bez nich zapytania zwracają w ich miejscu NULL, a wiersze mają ten sam kształt.
+
+_NULL_SCORES = "CAST(NULL AS INT64) AS dopasowanie_procent, CAST(NULL AS STRING) AS rekomendacja"
+
+
+def _score_columns(with_scores):
+    """Kolumny dopasowanie_procent i rekomendacja - z tabeli albo jako typowane NULL-e."""
+    return "dopasowanie_procent, rekomendacja" if with_scores else _NULL_SCORES
+
+
+def _latest_scores(with_scores):
+    """Najnowszy wynik oceny z agregacji zdarzeń kandydata (GROUP BY id_kandydata)."""
+    if not with_scores:
+        return _NULL_SCORES
+    return """ARRAY_AGG(dopasowanie_procent IGNORE NULLS ORDER BY data_aplikacji DESC LIMIT 1)[SAFE_OFFSET(0)]
+                   AS dopasowanie_procent,
+               ARRAY_AGG(rekomendacja IGNORE NULLS ORDER BY data_aplikacji DESC LIMIT 1)[SAFE_OFFSET(0)]
+                   AS rekomendacja"""
+
+
+def _keyset_filters(status, cursor, status_col="status_rekrutacji", date_col="data_aplikacji", id_col="id_kandydata",
+                    ids=None):
+    from google.cloud import bigquery
+    where, params = [], []
+    if ids is not None:
+        where.append(f"{id_col} IN UNNEST(@ids)")
+        params.append(bigquery.ArrayQueryParameter("ids", "STRING", list(ids)))
+    if status:
+        where.append(f"{status_col} = @status")
+        params.append(bigquery.ScalarQueryParameter("status", "STRING", status))
+    if cursor:
+        where.append(f"({date_col} < @cursor_date OR ({date_col} = @cursor_date AND {id_col} < @cursor_id))")
+        params += [param("cursor_date", cursor[0]), bigquery.ScalarQueryParameter("cursor_id", "STRING", cursor[1])]
+    return where, params
+
+
+def candidate_page(client, table, limit, status=None, cursor=None, state_table=None, ids=None, with_scores=False,
+                   lookback_days=None):
+    """
+    Strona listy kandydatów od najnowszych, po kursorze (data_aplikacji, id_kandydata).
+    Z `state_table` czytamy gotowy stan kandydatów (kilka KB); bez niej liczymy go z tabeli zdarzeń -
+    każda strona agreguje wtedy zdarzenia kandydatów (GROUP BY id_kandydata). `lookback_days` ogranicza
+    ten odczyt do partycji z ostatnich dni (tabela po migracji partition); bez niego czytana jest cała tabela.
+    `ids` zawęża wynik do wskazanych kandydatów (np. krótkiej listy z rankingu embeddingów) - wtedy
+    agregacja czyta tylko ich bloki klastra, bez ograniczenia dni.
+    `with_scores` - czy tabela zdarzeń ma już kolumny wyniku oceny (migrations.py scores).
+    """
+    if state_table:
+        where, params = _keyset_filters(status, cursor, ids=ids)
+        query = f"""
+        SELECT id_kandydata, nazwa_pliku_cv, data_aplikacji, ostatnie_zdarzenie,
+               status_rekrutacji, dopasowanie_procent, rekomendacja
+        FROM `{state_table}`
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY data_aplikacji DESC, id_kandydata DESC
+        LIMIT @limit
+        """
+    else:
+        where, params = _keyset_filters(status, cursor, "l.status_rekrutacji", "c.data_aplikacji", "c.id_kandydata", ids)
+        latest_where = []
+        if ids is not None:
+            latest_where.append("id_kandydata IN UNNEST(@ids)")
+        elif lookback_days:
+            latest_where.append("data_aplikacji >= @since")
+            where.append("c.data_aplikacji >= @since")
+            params.append(param("since", datetime.now(timezone.utc) - timedelta(days=lookback_days)))
+        query = f"""
+        WITH latest AS (
+            SELECT id_kandydata,
+                   MAX(data_aplikacji) AS ostatnie_zdarzenie,
+                   ARRAY_AGG(status_rekrutacji IGNORE NULLS ORDER BY data_aplikacji DESC LIMIT 1)[SAFE_OFFSET(0)]
+                       AS status_rekrutacji,
+                   {_latest_scores(with_scores)}
+            FROM `{table}`
+            {"WHERE " + " AND ".join(latest_where) if latest_where else ""}
+            GROUP BY id_kandydata
+        )
+        SELECT c.id_kandydata, c.nazwa_pliku_cv, c.data_aplikacji, l.ostatnie_zdarzenie,
+               l.status_rekrutacji, l.dopasowanie_procent, l.rekomendacja
+        FROM `{table}` AS c
+        JOIN latest AS l USING (id_kandydata)
+        WHERE {" AND ".join(["c.event_type = 'cv_uploaded'"] + where)}
+        ORDER BY c.data_aplikacji DESC, c.id_kandydata DESC
+        LIMIT @limit
+        """
+    params.append(param("limit", limit))
+    return run(client, query, params)
+
+
+def events_since(client, table, since, with_scores=False):
+    """Zdarzenia nowsze niż znak wodny (po migracji czyta tylko najnowsze partycje)."""
+    query = f"""
+    SELECT id_kandydata, event_type, nazwa_pliku_cv, data_aplikacji,
+           status_rekrutacji, {_score_columns(with_scores)}
+    FROM `{table}`
+    WHERE data_aplikacji > @since
+    ORDER BY data_aplikacji
+    """
+    return run(client, query, [param("since", since)])
+
+
+def cv_embeddings(client, table, since=None, with_embeddings=False, with_postings=False):
+    """
+    Wiersze do odbudowy indeksu rankingu (candidate_ranking.py): analiza CV kandydatów i - po migracjach -
+    zapisany embedding oraz ogłoszenie. `since` ogranicza odczyt do nowszych partycji.
+    """
+    columns = ["id_kandydata", "data_aplikacji", "umiejetnosci_tech", "url_cv_gcs"]
+    columns += ["embedding_cv"] if with_embeddings else []
+    columns += ["id_ogloszenia"] if with_postings else []
+    query = f"""
+    SELECT {", ".join(columns)}
+    FROM `{table}`
+    WHERE event_type = 'cv_uploaded' {"AND data_aplikacji > @since" if since is not None else ""}
+    ORDER BY data_aplikacji
+    """
+    return run(client, query, [param("since", since)] if since is not None else [])
+
+
+# --- Tabela stanu ---
+# Odświeżana przez zadanie z harmonogramu (`python migrations.py refresh-state`), nie przez panele HR.
+
+def state_source(events_table, where="", with_scores=False):
+    """
+    Najnowszy stan kandydatów liczony ze zdarzeń (opcjonalnie tylko z nowych partycji).
+    Kolumny wyniku oceny są w tabeli stanu zawsze - bez `with_scores` wypełnione NULL-ami.
+    """
+    return f"""
+        SELECT id_kandydata,
+               MAX(IF(event_type = 'cv_uploaded', nazwa_pliku_cv, NULL)) AS nazwa_pliku_cv,
+               MAX(IF(event_type = 'cv_uploaded', url_cv_gcs, NULL)) AS url_cv_gcs,
+               MIN(IF(event_type = 'cv_uploaded', data_aplikacji, NULL)) AS data_aplikacji,
+               MAX(data_aplikacji) AS ostatnie_zdarzenie,
+               ARRAY_AGG(status_rekrutacji IGNORE NULLS ORDER BY data_aplikacji DESC LIMIT 1)[SAFE_OFFSET(0)]
+                   AS status_rekrutacji,
+               {_latest_scores(with_scores)},
+               ARRAY_AGG(IF(event_type = 'cv_uploaded', umiejetnosci_tech, NULL) IGNORE NULLS
+                         ORDER BY data_aplikacji DESC LIMIT 1)[SAFE_OFFSET(0)] AS umiejetnosci_tech,
+               ARRAY_AGG(IF(event_type = 'transcript_saved', transkrypcja_rozmowy_ai, NULL) IGNORE NULLS
+                         ORDER BY data_aplikacji DESC LIMIT 1)[SAFE_OFFSET(0)] AS transkrypcja_rozmowy_ai
+        FROM `{events_table}`
+        {where}
+        GROUP BY id_kandydata
+    """
+
+
+def refresh_state_statement(table, state_table=None, with_scores=False):
+    """
+    MERGE zdarzeń nowszych niż @since do tabeli stanu (parametry @since i @late_since: TIMESTAMP).
+    Znak wodny to data zdarzenia, a nie czas zapisu - CV wysłane z kolejki po awarii ma datę starszą niż
+    @since. Dlatego dokładamy też kandydatów z `cv_uploaded` od @late_since, których nie ma w tabeli stanu.
+    """
+    state_table = state_table or table + STATE_SUFFIX
+    where = f"""WHERE data_aplikacji > @since
+           OR (data_aplikacji > @late_since AND id_kandydata IN (
+               SELECT id_kandydata FROM `{table}`
+               WHERE event_type = 'cv_uploaded' AND data_aplikacji > @late_since
+               EXCEPT DISTINCT
+               SELECT id_kandydata FROM `{state_table}`))"""
+    return f"""
+    MERGE `{state_table}` AS t
+    USING ({state_source(table, where, with_scores)}) AS s
+    ON t.id_kandydata = s.id_kandydata
+    WHEN MATCHED THEN UPDATE SET
+        nazwa_pliku_cv = COALESCE(t.nazwa_pliku_cv, s.nazwa_pliku_cv),
+        url_cv_gcs = COALESCE(t.url_cv_gcs, s.url_cv_gcs),
+        ostatnie_zdarzenie = GREATEST(t.ostatnie_zdarzenie, s.ostatnie_zdarzenie),
+        status_rekrutacji = IF(s.ostatnie_zdarzenie >= t.ostatnie_zdarzenie,
+                               COALESCE(s.status_rekrutacji, t.status_rekrutacji), t.status_rekrutacji),
+        dopasowanie_procent = COALESCE(s.dopasowanie_procent, t.dopasowanie_procent),
+        rekomendacja = COALESCE(s.rekomendacja, t.rekomendacja),
+        umiejetnosci_tech = COALESCE(s.umiejetnosci_tech, t.umiejetnosci_tech),
+        transkrypcja_rozmowy_ai = COALESCE(s.transkrypcja_rozmowy_ai, t.transkrypcja_rozmowy_ai)
+    WHEN NOT MATCHED AND s.data_aplikacji IS NOT NULL THEN
+        INSERT ROW
+    """
+
+
+def refresh_state(client, table, state_table=None, with_scores=False):
+    """
+    Przyrostowe odświeżenie tabeli stanu: tylko partycje z nowymi zdarzeniami (i brakujący kandydaci
+    z ostatnich STATE_LATE_WINDOW). Zwraca liczbę wierszy.
+    """
+    from google.cloud import bigquery
+    state_table = state_table or table + STATE_SUFFIX
+    watermark = run(client, f"SELECT MAX(ostatnie_zdarzenie) AS wm FROM `{state_table}`")[0]["wm"]
+    since = (watermark or datetime(1970, 1, 1, tzinfo=timezone.utc)) - STATE_REFRESH_OVERLAP
+    late_since = min(since, datetime.now(timezone.utc) - STATE_LATE_WINDOW)
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("since", "TIMESTAMP", since),
+        bigquery.ScalarQueryParameter("late_since", "TIMESTAMP", late_since),
+    ])
+    with metrics.timed("bigquery.refresh_state"):
+        job = client.query(refresh_state_statement(table, state_table, with_scores), job_config=job_config)
+        job.result()
+    return job.num_dml_affected_rows
+
+
+# --- Ogłoszenia ---
+
+def latest_postings(client, table):
+    """Najnowsza wersja każdego ogłoszenia z tabeli `Ogloszenia` (zapis przez dopisywanie wierszy)."""
+    query = f"""
+    SELECT * EXCEPT (rn) FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY id_ogloszenia ORDER BY zaktualizowano DESC) AS rn
+        FROM `{table}`
+    )
+    WHERE rn = 1
+    """
+    return run(client, query)
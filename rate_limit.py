@@ -0,0 +1,39 @@
+# rate_limit.py
+# Limiter "token bucket" współdzielony przez wątki - ogranicza tempo wywołań modelu do limitu quota.
+
+import threading
+import time
+
+
+class TokenBucket:
+    """`rate` - żetony na sekundę, `capacity` - maksymalny "zapas" (wielkość chwilowego burstu)."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, calls_per_minute, capacity=None):
+        return cls(calls_per_minute / 60.0, capacity)
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1.0, timeout=None):
+        """Blokuje do czasu pobrania żetonów. Zwraca czas oczekiwania [s] albo None po przekroczeniu `timeout`."""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return now - started
+                wait = (tokens - self._tokens) / self.rate
+            if timeout is not None and now + wait - started > timeout:
+                return None
+            time.sleep(wait)
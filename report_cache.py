@@ -0,0 +1,102 @@
+# report_cache.py
+# Trwały cache raportów dopasowania (SQLite - działa bez żadnej usługi chmurowej).
+# Klucz: kandydat + skrót ogłoszenia + skrót danych wejściowych (analiza CV i transkrypcja)
+# + wariant promptu. Raport jest generowany ponownie tylko, gdy zmieni się któreś wejście
+# albo regeneracja zostanie wymuszona. Każdy wpis zapisuje czas generowania i zużycie tokenów
+# oraz znacznik `written` - czy wynik oceny masowej z tego raportu trafił już do BigQuery.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = ".cache/reports.sqlite"
+
+
+def _sha(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def report_key(candidate_id, job_desc, cv_analysis, transcript, variant="default"):
+    """Krotka klucza cache: (id_kandydata, skrót ogłoszenia, skrót wejść, wariant)."""
+    return candidate_id, _sha(job_desc), _sha(cv_analysis, transcript), variant
+
+
+class ReportCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            " id_kandydata TEXT NOT NULL,"
+            " job_hash TEXT NOT NULL,"
+            " inputs_hash TEXT NOT NULL,"
+            " variant TEXT NOT NULL,"
+            " report TEXT NOT NULL,"
+            " latency_s REAL,"
+            " prompt_tokens INTEGER,"
+            " output_tokens INTEGER,"
+            " created_at REAL NOT NULL,"
+            " written INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (id_kandydata, job_hash, inputs_hash, variant))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(reports)")}
+        if "written" not in columns:  # plik cache sprzed znacznika zapisu
+            self._conn.execute("ALTER TABLE reports ADD COLUMN written INTEGER NOT NULL DEFAULT 0")
+        self._conn.commit()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        """Zwraca słownik z raportem i metadanymi albo None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT report, latency_s, prompt_tokens, output_tokens, created_at, written FROM reports "
+                "WHERE id_kandydata = ? AND job_hash = ? AND inputs_hash = ? AND variant = ?", key
+            ).fetchone()
+            self._stats["hits" if row else "misses"] += 1
+        if row is None:
+            return None
+        report, latency_s, prompt_tokens, output_tokens, created_at, written = row
+        return {"report": report, "latency_s": latency_s, "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens, "created_at": created_at, "written": bool(written)}
+
+    def put(self, key, report, latency_s=None, usage=None):
+        usage = usage or {}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (*key, report, latency_s, usage.get("prompt_tokens"), usage.get("output_tokens"), time.time()),
+            )
+            self._conn.commit()
+
+    def mark_written(self, key):
+        """Oznacza, że wynik z raportu jest zapisany w BigQuery - ocena masowa nie zapisze go ponownie."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reports SET written = 1 "
+                "WHERE id_kandydata = ? AND job_hash = ? AND inputs_hash = ? AND variant = ?", key
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"], stats["avg_tokens_per_report"] = self._conn.execute(
+                "SELECT COUNT(*), AVG(COALESCE(prompt_tokens, 0) + COALESCE(output_tokens, 0)) FROM reports"
+            ).fetchone()
+        return stats
+
+
+def describe(entry):
+    """Krótki opis wpisu z cache do wyświetlenia pod raportem."""
+    created = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created_at"]))
+    tokens = (entry.get("prompt_tokens") or 0) + (entry.get("output_tokens") or 0)
+    latency = entry.get("latency_s") or 0.0
+    return f"Raport z cache (wygenerowany {created}, {latency:.1f} s, {tokens} tokenów)."
@@ -0,0 +1,140 @@
+# retrieval.py
+# Warstwa wyszukiwania w bazie wiedzy (RAG): równoległe zapytania + cache TTL/LRU.
+# Sam backend wyszukiwania (np. Discovery Engine) przekazywany jest jako funkcja `search_fn(query) -> str`.
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_CONTEXT_QUERY_CHARS = 50  # Tyle znaków ogłoszenia trafia do zapytania o kontekst stanowiska
+
+
+def normalize_query(query):
+    """Klucz cache: małe litery, zwinięte białe znaki."""
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+class TTLCache:
+    """Prosty, bezpieczny wątkowo cache LRU z czasem życia wpisów."""
+
+    def __init__(self, maxsize=256, ttl_seconds=600):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Zwraca (znaleziono, wartość)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class KnowledgeBaseRetriever:
+    """
+    Wyszukiwanie w bazie wiedzy z cache wyników i pulą wątków.
+    Błąd backendu daje pusty kontekst i nie jest zapisywany w cache.
+    """
+
+    def __init__(self, search_fn, max_workers=4, cache_size=256, ttl_seconds=600):
+        self.search_fn = search_fn
+        self._cache = TTLCache(cache_size, ttl_seconds)
+        self._job_contexts = TTLCache(cache_size, ttl_seconds)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag")
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "errors": 0, "job_context_hits": 0, "job_context_misses": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _fetch(self, key, query):
+        try:
+            result = self.search_fn(query)
+        except Exception:
+            self._count("errors")
+            return ""
+        self._cache.put(key, result)
+        return result
+
+    def search(self, query):
+        return self.search_many([query])[0]
+
+    def search_many(self, queries):
+        """Wykonuje zapytania równolegle; wyniki z cache nie angażują puli."""
+        results = [None] * len(queries)
+        pending = {}
+        for i, query in enumerate(queries):
+            key = normalize_query(query)
+            found, value = self._cache.get(key)
+            if found:
+                self._count("hits")
+                results[i] = value
+            else:
+                self._count("misses")
+                pending[i] = self._pool.submit(self._fetch, key, query)
+        for i, future in pending.items():
+            results[i] = future.result()
+        return results
+
+    def _job_key(self, job_desc):
+        return hashlib.sha256(job_desc.encode("utf-8")).hexdigest()
+
+    def job_context(self, job_desc):
+        """Kontekst RAG dla ogłoszenia - liczony raz na ogłoszenie, nie raz na turę."""
+        return self.context_for_turn(None, job_desc)
+
+    def context_for_turn(self, user_msg, job_desc):
+        """
+        Kontekst jednej tury rozmowy: wiadomość kandydata + kontekst stanowiska.
+        Jeśli kontekstu ogłoszenia nie ma jeszcze w cache, oba zapytania idą równolegle.
+        """
+        queries = [user_msg] if user_msg else []
+        job_key = job_context = None
+        if job_desc:
+            job_key = self._job_key(job_desc)
+            found, job_context = self._job_contexts.get(job_key)
+            self._count("job_context_hits" if found else "job_context_misses")
+            if not found:
+                queries.append(job_desc[:JOB_CONTEXT_QUERY_CHARS])
+
+        results = self.search_many(queries)
+        if job_key and job_context is None:
+            job_context = results.pop()
+            if job_context:  # pusty wynik (np. błąd backendu) nie blokuje kolejnej próby
+                self._job_contexts.put(job_key, job_context)
+
+        parts = results + ([job_context] if job_desc else [])
+        return "\n".join(parts)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["cached_queries"] = len(self._cache)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,61 @@
+# streaming.py
+# Pomocnicze funkcje do strumieniowania odpowiedzi Gemini do interfejsu Streamlit.
+# Moduł nie importuje SDK Google - operuje wyłącznie na obiektach odpowiedzi.
+
+END_MARKER = "[KONIEC ROZMOWY]"
+
+
+def response_usage(response):
+    """Zużycie tokenów z odpowiedzi Gemini: {"prompt_tokens", "output_tokens"} (puste, gdy brak metadanych)."""
+    meta = getattr(response, "usage_metadata", None)
+    if not meta:
+        return {}
+    return {"prompt_tokens": getattr(meta, "prompt_token_count", None),
+            "output_tokens": getattr(meta, "candidates_token_count", None)}
+
+
+def iter_response_text(responses, usage=None):
+    """
+    Zwraca kolejne fragmenty tekstu ze strumienia odpowiedzi `generate_content(..., stream=True)`.
+    Jeśli podano słownik `usage`, trafia do niego zużycie tokenów z ostatniego fragmentu z metadanymi.
+    """
+    for chunk in responses:
+        if usage is not None:
+            usage.update(response_usage(chunk) or {})
+        try:
+            text = chunk.text
+        except (ValueError, AttributeError):
+            # Fragmenty bez tekstu (np. końcowy z metadanymi lub zablokowany) pomijamy
+            continue
+        if text:
+            yield text
+
+
+def _partial_marker_len(buf, marker):
+    """Długość najdłuższego sufiksu `buf`, który jest początkiem znacznika."""
+    for size in range(min(len(buf), len(marker) - 1), 0, -1):
+        if marker.startswith(buf[-size:]):
+            return size
+    return 0
+
+
+def strip_marker(chunks, state, marker=END_MARKER):
+    """
+    Przepuszcza fragmenty tekstu, wycinając znacznik końca rozmowy - także wtedy,
+    gdy model rozdzieli go między kilka fragmentów. Po znalezieniu znacznika
+    ustawia `state["marker_found"] = True`.
+    """
+    state.setdefault("marker_found", False)
+    buf = ""
+    for chunk in chunks:
+        buf += chunk
+        if marker in buf:
+            state["marker_found"] = True
+            buf = buf.replace(marker, "")
+        # Wstrzymujemy tylko ogon, który może okazać się początkiem znacznika
+        keep = _partial_marker_len(buf, marker)
+        if len(buf) > keep:
+            yield buf[:len(buf) - keep]
+            buf = buf[len(buf) - keep:]
+    if buf:
+        yield buf